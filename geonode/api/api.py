@@ -63,6 +63,12 @@ from tastypie.utils import trailing_slash
 
 from geonode.utils import check_ogc_backend
 from geonode.security.utils import get_visible_resources
+from geonode.base.facets import (
+    FACETS,
+    facet_counts_enabled,
+    public_resources_filter,
+    get_public_facet_counts,
+    get_public_facet_breakdown)
 
 FILTER_TYPES = {
     'layer': Layer,
@@ -90,19 +96,30 @@ class CountJSONSerializer(Serializer):
             unpublished_not_visible=settings.RESOURCE_PUBLISHING,
             private_groups_not_visibile=settings.GROUP_PRIVATE_RESOURCES)
 
-        if resources and resources.count() > 0:
-            if options['title_filter']:
-                resources = resources.filter(title__icontains=options['title_filter'])
+        _type_filter = None
+        if options['title_filter']:
+            resources = resources.filter(title__icontains=options['title_filter'])
 
-            if options['type_filter']:
-                _type_filter = options['type_filter']
-                if not isinstance(_type_filter, str):
-                    _type_filter = _type_filter.__name__.lower()
-                resources = resources.filter(polymorphic_ctype__model=_type_filter)
+        if options['type_filter']:
+            _type_filter = options['type_filter']
+            if not isinstance(_type_filter, str):
+                _type_filter = _type_filter.__name__.lower()
+            resources = resources.filter(polymorphic_ctype__model=_type_filter)
+
+        # Public resources are read from the materialized counts,
+        # only the ones visible to this specific user are counted live
+        materialized = facet_counts_enabled() and not options['title_filter'] and \
+            options['count_type'] in FACETS
+        if materialized:
+            resources = resources.exclude(public_resources_filter())
 
         counts = list(resources.values(options['count_type']).annotate(count=Count(options['count_type'])))
+        counts = dict([(c[options['count_type']], c['count']) for c in counts])
 
-        return dict([(c[options['count_type']], c['count']) for c in counts])
+        if materialized:
+            for value, count in get_public_facet_counts(options['count_type'], _type_filter).items():
+                counts[value] = counts.get(value, 0) + count
+        return counts
 
     def to_json(self, data, options=None):
         options = options or {}
@@ -856,6 +873,18 @@ def _get_resource_counts(user, resourcebase_filter_kwargs):
         admin_approval_required=settings.ADMIN_MODERATE_UPLOADS,
         unpublished_not_visible=settings.RESOURCE_PUBLISHING,
         private_groups_not_visibile=settings.GROUP_PRIVATE_RESOURCES)
+    public_records = []
+    if facet_counts_enabled() and list(resourcebase_filter_kwargs.keys()) == ['group']:
+        _group = resourcebase_filter_kwargs['group']
+        resources = resources.exclude(public_resources_filter())
+        public_records = [
+            {
+                'polymorphic_ctype__model': resource_type,
+                'is_approved': is_approved,
+                'is_published': True,
+                'counts': count
+            } for resource_type, is_approved, count in get_public_facet_breakdown(
+                'group', getattr(_group, 'id', _group))]
     values = resources.values(
         'polymorphic_ctype__model',
         'is_approved',
@@ -876,7 +905,7 @@ def _get_resource_counts(user, resourcebase_filter_kwargs):
             'published': 0,
             'approved': 0,
         }
-    for record in qs:
+    for record in list(qs) + public_records:
         resource_type = record['polymorphic_ctype__model']
         is_visible = all((record['is_approved'], record['is_published']))
         counts['all']['total'] += record['counts']
@@ -21,7 +21,8 @@ import json
 import re
 
 from django.urls import resolve
-from django.db.models import Q
+from django.db import connection
+from django.db.models import Q, Prefetch
 from django.http import HttpResponse
 from django.conf import settings
 from django.contrib.staticfiles.templatetags import staticfiles
@@ -46,14 +47,14 @@ from django.forms.models import model_to_dict
 from tastypie.utils.mime import build_content_type
 
 from geonode import get_version, qgis_server, geoserver
-from geonode.layers.models import Layer
+from geonode.layers.models import Layer, Attribute
 from geonode.maps.models import Map
 from geonode.documents.models import Document
 from geonode.base.models import ResourceBase
 from geonode.base.models import HierarchicalKeyword
 from geonode.groups.models import GroupProfile
 from geonode.utils import check_ogc_backend
-from geonode.security.utils import get_visible_resources
+from geonode.security.utils import get_visible_resources, get_resources_with_perms
 from .authentication import OAuthAuthentication
 from .authorization import GeoNodeAuthorization, GeonodeApiKeyAuthentication
 
@@ -154,6 +155,10 @@ class CommonModelApi(ModelResource):
         'dirty_state',
     ]
 
+    # relations accessed by format_objects, fetched once per page
+    LIST_SELECT_RELATED = ['owner', 'category', 'group']
+    LIST_PREFETCH_RELATED = ['keywords', 'regions', 'curatedthumbnail']
+
     def build_filters(self, filters=None, ignore_bad_filters=False, **kwargs):
         if filters is None:
             filters = {}
@@ -276,22 +281,21 @@ class CommonModelApi(ModelResource):
         return filtered
 
     def filter_bbox(self, queryset, extent_filter):
-        from geonode.utils import bbox_to_projection
-        bbox = extent_filter.split(',')
-        bbox = list(map(str, bbox))
-
-        intersects = (Q(bbox_x0__gte=bbox[0]) & Q(bbox_x1__lte=bbox[2]) &
-                      Q(bbox_y0__gte=bbox[1]) & Q(bbox_y1__lte=bbox[3]))
-
-        for proj in Layer.objects.order_by('srid').values('srid').distinct():
-            if proj['srid'] != 'EPSG:4326':
-                proj_bbox = bbox_to_projection(bbox + ['4326', ],
-                                               target_srid=int(proj['srid'][5:]))
-
-                if proj_bbox[-1] != 4326:
-                    intersects = intersects | (Q(bbox_x0__gte=proj_bbox[0]) & Q(bbox_x1__lte=proj_bbox[2]) & Q(
-                        bbox_y0__gte=proj_bbox[1]) & Q(bbox_y1__lte=proj_bbox[3]))
-
+        """
+        Keeps the resources whose EPSG:4326 envelope intersects the extent,
+        given as "minx,miny,maxx,maxy" in EPSG:4326.
+        """
+        minx, miny, maxx, maxy = [float(coord) for coord in extent_filter.split(',')[0:4]]
+        if getattr(connection.ops, 'postgis', False):
+            # matches the GiST index created by the base migrations
+            envelope = 'ST_MakeEnvelope({0}."ll_bbox_x0", {0}."ll_bbox_y0", {0}."ll_bbox_x1", {0}."ll_bbox_y1", 4326)'
+            return queryset.extra(
+                where=[envelope.format('"%s"' % ResourceBase._meta.db_table) +
+                       ' && ST_MakeEnvelope(%s, %s, %s, %s, 4326)'],
+                params=[minx, miny, maxx, maxy])
+
+        intersects = (Q(ll_bbox_x0__lte=maxx) & Q(ll_bbox_x1__gte=minx) &
+                      Q(ll_bbox_y0__lte=maxy) & Q(ll_bbox_y1__gte=miny))
         return queryset.filter(intersects)
 
     def build_haystack_filters(self, parameters):
@@ -577,6 +581,7 @@ class CommonModelApi(ModelResource):
             bundle=base_bundle,
             **self.remove_api_resource_names(kwargs))
         sorted_objects = self.apply_sorting(objects, options=request.GET)
+        sorted_objects = self.prefetch_list_objects(sorted_objects)
 
         paginator = self._meta.paginator_class(
             request.GET,
@@ -594,6 +599,28 @@ class CommonModelApi(ModelResource):
         return self.create_response(
             request, to_be_serialized, response_objects=objects)
 
+    def prefetch_list_objects(self, objects):
+        """
+        Joins and prefetches the relations used by ``format_objects``, so that
+        formatting a page takes a constant number of queries.
+        """
+        if not hasattr(objects, 'select_related'):
+            return objects
+        return objects.select_related(
+            *self.LIST_SELECT_RELATED).prefetch_related(
+            *self.LIST_PREFETCH_RELATED)
+
+    def get_group_profiles(self, objects):
+        """
+        Returns a map of the GroupProfiles of the objects groups, keyed by slug.
+        """
+        group_names = set([obj.group.name for obj in objects if obj.group])
+        if not group_names:
+            return {}
+        return {
+            group_profile.slug: group_profile for group_profile in
+            GroupProfile.objects.filter(slug__in=group_names)}
+
     def format_objects(self, objects):
         """
         Format the objects for output in a response.
@@ -645,9 +672,8 @@ class CommonModelApi(ModelResource):
         filtered_objects_ids = None
         try:
             if data['objects']:
-                filtered_objects_ids = [
-                    item.id for item in data['objects'] if request.user.has_perm(
-                        'view_resourcebase', item.get_self_resource())]
+                filtered_objects_ids = get_resources_with_perms(
+                    request.user, [item.id for item in data['objects']])
         except Exception:
             pass
 
@@ -749,6 +775,7 @@ class LayerResource(CommonModelApi):
         Formats the object.
         """
         formatted_objects = []
+        group_profiles = self.get_group_profiles(objects)
         for obj in objects:
             # convert the object to a dict using the standard values.
             # includes other values
@@ -765,10 +792,7 @@ class LayerResource(CommonModelApi):
                 formatted_obj['category__gn_description'] = obj.category.gn_description
             if obj.group:
                 formatted_obj['group'] = obj.group
-                try:
-                    formatted_obj['group_name'] = GroupProfile.objects.get(slug=obj.group.name)
-                except GroupProfile.DoesNotExist:
-                    formatted_obj['group_name'] = obj.group
+                formatted_obj['group_name'] = group_profiles.get(obj.group.name, obj.group)
 
             formatted_obj['keywords'] = [k.name for k in obj.keywords.all()] if obj.keywords else []
             formatted_obj['regions'] = [r.name for r in obj.regions.all()] if obj.regions else []
@@ -822,7 +846,10 @@ class LayerResource(CommonModelApi):
 
         links = obj.link_set.all()
         if link_types:
-            links = links.filter(link_type__in=link_types)
+            if 'link_set' in getattr(obj, '_prefetched_objects_cache', {}):
+                links = [lnk for lnk in links if lnk.link_type in link_types]
+            else:
+                links = links.filter(link_type__in=link_types)
         for lnk in links:
             formatted_link = model_to_dict(lnk, fields=link_fields)
             dehydrated.append(formatted_link)
@@ -836,7 +863,21 @@ class LayerResource(CommonModelApi):
         return self._dehydrate_links(bundle, ['OGC:WMS', 'OGC:WFS', 'OGC:WCS'])
 
     def dehydrate_gtype(self, bundle):
-        return bundle.obj.gtype
+        obj = bundle.obj
+        if hasattr(obj, 'geometry_attributes'):
+            # return attribute type without 'gml:' and 'PropertyType'
+            return obj.geometry_attributes[0].attribute_type[4:-12] if obj.geometry_attributes else None
+        return obj.gtype
+
+    def prefetch_list_objects(self, objects):
+        objects = super(LayerResource, self).prefetch_list_objects(objects)
+        if not hasattr(objects, 'prefetch_related'):
+            return objects
+        return objects.prefetch_related(
+            Prefetch(
+                'attribute_set',
+                queryset=Attribute.objects.filter(attribute='the_geom'),
+                to_attr='geometry_attributes'))
 
     def populate_object(self, obj):
         """Populate results with necessary fields
@@ -924,6 +965,9 @@ class LayerResource(CommonModelApi):
     VALUES = CommonModelApi.VALUES[:]
     VALUES.append('typename')
 
+    LIST_SELECT_RELATED = CommonModelApi.LIST_SELECT_RELATED + ['default_style', 'remote_service']
+    LIST_PREFETCH_RELATED = CommonModelApi.LIST_PREFETCH_RELATED + ['link_set']
+
     class Meta(CommonMetaApi):
         paginator_class = CrossSiteXHRPaginator
         queryset = Layer.objects.distinct().order_by('-date')
@@ -956,6 +1000,7 @@ class MapResource(CommonModelApi):
         :param objects: Map objects
         """
         formatted_objects = []
+        group_profiles = self.get_group_profiles(objects)
         for obj in objects:
             # convert the object to a dict using the standard values.
             formatted_obj = model_to_dict(obj, fields=self.VALUES)
@@ -967,10 +1012,7 @@ class MapResource(CommonModelApi):
                 formatted_obj['category__gn_description'] = obj.category.gn_description
             if obj.group:
                 formatted_obj['group'] = obj.group
-                try:
-                    formatted_obj['group_name'] = GroupProfile.objects.get(slug=obj.group.name)
-                except GroupProfile.DoesNotExist:
-                    formatted_obj['group_name'] = obj.group
+                formatted_obj['group_name'] = group_profiles.get(obj.group.name, obj.group)
 
             formatted_obj['keywords'] = [k.name for k in obj.keywords.all()] if obj.keywords else []
             formatted_obj['regions'] = [r.name for r in obj.regions.all()] if obj.regions else []
@@ -983,7 +1025,7 @@ class MapResource(CommonModelApi):
             formatted_obj['online'] = True
 
             # get map layers
-            map_layers = obj.layers
+            map_layers = obj.layer_set.all()
             formatted_layers = []
             map_layer_fields = [
                 'id'
@@ -1015,6 +1057,8 @@ class MapResource(CommonModelApi):
             formatted_objects.append(formatted_obj)
         return formatted_objects
 
+    LIST_PREFETCH_RELATED = CommonModelApi.LIST_PREFETCH_RELATED + ['layer_set']
+
     class Meta(CommonMetaApi):
         paginator_class = CrossSiteXHRPaginator
         queryset = Map.objects.distinct().order_by('-date')
@@ -1036,6 +1080,7 @@ class DocumentResource(CommonModelApi):
         :param objects: Map objects
         """
         formatted_objects = []
+        group_profiles = self.get_group_profiles(objects)
         for obj in objects:
             # convert the object to a dict using the standard values.
             formatted_obj = model_to_dict(obj, fields=self.VALUES)
@@ -1047,10 +1092,7 @@ class DocumentResource(CommonModelApi):
                 formatted_obj['category__gn_description'] = obj.category.gn_description
             if obj.group:
                 formatted_obj['group'] = obj.group
-                try:
-                    formatted_obj['group_name'] = GroupProfile.objects.get(slug=obj.group.name)
-                except GroupProfile.DoesNotExist:
-                    formatted_obj['group_name'] = obj.group
+                formatted_obj['group_name'] = group_profiles.get(obj.group.name, obj.group)
 
             formatted_obj['keywords'] = [k.name for k in obj.keywords.all()] if obj.keywords else []
             formatted_obj['regions'] = [r.name for r in obj.regions.all()] if obj.regions else []
@@ -25,12 +25,14 @@ from tastypie.test import ResourceTestCaseMixin
 from django.urls import reverse
 from django.contrib.auth.models import Group
 from django.contrib.auth import get_user_model
-from django.test.utils import override_settings
+from django.test.utils import override_settings, CaptureQueriesContext
+from django.db import connection
 
 from guardian.shortcuts import get_anonymous_user
 
 from geonode import geoserver
 from geonode.layers.models import Layer
+from geonode.base.models import ResourceBase
 from geonode.utils import check_ogc_backend
 from geonode.decorators import on_ogc_backend
 from geonode.groups.models import GroupProfile
@@ -421,6 +423,31 @@ class SearchApiTests(ResourceTestCaseMixin, GeoNodeBaseTestSupport):
         self.assertValidJSONResponse(resp)
         self.assertEqual(len(self.deserialize(resp)['objects']), 0)
 
+    def test_extent_filter(self):
+        """Test extent filtering against the EPSG:4326 envelope"""
+        from geonode.base.utils import backfill_ll_bbox
+
+        ResourceBase.objects.update(bbox_x0=-50, bbox_x1=-40, bbox_y0=-50, bbox_y1=-40, srid='EPSG:4326')
+        layer = Layer.objects.all().order_by('id').first()
+        ResourceBase.objects.filter(id=layer.id).update(bbox_x0=10, bbox_x1=11, bbox_y0=10, bbox_y1=11)
+        self.assertEqual(backfill_ll_bbox(), ResourceBase.objects.count())
+        self.assertEqual(backfill_ll_bbox(missing_only=True), 0)
+
+        # intersecting, not only contained, resources are returned
+        resp = self.api_client.get(self.list_url + '?extent=10.5,10.5,20,20')
+        self.assertValidJSONResponse(resp)
+        objects = self.deserialize(resp)['objects']
+        self.assertEqual(len(objects), 1)
+        self.assertEqual(int(objects[0]['id']), layer.id)
+
+        resp = self.api_client.get(self.list_url + '?extent=0,0,5,5')
+        self.assertValidJSONResponse(resp)
+        self.assertEqual(len(self.deserialize(resp)['objects']), 0)
+
+        resp = self.api_client.get(self.list_url + '?extent=-180,-90,180,90')
+        self.assertValidJSONResponse(resp)
+        self.assertEqual(self.deserialize(resp)['meta']['total_count'], Layer.objects.count())
+
 
 # noinspection DuplicatedCode
 @override_settings(API_LOCKDOWN=True)
@@ -526,3 +553,85 @@ class LockdownApiTests(ResourceTestCaseMixin, GeoNodeBaseTestSupport):
         resp = self.api_client.get(filter_url)
         self.assertValidJSONResponse(resp)
         self.assertEqual(len(self.deserialize(resp)['objects']), 5)
+
+
+class ListQueriesApiTests(ResourceTestCaseMixin, GeoNodeBaseTestSupport):
+
+    """Test that list endpoints do not issue per-object queries"""
+
+    def setUp(self):
+        super(ListQueriesApiTests, self).setUp()
+        all_public()
+        bar = GroupProfile.objects.get(slug='bar')
+        ResourceBase.objects.all().update(group=bar.group)
+        self.api_client.client.login(username='admin', password='admin')
+
+    def _count_queries(self, list_url, limit):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.api_client.get('%s?limit=%s' % (list_url, limit))
+            self.assertValidJSONResponse(resp)
+        return len(ctx.captured_queries), len(self.deserialize(resp)['objects'])
+
+    def test_list_queries_do_not_scale_with_page_size(self):
+        for resource_name in ('layers', 'maps', 'documents'):
+            list_url = reverse(
+                'api_dispatch_list',
+                kwargs={
+                    'api_name': 'api',
+                    'resource_name': resource_name})
+            # warm up caches (content types, sessions)
+            self._count_queries(list_url, 1)
+            queries_one, objects_one = self._count_queries(list_url, 1)
+            queries_all, objects_all = self._count_queries(list_url, 100)
+            self.assertEqual(objects_one, 1)
+            self.assertGreater(objects_all, 1)
+            self.assertEqual(queries_one, queries_all, resource_name)
+
+
+class FacetCountsApiTests(ResourceTestCaseMixin, GeoNodeBaseTestSupport):
+
+    """Test that materialized facet counts match the live ones"""
+
+    def setUp(self):
+        super(FacetCountsApiTests, self).setUp()
+        all_public()
+        self.urls = [
+            reverse('api_dispatch_list', kwargs={'api_name': 'api', 'resource_name': resource_name})
+            for resource_name in ('keywords', 'categories', 'owners')]
+
+    def _get_counts(self):
+        counts = []
+        for url in self.urls + ['%s?type=layer' % _u for _u in self.urls]:
+            resp = self.api_client.get(url)
+            self.assertValidJSONResponse(resp)
+            counts.append(sorted([(_o['id'], _o['count']) for _o in self.deserialize(resp)['objects']]))
+        return counts
+
+    def _assert_counts_match(self):
+        for username, password in ((None, None), ('bobby', 'bob'), ('admin', 'admin')):
+            self.api_client.client.logout()
+            if username:
+                self.api_client.client.login(username=username, password=password)
+            with self.settings(MATERIALIZED_FACET_COUNTS=False):
+                live_counts = self._get_counts()
+            with self.settings(MATERIALIZED_FACET_COUNTS=True):
+                materialized_counts = self._get_counts()
+            self.assertEqual(live_counts, materialized_counts)
+
+    def test_materialized_facet_counts(self):
+        from geonode.base.facets import rebuild_facet_counts
+        with self.settings(MATERIALIZED_FACET_COUNTS=True, API_LOCKDOWN=False):
+            rebuild_facet_counts()
+            self._assert_counts_match()
+
+            # incremental updates
+            layer = Layer.objects.all()[0]
+            layer.set_permissions({"users": {"bobby": ['view_resourcebase']}, "groups": {}})
+            layer.keywords.add('facet-keyword')
+            self._assert_counts_match()
+
+            layer.is_published = False
+            layer.save()
+            self._assert_counts_match()
+            layer.delete()
+            self._assert_counts_match()
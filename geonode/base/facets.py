@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2020 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+"""Materialized facet counts of public resources
+
+A resource is *public* when it is published, not dirty, not owned by a private
+group and the ``anonymous`` group holds ``view_resourcebase`` on it: every
+user (including anonymous ones) is able to see it.
+Public resources are counted once in ``ResourceFacetCount``, incrementally
+updated through the ResourceBase and permission signals; the API only
+needs to query the non-public resources visible to the requesting user.
+
+Writes bypassing the signals (queryset ``update()``, raw SQL, fixtures) are
+not seen unless their callers refresh the touched resources, so the counts
+should also be rebuilt periodically, see FACET_COUNTS_REBUILD_INTERVAL and
+the ``rebuild_facet_counts`` task and command.
+"""
+
+import logging
+
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.db.models import Q, F, Sum, Count, IntegerField
+from django.db.models.functions import Cast
+from django.contrib.contenttypes.models import ContentType
+
+from guardian.models import GroupObjectPermission
+
+from geonode.base.models import ResourceBase, ResourceFacetCount, ResourceFacetEntry
+from geonode.groups.models import GroupProfile
+
+logger = logging.getLogger(__name__)
+
+SCALAR_FACETS = {
+    'owner': 'owner_id',
+    'category': 'category_id',
+    'group': 'group_id',
+}
+
+MULTI_FACETS = {
+    'keywords': 'keywords',
+    'regions': 'regions',
+    'tkeywords__id': 'tkeywords__id',
+}
+
+FACETS = list(SCALAR_FACETS.keys()) + list(MULTI_FACETS.keys())
+
+
+def facet_counts_enabled():
+    return getattr(settings, 'MATERIALIZED_FACET_COUNTS', False)
+
+
+def public_resources_filter():
+    """
+    Returns the Q object matching the resources visible to everyone.
+    """
+    anonymous_view = GroupObjectPermission.objects.filter(
+        group__name='anonymous',
+        permission__codename='view_resourcebase',
+        content_type=ContentType.objects.get_for_model(ResourceBase)
+    ).annotate(
+        resource_id=Cast('object_pk', IntegerField())
+    ).values('resource_id')
+    private_groups = GroupProfile.objects.filter(access='private').values('group')
+    return Q(is_published=True) & Q(dirty_state=False) & \
+        ~Q(group__in=private_groups) & Q(id__in=anonymous_view)
+
+
+def _get_resource_entries(resource_id):
+    resource = ResourceBase.objects.filter(
+        public_resources_filter(), id=resource_id
+    ).values(
+        'polymorphic_ctype__model', 'is_approved', *SCALAR_FACETS.values()
+    ).first()
+    if not resource:
+        return []
+
+    resource_type = resource['polymorphic_ctype__model']
+    is_approved = resource['is_approved']
+    entries = set()
+    for facet, field in SCALAR_FACETS.items():
+        if resource[field] is not None:
+            entries.add((facet, resource[field], resource_type, is_approved))
+    for facet, field in MULTI_FACETS.items():
+        for value in ResourceBase.objects.filter(id=resource_id).values_list(field, flat=True):
+            if value is not None:
+                entries.add((facet, value, resource_type, is_approved))
+    return entries
+
+
+def _apply_delta(entries, delta):
+    for facet, value, resource_type, is_approved in entries:
+        key = dict(
+            facet=facet,
+            value=value,
+            resource_type=resource_type,
+            is_approved=is_approved)
+        updated = ResourceFacetCount.objects.filter(**key).update(count=F('count') + delta)
+        if not updated and delta > 0:
+            try:
+                with transaction.atomic():
+                    ResourceFacetCount.objects.create(count=delta, **key)
+            except IntegrityError:
+                # created by a concurrent first increment in the meantime
+                ResourceFacetCount.objects.filter(**key).update(count=F('count') + delta)
+
+
+def refresh_resource_facets(resource_id, deleted=False):
+    """
+    Updates the materialized counts with the current facet values of one resource.
+    """
+    if not facet_counts_enabled():
+        return
+    try:
+        resource_id = int(resource_id)
+        with transaction.atomic():
+            current = ResourceFacetEntry.objects.select_for_update().filter(resource_id=resource_id)
+            old_entries = set(current.values_list('facet', 'value', 'resource_type', 'is_approved'))
+            new_entries = set() if deleted else _get_resource_entries(resource_id)
+            if old_entries == new_entries:
+                return
+            _apply_delta(old_entries - new_entries, -1)
+            _apply_delta(new_entries - old_entries, 1)
+            current.delete()
+            ResourceFacetEntry.objects.bulk_create([
+                ResourceFacetEntry(
+                    resource_id=resource_id,
+                    facet=facet,
+                    value=value,
+                    resource_type=resource_type,
+                    is_approved=is_approved)
+                for facet, value, resource_type, is_approved in new_entries])
+    except Exception:
+        logger.exception("Could not refresh the facet counts of resource %s", resource_id)
+
+
+def rebuild_facet_counts():
+    """
+    Recomputes the whole materialized structure from scratch.
+    """
+    with transaction.atomic():
+        ResourceFacetEntry.objects.all().delete()
+        ResourceFacetCount.objects.all().delete()
+        public_resources = ResourceBase.objects.filter(public_resources_filter())
+        entries = []
+        for facet, field in list(SCALAR_FACETS.items()) + list(MULTI_FACETS.items()):
+            for resource_id, value, resource_type, is_approved in public_resources.filter(
+                    **{'%s__isnull' % field: False}).values_list(
+                    'id', field, 'polymorphic_ctype__model', 'is_approved').distinct():
+                entries.append(ResourceFacetEntry(
+                    resource_id=resource_id,
+                    facet=facet,
+                    value=value,
+                    resource_type=resource_type,
+                    is_approved=is_approved))
+        ResourceFacetEntry.objects.bulk_create(entries, batch_size=1000)
+        counts = ResourceFacetEntry.objects.values(
+            'facet', 'value', 'resource_type', 'is_approved').annotate(total=Count('id'))
+        ResourceFacetCount.objects.bulk_create([
+            ResourceFacetCount(
+                facet=_c['facet'],
+                value=_c['value'],
+                resource_type=_c['resource_type'],
+                is_approved=_c['is_approved'],
+                count=_c['total'])
+            for _c in counts], batch_size=1000)
+    return len(entries)
+
+
+def get_public_facet_counts(facet, resource_type=None):
+    """
+    Returns a dict of public resources counts keyed by facet value.
+    """
+    counts = ResourceFacetCount.objects.filter(facet=facet, count__gt=0)
+    if resource_type:
+        counts = counts.filter(resource_type=resource_type)
+    return dict(counts.values_list('value').annotate(total=Sum('count')))
+
+
+def get_public_facet_breakdown(facet, value):
+    """
+    Returns the public resources counts of one facet value as
+    (resource_type, is_approved, count) tuples.
+    """
+    return list(ResourceFacetCount.objects.filter(
+        facet=facet, value=value, count__gt=0).values_list(
+        'resource_type', 'is_approved', 'count'))
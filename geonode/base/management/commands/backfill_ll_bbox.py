@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2020 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+import time
+
+from django.core.management.base import BaseCommand
+from geonode.base.utils import backfill_ll_bbox
+
+
+class Command(BaseCommand):
+    """Populates the normalized EPSG:4326 envelope used by the extent filters
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            dest='missing',
+            default=False,
+            help='Only process the resources without an envelope yet')
+        parser.add_argument(
+            '--batch-size',
+            dest='batch_size',
+            type=int,
+            default=500,
+            help='Number of resources updated at a time')
+
+    def handle(self, *args, **options):
+        start = time.time()
+        updated = backfill_ll_bbox(batch_size=options.get('batch_size'),
+                                   missing_only=options.get('missing'))
+        print("Updated the envelope of %s resources in %.2f seconds" % (updated, time.time() - start))
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2017 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+import time
+
+from django.core.management.base import BaseCommand
+from geonode.base.facets import rebuild_facet_counts
+
+
+class Command(BaseCommand):
+    """Rebuilds the materialized facet counts of public resources
+    """
+
+    def handle(self, *args, **options):
+        start = time.time()
+        entries = rebuild_facet_counts()
+        print("Materialized %s facet entries in %.2f seconds" % (entries, time.time() - start))
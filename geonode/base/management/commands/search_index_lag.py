@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2017 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+
+from django.core.management.base import BaseCommand
+from geonode.base.search_index import index_lag, flush
+
+
+class Command(BaseCommand):
+    """Reports the search index updates still waiting to be flushed
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--flush',
+            action='store_true',
+            dest='flush',
+            default=False,
+            help='Flush the pending updates after reporting them')
+
+    def handle(self, *args, **options):
+        lag = index_lag()
+        print("%s pending search index updates, oldest queued %.1f seconds ago" % (lag['pending'], lag['lag']))
+        for model, count in sorted(lag['models'].items()):
+            print("  %s: %s" % (model, count))
+        if lag['parked']:
+            print("%s of them parked after failing too many times" % lag['parked'])
+        if options.get('flush'):
+            print("Flushed %s search index updates" % flush())
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.15 on 2020-09-14 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0043_auto_20200527_0833'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceFacetCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=32)),
+                ('value', models.IntegerField()),
+                ('resource_type', models.CharField(max_length=255)),
+                ('is_approved', models.BooleanField(default=False)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('facet', 'value', 'resource_type', 'is_approved')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ResourceFacetEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource_id', models.IntegerField(db_index=True)),
+                ('facet', models.CharField(max_length=32)),
+                ('value', models.IntegerField()),
+                ('resource_type', models.CharField(max_length=255)),
+                ('is_approved', models.BooleanField(default=False)),
+            ],
+        ),
+    ]
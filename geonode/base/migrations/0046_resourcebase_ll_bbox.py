@@ -0,0 +1,112 @@
+# Generated by Django 2.2.15 on 2020-09-28 10:12
+
+import logging
+import traceback
+
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+LL_BBOX_GIST_INDEX = 'base_resourcebase_ll_bbox_gist'
+
+
+def create_gist_index(apps, schema_editor):
+    # On PostGIS the envelope is also indexed as a geometry, so that the
+    # extent filters can use the && (intersects) operator
+    if getattr(schema_editor.connection.ops, 'postgis', False):
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS {} ON base_resourcebase USING GIST '
+            '(ST_MakeEnvelope(ll_bbox_x0, ll_bbox_y0, ll_bbox_x1, ll_bbox_y1, 4326))'.format(LL_BBOX_GIST_INDEX))
+
+
+def ll_bbox_envelope(bbox_x0, bbox_x1, bbox_y0, bbox_y1, srid):
+    # a frozen copy of base.models.get_ll_bbox_envelope, the migration must
+    # not depend on code which can change after it
+    from django.contrib.gis.geos import Polygon
+    if any(coord is None for coord in (bbox_x0, bbox_x1, bbox_y0, bbox_y1)):
+        return None
+    try:
+        x0, x1, y0, y1 = [float(coord) for coord in (bbox_x0, bbox_x1, bbox_y0, bbox_y1)]
+        srid = str(srid or 'EPSG:4326')
+        source_srid = int(srid.split(':')[1]) if ':' in srid else int(srid)
+        if source_srid != 4326:
+            poly = Polygon.from_bbox((x0, y0, x1, y1))
+            poly.srid = source_srid
+            poly.transform(4326)
+            x0, y0, x1, y1 = poly.extent
+    except Exception:
+        logger.debug(traceback.format_exc())
+        return None
+    return {
+        'll_bbox_x0': max(min(x0, x1), -180.0),
+        'll_bbox_x1': min(max(x0, x1), 180.0),
+        'll_bbox_y0': max(min(y0, y1), -90.0),
+        'll_bbox_y1': min(max(y0, y1), 90.0),
+    }
+
+
+def backfill_ll_bbox(apps, schema_editor):
+    # the extent filters only look at the envelope, compute it for the
+    # existing resources so that they don't drop out of the results
+    ResourceBase = apps.get_model('base', 'ResourceBase')
+    _fields = ['ll_bbox_x0', 'll_bbox_x1', 'll_bbox_y0', 'll_bbox_y1']
+    queryset = ResourceBase.objects.only(
+        'id', 'bbox_x0', 'bbox_x1', 'bbox_y0', 'bbox_y1', 'srid', *_fields).order_by('id')
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id)[:500])
+        if not batch:
+            break
+        to_update = []
+        for resource in batch:
+            envelope = ll_bbox_envelope(
+                resource.bbox_x0, resource.bbox_x1, resource.bbox_y0, resource.bbox_y1, resource.srid)
+            if envelope:
+                for _k, _v in envelope.items():
+                    setattr(resource, _k, _v)
+                to_update.append(resource)
+        if to_update:
+            ResourceBase.objects.bulk_update(to_update, _fields)
+        last_id = batch[-1].id
+
+
+def drop_gist_index(apps, schema_editor):
+    if getattr(schema_editor.connection.ops, 'postgis', False):
+        schema_editor.execute('DROP INDEX IF EXISTS {}'.format(LL_BBOX_GIST_INDEX))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0045_searchindexupdate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resourcebase',
+            name='ll_bbox_x0',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='resourcebase',
+            name='ll_bbox_x1',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='resourcebase',
+            name='ll_bbox_y0',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='resourcebase',
+            name='ll_bbox_y1',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='resourcebase',
+            index=models.Index(fields=['ll_bbox_x0', 'll_bbox_x1', 'll_bbox_y0', 'll_bbox_y1'],
+                               name='base_resourcebase_ll_bbox'),
+        ),
+        migrations.RunPython(backfill_ll_bbox, migrations.RunPython.noop),
+        migrations.RunPython(create_gist_index, drop_gist_index),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 2.2.15 on 2020-10-12 14:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0046_resourcebase_ll_bbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchindexupdate',
+            name='retries',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='SearchIndexFlush',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scheduled', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -19,7 +19,6 @@
 #########################################################################
 
 import os
-import re
 import math
 import uuid
 import logging
@@ -34,7 +33,6 @@ from django.db.models import Q, signals
 from django.contrib.auth.models import Group
 from django.core.files.base import ContentFile
 from django.contrib.auth import get_user_model
-from django.contrib.gis.geos import GEOSGeometry
 from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.contenttypes.models import ContentType
@@ -53,6 +51,7 @@ from pinax.ratings.models import OverallRating
 from taggit.models import TagBase, ItemBase
 from taggit.managers import TaggableManager, _TaggableManager
 
+from guardian.models import GroupObjectPermission
 from guardian.shortcuts import get_anonymous_user, get_objects_for_user
 from treebeard.mp_tree import MP_Node, MP_NodeQuerySet, MP_NodeManager
 
@@ -541,6 +540,34 @@ class ResourceBaseManager(PolymorphicManager):
         return super(ResourceBaseManager, self).get_queryset()
 
 
+def get_ll_bbox_envelope(bbox_x0, bbox_x1, bbox_y0, bbox_y1, srid=None):
+    """
+    Returns the ll_bbox_* fields values, i.e. the bbox reprojected to
+    EPSG:4326 and clamped to the valid lon/lat ranges, or None values if
+    the bbox is incomplete or cannot be reprojected.
+    """
+    from geonode.utils import bbox_to_projection
+    envelope = dict.fromkeys(('ll_bbox_x0', 'll_bbox_x1', 'll_bbox_y0', 'll_bbox_y1'))
+    if any(coord is None for coord in (bbox_x0, bbox_x1, bbox_y0, bbox_y1)):
+        return envelope
+    try:
+        llbbox = bbox_to_projection([float(coord) for coord in (bbox_x0, bbox_x1, bbox_y0, bbox_y1)] +
+                                    [srid or 'EPSG:4326', ],
+                                    target_srid=4326)
+        if str(llbbox[-1]).split(':')[-1] != '4326':
+            return envelope
+        x0, x1, y0, y1 = [float(coord) for coord in llbbox[0:4]]
+    except Exception:
+        tb = traceback.format_exc()
+        logger.debug(tb)
+        return envelope
+    envelope['ll_bbox_x0'] = max(min(x0, x1), -180.0)
+    envelope['ll_bbox_x1'] = min(max(x0, x1), 180.0)
+    envelope['ll_bbox_y0'] = max(min(y0, y1), -90.0)
+    envelope['ll_bbox_y1'] = min(max(y0, y1), 90.0)
+    return envelope
+
+
 class ResourceBase(PolymorphicModel, PermissionLevelMixin, ItemBase):
     """
     Base Resource Object loosely based on ISO 19115:2003
@@ -775,6 +802,13 @@ class ResourceBase(PolymorphicModel, PermissionLevelMixin, ItemBase):
         null=False,
         default='EPSG:4326')
 
+    # Normalized EPSG:4326 envelope of the bbox, kept in sync on save.
+    # This is what the extent filters of the API are matched against.
+    ll_bbox_x0 = models.FloatField(blank=True, null=True, editable=False)
+    ll_bbox_x1 = models.FloatField(blank=True, null=True, editable=False)
+    ll_bbox_y0 = models.FloatField(blank=True, null=True, editable=False)
+    ll_bbox_y1 = models.FloatField(blank=True, null=True, editable=False)
+
     # CSW specific fields
     csw_typename = models.CharField(
         _('CSW typename'),
@@ -865,6 +899,10 @@ class ResourceBase(PolymorphicModel, PermissionLevelMixin, ItemBase):
             ('publish_resourcebase', 'Can publish resource'),
             ('change_resourcebase_metadata', 'Can change resource metadata'),
         )
+        indexes = [
+            models.Index(fields=['ll_bbox_x0', 'll_bbox_x1', 'll_bbox_y0', 'll_bbox_y1'],
+                         name='base_resourcebase_ll_bbox'),
+        ]
 
     def __init__(self, *args, **kwargs):
         super(ResourceBase, self).__init__(*args, **kwargs)
@@ -911,6 +949,8 @@ class ResourceBase(PolymorphicModel, PermissionLevelMixin, ItemBase):
                     recipients = get_notification_recipients(notice_type_label)
                     send_notification(recipients, notice_type_label, {'resource': self})
 
+        for _k, _v in self.ll_bbox_envelope().items():
+            setattr(self, _k, _v)
         super(ResourceBase, self).save(*args, **kwargs)
         self.__is_approved = self.is_approved
         self.__is_published = self.is_published
@@ -995,6 +1035,12 @@ class ResourceBase(PolymorphicModel, PermissionLevelMixin, ItemBase):
             llbbox[3],  # y1
             self.srid]
 
+    def ll_bbox_envelope(self):
+        """
+        Returns the ll_bbox_* fields values, see get_ll_bbox_envelope.
+        """
+        return get_ll_bbox_envelope(*self.bbox[0:4], srid=self.srid)
+
     @property
     def ll_bbox_string(self):
         """WGS84 BBOX is in the format: [x0,y0,x1,y1]."""
@@ -1730,6 +1776,69 @@ class GroupGeoLimit(models.Model):
         blank=True)
 
 
+class ResourceFacetCount(models.Model):
+    """
+    Materialized number of public resources per facet value, resource type and
+    approval state. Maintained incrementally by ``geonode.base.facets``.
+    """
+    facet = models.CharField(max_length=32)
+    value = models.IntegerField()
+    resource_type = models.CharField(max_length=255)
+    is_approved = models.BooleanField(default=False)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = (('facet', 'value', 'resource_type', 'is_approved'),)
+
+
+class ResourceFacetEntry(models.Model):
+    """
+    Facet values a public resource is currently counted for in ``ResourceFacetCount``.
+    """
+    resource_id = models.IntegerField(db_index=True)
+    facet = models.CharField(max_length=32)
+    value = models.IntegerField()
+    resource_type = models.CharField(max_length=255)
+    is_approved = models.BooleanField(default=False)
+
+
+class SearchIndexUpdate(models.Model):
+    """
+    Pending search index update of one object. Repeated saves of the same object
+    are coalesced into one row, flushed in batches by ``geonode.base.search_index``.
+    """
+    ACTION_UPDATE = 'update'
+    ACTION_DELETE = 'delete'
+    ACTIONS = ((ACTION_UPDATE, _('Update'),),
+               (ACTION_DELETE, _('Delete'),),)
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    action = models.CharField(max_length=16, choices=ACTIONS, default=ACTION_UPDATE)
+    enqueued = models.DateTimeField(db_index=True, default=now)
+    retries = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        unique_together = (('content_type', 'object_id'),)
+
+
+class SearchIndexFlush(models.Model):
+    """
+    Single row holding the time until which a queued flush of the search index
+    updates is already scheduled, shared by all the processes.
+    """
+    scheduled = models.DateTimeField(default=now)
+
+
+class CatalogueChange(models.Model):
+    """
+    Single row holding a version bumped after every change of the metadata
+    exported by the catalogue, used to validate the cached exports.
+    """
+    version = models.PositiveIntegerField(default=0)
+    modified = models.DateTimeField(default=now)
+
+
 def resourcebase_post_save(instance, *args, **kwargs):
     """
     Used to fill any additional fields after the save.
@@ -1773,31 +1882,10 @@ def resourcebase_post_save(instance, *args, **kwargs):
             """
             pass
         else:
-            srid1, wkt1 = instance.geographic_bounding_box.split(";")
-            srid1 = re.findall(r'\d+', srid1)
-
-            poly1 = GEOSGeometry(wkt1, srid=int(srid1[0]))
-            poly1.transform(4326)
-
-            queryset = Region.objects.all().order_by('name')
-            global_regions = []
-            regions_to_add = []
-            for region in queryset:
-                try:
-                    srid2, wkt2 = region.geographic_bounding_box.split(";")
-                    srid2 = re.findall(r'\d+', srid2)
-
-                    poly2 = GEOSGeometry(wkt2, srid=int(srid2[0]))
-                    poly2.transform(4326)
-
-                    if poly2.intersection(poly1):
-                        regions_to_add.append(region)
-                    if region.level == 0 and region.parent is None:
-                        global_regions.append(region)
-                except Exception:
-                    tb = traceback.format_exc()
-                    if tb:
-                        logger.debug(tb)
+            from geonode.base.regions import get_regions_index
+            regions_index = get_regions_index()
+            regions_to_add = regions_index.intersecting(instance.geographic_bounding_box)
+            global_regions = regions_index.global_regions
             if regions_to_add or global_regions:
                 if regions_to_add and len(
                         regions_to_add) > 0 and len(regions_to_add) <= 30:
@@ -1829,3 +1917,76 @@ def rating_post_save(instance, *args, **kwargs):
 
 
 signals.post_save.connect(rating_post_save, sender=OverallRating)
+
+
+def resourcebase_facets_post_save(instance, *args, **kwargs):
+    """
+    Keeps the materialized facet counts in sync with the saved resource.
+    """
+    if isinstance(instance, ResourceBase):
+        from geonode.base.facets import refresh_resource_facets
+        refresh_resource_facets(instance.id)
+
+
+def resourcebase_facets_post_delete(instance, *args, **kwargs):
+    if isinstance(instance, ResourceBase):
+        from geonode.base.facets import refresh_resource_facets
+        refresh_resource_facets(instance.id, deleted=True)
+
+
+def resourcebase_facets_m2m_changed(instance, action, *args, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    from geonode.base.facets import refresh_resource_facets
+    if isinstance(instance, ResourceBase):
+        refresh_resource_facets(instance.id)
+    elif kwargs.get('pk_set') and issubclass(kwargs.get('model'), ResourceBase):
+        for _pk in kwargs['pk_set']:
+            refresh_resource_facets(_pk)
+
+
+def group_permission_facets_changed(instance, *args, **kwargs):
+    """
+    Anonymous view permissions decide whether a resource is public.
+    """
+    if not getattr(settings, 'MATERIALIZED_FACET_COUNTS', False) or \
+            instance.content_type_id != ContentType.objects.get_for_model(ResourceBase).id:
+        return
+    try:
+        is_anonymous = instance.group.name == 'anonymous'
+    except Group.DoesNotExist:
+        is_anonymous = True
+    if is_anonymous:
+        from geonode.base.facets import refresh_resource_facets
+        refresh_resource_facets(instance.object_pk)
+
+
+def groupprofile_facets_post_save(instance, *args, **kwargs):
+    """
+    A change of the group access may turn its resources public or private.
+    """
+    if not getattr(settings, 'MATERIALIZED_FACET_COUNTS', False):
+        return
+    from geonode.base.facets import refresh_resource_facets
+    for _id in ResourceBase.objects.filter(group=instance.group).values_list('id', flat=True):
+        refresh_resource_facets(_id)
+
+
+def region_post_change(instance, *args, **kwargs):
+    """
+    Rebuilds the Regions spatial index used by resourcebase_post_save.
+    """
+    from geonode.base.regions import invalidate_regions_index
+    invalidate_regions_index()
+
+
+signals.post_save.connect(region_post_change, sender=Region)
+signals.post_delete.connect(region_post_change, sender=Region)
+signals.post_save.connect(resourcebase_facets_post_save)
+signals.post_delete.connect(resourcebase_facets_post_delete)
+signals.m2m_changed.connect(resourcebase_facets_m2m_changed, sender=TaggedContentItem)
+signals.m2m_changed.connect(resourcebase_facets_m2m_changed, sender=ResourceBase.regions.through)
+signals.m2m_changed.connect(resourcebase_facets_m2m_changed, sender=ResourceBase.tkeywords.through)
+signals.post_save.connect(group_permission_facets_changed, sender=GroupObjectPermission)
+signals.post_delete.connect(group_permission_facets_changed, sender=GroupObjectPermission)
+signals.post_save.connect(groupprofile_facets_post_save, sender=GroupProfile)
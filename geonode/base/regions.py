@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2020 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+"""Spatial index of the metadata Regions
+
+The Region bounding boxes are reprojected to EPSG:4326 once and kept in a
+process level STRtree, so that matching the regions of a resource is a tree
+lookup instead of a reprojection and intersection test per Region.
+The index is rebuilt when a Region changes, in this process through the
+Region signals and in the other ones through a version read from the database
+(the Regions count and newest id) and, if a shared cache is configured, from
+the cache.
+"""
+
+import re
+import uuid
+import logging
+import traceback
+
+from threading import Lock
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.contrib.gis.geos import GEOSGeometry
+
+from shapely import wkt
+from shapely.strtree import STRtree
+
+logger = logging.getLogger(__name__)
+
+REGIONS_INDEX_VERSION_KEY = 'geonode.base.regions.version'
+
+_index = None
+_index_lock = Lock()
+
+
+def _to_4326(geographic_bounding_box):
+    srid, _wkt = geographic_bounding_box.split(";")
+    srid = re.findall(r'\d+', srid)
+    poly = GEOSGeometry(_wkt, srid=int(srid[0]))
+    poly.transform(4326)
+    return poly
+
+
+class RegionsIndex(object):
+
+    def __init__(self, regions, version=None):
+        self.version = version
+        self.global_regions = []
+        self._regions = []
+        self._geometries = []
+        for region in regions:
+            try:
+                geometry = wkt.loads(_to_4326(region.geographic_bounding_box).wkt)
+                self._geometries.append(geometry)
+                self._regions.append(region)
+            except Exception:
+                tb = traceback.format_exc()
+                if tb:
+                    logger.debug(tb)
+                continue
+            if region.level == 0 and region.parent_id is None:
+                self.global_regions.append(region)
+        self._tree = STRtree(self._geometries) if self._geometries else None
+        self._positions = {id(geometry): position for position, geometry in enumerate(self._geometries)}
+
+    def __len__(self):
+        return len(self._regions)
+
+    def _query(self, geometry):
+        """
+        Returns the positions of the geometries whose envelope intersects the geometry.
+        """
+        for candidate in self._tree.query(geometry):
+            # Shapely < 2.0 returns the geometries, later versions their positions
+            yield self._positions[id(candidate)] if hasattr(candidate, 'geom_type') else int(candidate)
+
+    def intersecting(self, geographic_bounding_box):
+        """
+        Returns the Regions, ordered by name, intersecting the bounding box.
+        """
+        if self._tree is None:
+            return []
+        geometry = wkt.loads(_to_4326(geographic_bounding_box).wkt)
+        regions = [self._regions[position] for position in self._query(geometry)
+                   if self._geometries[position].intersects(geometry)]
+        return sorted(regions, key=lambda region: region.name)
+
+
+def get_regions_index():
+    """
+    Returns the process level index of the Regions, rebuilding it if needed.
+    """
+    global _index
+    from geonode.base.models import Region
+    # the cache version alone is not shared by the processes with the default DummyCache
+    state = Region.objects.aggregate(count=Count('id'), last_id=Max('id'))
+    version = (state['count'], state['last_id'], cache.get(REGIONS_INDEX_VERSION_KEY))
+    index = _index
+    if index is None or index.version != version:
+        with _index_lock:
+            if _index is None or _index.version != version:
+                _index = RegionsIndex(Region.objects.all().order_by('name'), version=version)
+            index = _index
+    return index
+
+
+def invalidate_regions_index(*args, **kwargs):
+    global _index
+    with _index_lock:
+        _index = None
+    cache.set(REGIONS_INDEX_VERSION_KEY, uuid.uuid4().hex, None)
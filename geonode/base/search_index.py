@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2020 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+"""Queued, incremental Haystack index updates
+
+Saves and deletes of indexed objects are recorded in ``SearchIndexUpdate``
+(one row per object, so repeated saves are coalesced) and flushed in batches
+once the transaction commits, either inline or on the Celery ``update`` queue
+when ``HAYSTACK_QUEUE_CELERY`` is enabled. Objects failing to be indexed are
+retried on the next flushes and parked after ``HAYSTACK_QUEUE_MAX_RETRIES``
+attempts, so that they don't hold back the rest of the queue.
+"""
+
+import logging
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Min, Count
+from django.utils.timezone import now
+from django.contrib.contenttypes.models import ContentType
+
+from geonode.base.models import SearchIndexUpdate, SearchIndexFlush
+
+try:
+    from haystack.signals import BaseSignalProcessor
+except ImportError:
+    BaseSignalProcessor = object
+
+logger = logging.getLogger(__name__)
+
+
+def search_index_enabled():
+    return getattr(settings, 'HAYSTACK_SEARCH', False)
+
+
+def _is_indexed(model):
+    from haystack import connections
+    from haystack.exceptions import NotHandled
+    for using in connections.connections_info:
+        try:
+            connections[using].get_unified_index().get_index(model)
+            return True
+        except NotHandled:
+            pass
+    return False
+
+
+def enqueue(instance, action=SearchIndexUpdate.ACTION_UPDATE):
+    """
+    Records a pending index update of the instance and schedules a flush
+    once the current transaction commits.
+    """
+    if not search_index_enabled() or instance.pk is None:
+        return
+    model = instance.get_real_instance_class() if hasattr(instance, 'get_real_instance_class') \
+        else instance.__class__
+    if not _is_indexed(model):
+        return
+    SearchIndexUpdate.objects.update_or_create(
+        content_type=ContentType.objects.get_for_model(model),
+        object_id=instance.pk,
+        defaults={'action': action, 'enqueued': now(), 'retries': 0})
+    transaction.on_commit(schedule_flush)
+
+
+def _book_flush(debounce):
+    """
+    Returns True if no flush is scheduled in the next debounce seconds, and
+    books one. The booking is kept in the database, so that it is shared by
+    all the processes whatever the cache backend.
+    """
+    _now = now()
+    SearchIndexFlush.objects.get_or_create(id=1, defaults={'scheduled': _now})
+    return SearchIndexFlush.objects.filter(id=1, scheduled__lte=_now).update(
+        scheduled=_now + timedelta(seconds=debounce)) > 0
+
+
+def schedule_flush():
+    """
+    Flushes the pending updates inline, or debounces a Celery flush so that
+    a burst of saves ends up in one batched task.
+    """
+    if getattr(settings, 'HAYSTACK_QUEUE_CELERY', False):
+        debounce = getattr(settings, 'HAYSTACK_QUEUE_DEBOUNCE', 5)
+        if _book_flush(debounce):
+            from geonode.base.tasks import flush_search_index
+            flush_search_index.apply_async(countdown=debounce)
+    else:
+        flush(max_batches=1)
+
+
+def _update_backends(model, action, ids):
+    from haystack import connections, connection_router
+    from haystack.exceptions import NotHandled
+    for using in connection_router.for_write():
+        backend = connections[using].get_backend()
+        try:
+            index = connections[using].get_unified_index().get_index(model)
+        except NotHandled:
+            continue
+        found = set()
+        if action == SearchIndexUpdate.ACTION_UPDATE:
+            objs = list(index.index_queryset(using=using).filter(pk__in=ids))
+            objs = [obj for obj in objs if index.should_update(obj)]
+            if objs:
+                backend.update(index, objs)
+            found = set(obj.pk for obj in objs)
+        # deleted objects or objects not matching the index queryset anymore
+        for _id in set(ids) - found:
+            backend.remove('{}.{}'.format(model._meta.label_lower, _id))
+
+
+def _max_retries():
+    return getattr(settings, 'HAYSTACK_QUEUE_MAX_RETRIES', 3)
+
+
+def _update_backends_or_fail(model, action, items):
+    """
+    Sends the updates of a group of queued items, one by one if the whole
+    group fails. Returns the items which could not be sent.
+    """
+    try:
+        _update_backends(model, action, [item.object_id for item in items])
+        return []
+    except Exception:
+        if len(items) == 1:
+            logger.exception("Could not update the search index of %s %s", model._meta.label_lower,
+                             items[0].object_id)
+            return items
+    failed = []
+    for item in items:
+        failed.extend(_update_backends_or_fail(model, action, [item]))
+    return failed
+
+
+def flush(batch_size=None, max_batches=None):
+    """
+    Sends the pending updates to the search backends, batch_size objects at a
+    time. Returns the number of flushed objects.
+    """
+    batch_size = batch_size or getattr(settings, 'HAYSTACK_QUEUE_BATCH_SIZE', 100)
+    max_retries = _max_retries()
+    flushed = 0
+    batches = 0
+    # failing objects are retried by the next flushes, not by this one
+    failed_ids = set()
+    while max_batches is None or batches < max_batches:
+        started = now()
+        batch = list(SearchIndexUpdate.objects.filter(enqueued__lte=started, retries__lt=max_retries)
+                                              .exclude(id__in=failed_ids)
+                                              .order_by('enqueued')[:batch_size])
+        if not batch:
+            break
+        groups = {}
+        for item in batch:
+            groups.setdefault((item.content_type_id, item.action), []).append(item)
+        failed = []
+        for (content_type_id, action), items in groups.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            if model is None:
+                continue
+            failed.extend(_update_backends_or_fail(model, action, items))
+        if failed:
+            failed_ids.update(item.id for item in failed)
+            SearchIndexUpdate.objects.filter(id__in=[item.id for item in failed],
+                                             enqueued__lte=started).update(retries=F('retries') + 1)
+            parked = [item.object_id for item in failed if item.retries + 1 >= max_retries]
+            if parked:
+                logger.error("Parked the search index updates of %s after %s attempts", parked, max_retries)
+        # objects saved again in the meantime stay in the queue
+        SearchIndexUpdate.objects.filter(id__in=[item.id for item in batch if item.id not in failed_ids],
+                                         enqueued__lte=started).delete()
+        flushed += len(batch) - len(failed)
+        batches += 1
+    return flushed
+
+
+def index_lag():
+    """
+    Returns the number of pending updates, the age of the oldest one in
+    seconds, the number of pending updates per model and the number of parked
+    updates, which failed too many times.
+    """
+    q = SearchIndexUpdate.objects.all()
+    oldest = q.aggregate(oldest=Min('enqueued'))['oldest']
+    per_model = {}
+    for content_type_id, count in q.order_by().values_list('content_type').annotate(count=Count('id')):
+        per_model[ContentType.objects.get_for_id(content_type_id).model] = count
+    return {
+        'pending': sum(per_model.values()),
+        'lag': (now() - oldest).total_seconds() if oldest else 0,
+        'models': per_model,
+        'parked': q.filter(retries__gte=_max_retries()).count(),
+    }
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    """
+    Haystack signal processor queueing the updates instead of indexing
+    every saved object synchronously.
+    """
+
+    def setup(self):
+        from django.db.models import signals
+        signals.post_save.connect(self.handle_save)
+        signals.post_delete.connect(self.handle_delete)
+
+    def teardown(self):
+        from django.db.models import signals
+        signals.post_save.disconnect(self.handle_save)
+        signals.post_delete.disconnect(self.handle_delete)
+
+    def handle_save(self, sender, instance, **kwargs):
+        if kwargs.get('raw', False) or sender is SearchIndexUpdate:
+            return
+        enqueue(instance)
+
+    def handle_delete(self, sender, instance, **kwargs):
+        if sender is SearchIndexUpdate:
+            return
+        enqueue(instance, action=SearchIndexUpdate.ACTION_DELETE)
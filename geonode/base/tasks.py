@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2020 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+from geonode.celery_app import app
+from celery.utils.log import get_task_logger
+
+from .search_index import flush
+
+logger = get_task_logger(__name__)
+
+
+@app.task(bind=True, queue='update')
+def flush_search_index(self, *args, **kwargs):
+    """
+    Sends the queued search index updates to the search backends.
+    The saves queued after the booked flush time schedule a new flush,
+    see search_index._book_flush.
+    """
+    flushed = flush(*args, **kwargs)
+    logger.debug("Flushed %s search index updates", flushed)
+    return flushed
+
+
+@app.task(bind=True, queue='cleanup')
+def rebuild_facet_counts(self):
+    """
+    Recomputes the materialized facet counts, fixing any drift caused by
+    writes bypassing the signals.
+    """
+    from .facets import facet_counts_enabled, rebuild_facet_counts
+    if facet_counts_enabled():
+        logger.debug("Rebuilt %s facet entries", rebuild_facet_counts())
@@ -805,3 +805,146 @@ class TestGetVisibleResource(TestCase):
         assign_perm('view_resourcebase', self.user, self.rb)
         categories = get_visibile_resources(self.user)
         self.assertEqual(categories['iso_formats'].count(), 1)
+
+
+@override_settings(HAYSTACK_SEARCH=True)
+class TestSearchIndexQueue(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='search_index_user')
+        self.documents = [Document.objects.create(title='Doc {}'.format(i), owner=self.user) for i in range(3)]
+
+    @patch('geonode.base.search_index._is_indexed', return_value=True)
+    def test_repeated_saves_are_coalesced(self, mock_indexed):
+        from geonode.base.models import SearchIndexUpdate
+        from geonode.base.search_index import enqueue, index_lag
+        SearchIndexUpdate.objects.all().delete()
+        for _ in range(5):
+            for doc in self.documents:
+                enqueue(doc)
+        self.assertEqual(SearchIndexUpdate.objects.count(), 3)
+        enqueue(self.documents[0], action=SearchIndexUpdate.ACTION_DELETE)
+        self.assertEqual(SearchIndexUpdate.objects.count(), 3)
+        self.assertEqual(
+            SearchIndexUpdate.objects.get(object_id=self.documents[0].id).action,
+            SearchIndexUpdate.ACTION_DELETE)
+        lag = index_lag()
+        self.assertEqual(lag['pending'], 3)
+        self.assertEqual(lag['models'], {'document': 3})
+
+    @patch('geonode.base.search_index._update_backends')
+    @patch('geonode.base.search_index._is_indexed', return_value=True)
+    def test_flush_in_batches(self, mock_indexed, mock_update):
+        from geonode.base.models import SearchIndexUpdate
+        from geonode.base.search_index import enqueue, flush
+        SearchIndexUpdate.objects.all().delete()
+        for doc in self.documents:
+            enqueue(doc)
+        self.assertEqual(flush(batch_size=2, max_batches=1), 2)
+        self.assertEqual(SearchIndexUpdate.objects.count(), 1)
+        self.assertEqual(flush(batch_size=2), 1)
+        self.assertEqual(SearchIndexUpdate.objects.count(), 0)
+        self.assertEqual(mock_update.call_count, 2)
+        flushed_ids = [_id for call in mock_update.call_args_list for _id in call[0][2]]
+        self.assertEqual(sorted(flushed_ids), sorted(doc.id for doc in self.documents))
+
+    @override_settings(HAYSTACK_QUEUE_MAX_RETRIES=2)
+    @patch('geonode.base.search_index._update_backends')
+    @patch('geonode.base.search_index._is_indexed', return_value=True)
+    def test_flush_parks_failing_objects(self, mock_indexed, mock_update):
+        from geonode.base.models import SearchIndexUpdate
+        from geonode.base.search_index import enqueue, flush, index_lag
+        SearchIndexUpdate.objects.all().delete()
+        poisoned = self.documents[0].id
+
+        def _update(model, action, ids):
+            if poisoned in ids:
+                raise Exception('Cannot index {}'.format(poisoned))
+        mock_update.side_effect = _update
+        for doc in self.documents:
+            enqueue(doc)
+        self.assertEqual(flush(), 2)
+        self.assertEqual(list(SearchIndexUpdate.objects.values_list('object_id', 'retries')), [(poisoned, 1)])
+        self.assertEqual(flush(), 0)
+        self.assertEqual(index_lag()['parked'], 1)
+        calls = mock_update.call_count
+        self.assertEqual(flush(), 0)
+        self.assertEqual(mock_update.call_count, calls)
+        # saving the object again gives it another chance
+        enqueue(self.documents[0])
+        mock_update.side_effect = None
+        self.assertEqual(flush(), 1)
+        self.assertEqual(SearchIndexUpdate.objects.count(), 0)
+
+    @patch('geonode.base.tasks.flush', return_value=3)
+    def test_flush_task(self, mock_flush):
+        from geonode.base.tasks import flush_search_index
+        self.assertEqual(flush_search_index.apply().get(), 3)
+
+    def test_flush_is_booked_once(self):
+        from geonode.base.search_index import _book_flush
+        self.assertTrue(_book_flush(60))
+        self.assertFalse(_book_flush(60))
+
+
+class TestRegionsIndex(TestCase):
+    def setUp(self):
+        from geonode.base.models import Region
+        Region.objects.all().delete()
+        # a 10x10 grid of 36x18 degrees regions covering the world
+        for i in range(10):
+            for j in range(10):
+                Region.objects.create(
+                    code='R{}_{}'.format(i, j),
+                    name='Region {}_{}'.format(i, j),
+                    bbox_x0=-180 + i * 36, bbox_x1=-180 + (i + 1) * 36,
+                    bbox_y0=-90 + j * 18, bbox_y1=-90 + (j + 1) * 18,
+                    srid='EPSG:4326')
+
+    def test_index_invalidation(self):
+        from geonode.base.models import Region
+        from geonode.base.regions import get_regions_index
+        index = get_regions_index()
+        self.assertEqual(len(index), 100)
+        self.assertIs(index, get_regions_index())
+        Region.objects.create(code='R_new', name='Region new', bbox_x0=0, bbox_x1=1, bbox_y0=0, bbox_y1=1)
+        self.assertEqual(len(get_regions_index()), 101)
+
+    def test_index_invalidation_from_other_processes(self):
+        from django.db.models import signals
+        from geonode.base.models import Region, region_post_change
+        from geonode.base.regions import get_regions_index
+        self.assertEqual(len(get_regions_index()), 100)
+        # a Region added by another process does not fire the signals of this one
+        signals.post_save.disconnect(region_post_change, sender=Region)
+        try:
+            Region.objects.create(code='R_new', name='Region new', bbox_x0=0, bbox_x1=1, bbox_y0=0, bbox_y1=1)
+        finally:
+            signals.post_save.connect(region_post_change, sender=Region)
+        self.assertEqual(len(get_regions_index()), 101)
+
+    def test_intersecting_regions_benchmark(self):
+        import time
+        import random
+        from django.contrib.gis.geos import GEOSGeometry
+        from geonode.base.models import Region
+        from geonode.base.regions import get_regions_index
+        from geonode.utils import bbox_to_wkt
+
+        rnd = random.Random(42)
+        bboxes = []
+        for _ in range(10000):
+            x0, y0 = rnd.uniform(-180, 170), rnd.uniform(-90, 80)
+            bboxes.append(bbox_to_wkt(x0, x0 + rnd.uniform(0.1, 10), y0, y0 + rnd.uniform(0.1, 10), srid='EPSG:4326'))
+
+        index = get_regions_index()
+        start = time.time()
+        matches = [index.intersecting(bbox) for bbox in bboxes]
+        elapsed = time.time() - start
+
+        # same result as testing every region geometry
+        regions = [(region, GEOSGeometry(region.geographic_bounding_box.split(';')[1], srid=4326))
+                   for region in Region.objects.all().order_by('name')]
+        for bbox, matched in list(zip(bboxes, matches))[:200]:
+            poly = GEOSGeometry(bbox.split(';')[1], srid=4326)
+            self.assertEqual(matched, [region for region, geom in regions if geom.intersects(poly)])
+        self.assertLess(elapsed, 30)
@@ -115,6 +115,36 @@ def remove_duplicate_links(resource):
                 link_type='image')
 
 
+def backfill_ll_bbox(batch_size=500, missing_only=False):
+    """
+    Recomputes the normalized EPSG:4326 envelope of the resources, batch_size
+    resources at a time. Returns the number of updated resources.
+    """
+    _fields = ['ll_bbox_x0', 'll_bbox_x1', 'll_bbox_y0', 'll_bbox_y1']
+    queryset = ResourceBase.objects.non_polymorphic().only(
+        'id', 'bbox_x0', 'bbox_x1', 'bbox_y0', 'bbox_y1', 'srid', *_fields).order_by('id')
+    if missing_only:
+        queryset = queryset.filter(ll_bbox_x0__isnull=True)
+    updated = 0
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        to_update = []
+        for resource in batch:
+            envelope = resource.ll_bbox_envelope()
+            if any(getattr(resource, _k) != _v for _k, _v in envelope.items()):
+                for _k, _v in envelope.items():
+                    setattr(resource, _k, _v)
+                to_update.append(resource)
+        if to_update:
+            ResourceBase.objects.non_polymorphic().bulk_update(to_update, _fields)
+            updated += len(to_update)
+        last_id = batch[-1].id
+    return updated
+
+
 def configuration_session_cache(session):
     CONFIG_CACHE_TIMEOUT_SEC = 60
 
@@ -162,19 +162,22 @@ class Catalogue(CatalogueServiceWeb):
                      METADATA_FORMATS[mformat][1])))
         return urls
 
-    def csw_gen_xml(self, layer, template):
+    def csw_gen_xml_context(self):
+        """ template context shared by all the generated XML documents """
         id_pname = 'dc:identifier'
         if self.type == 'deegree':
             id_pname = 'apiso:Identifier'
         site_url = settings.SITEURL.rstrip('/') if settings.SITEURL.startswith('http') else settings.SITEURL
+        return {'SITEURL': site_url,
+                'id_pname': id_pname,
+                'LICENSES_METADATA': getattr(settings,
+                                             'LICENSES',
+                                             dict()).get('METADATA',
+                                                         'never')}
+
+    def csw_gen_xml(self, layer, template, context=None):
         tpl = get_template(template)
-        ctx = {'layer': layer,
-               'SITEURL': site_url,
-               'id_pname': id_pname,
-               'LICENSES_METADATA': getattr(settings,
-                                            'LICENSES',
-                                            dict()).get('METADATA',
-                                                        'never')}
+        ctx = dict(context or self.csw_gen_xml_context(), layer=layer)
         md_doc = tpl.render(context=ctx)
         return md_doc
 
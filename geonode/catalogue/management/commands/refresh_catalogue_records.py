@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2020 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+import time
+
+from django.core.management.base import BaseCommand
+from geonode.layers.models import Layer
+from geonode.documents.models import Document
+from geonode.catalogue.models import refresh_catalogue_records
+
+
+class Command(BaseCommand):
+    """Regenerates the catalogue records of Layers and Documents
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-t',
+            '--type',
+            dest='types',
+            action='append',
+            choices=['layer', 'document'],
+            help='Only refresh the records of the given resource type (can be repeated)')
+        parser.add_argument(
+            '-f',
+            '--filter',
+            dest='filter',
+            default=None,
+            help='Only refresh the resources whose title contains the given string')
+        parser.add_argument(
+            '--batch-size',
+            dest='batch_size',
+            type=int,
+            default=100,
+            help='Number of resources rendered and written at a time')
+
+    def handle(self, *args, **options):
+        models = {'layer': Layer, 'document': Document}
+        types = options.get('types') or list(models.keys())
+        start = time.time()
+        refreshed = 0
+        for _type in types:
+            queryset = models[_type].objects.all()
+            if options.get('filter'):
+                queryset = queryset.filter(title__icontains=options.get('filter'))
+            total = queryset.count()
+            type_start = time.time()
+
+            def progress(processed):
+                elapsed = time.time() - type_start
+                print("%s: %s/%s records (%.1f records/s)" % (
+                    _type, processed, total, processed / elapsed if elapsed else 0))
+
+            refreshed += refresh_catalogue_records(
+                queryset, batch_size=options.get('batch_size'), callback=progress)
+        elapsed = time.time() - start
+        print("Refreshed %s catalogue records in %.2f seconds (%.1f records/s)" % (
+            refreshed, elapsed, refreshed / elapsed if elapsed else 0))
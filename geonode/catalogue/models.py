@@ -22,24 +22,128 @@ import errno
 import logging
 
 from django.conf import settings
-from django.db.models import signals
+from django.db import transaction
+from django.db.models import F, signals
+from django.utils.timezone import now
 from lxml import etree
 from defusedxml import lxml as dlxml
 from geonode.layers.models import Layer
 from geonode.documents.models import Document
 from geonode.catalogue import get_catalogue
-from geonode.base.models import Link, ResourceBase
+from geonode.base.models import (
+    CatalogueChange, ContactRole, HierarchicalKeyword, Link, License, ResourceBase,
+    RestrictionCodeType, SpatialRepresentationType, TaggedContentItem, TopicCategory)
 
 
 LOGGER = logging.getLogger(__name__)
 
 
+def bump_catalogue_version():
+    """Marks the exported catalogue metadata as changed"""
+    if not CatalogueChange.objects.filter(id=1).update(version=F('version') + 1, modified=now()):
+        CatalogueChange.objects.get_or_create(id=1, defaults={'version': 1})
+
+
+def catalogue_changed(sender, **kwargs):
+    """Bumps the catalogue version once the change is committed"""
+    if kwargs.get('raw', False):
+        return
+    if sender in (ContactRole, HierarchicalKeyword, Link, TaggedContentItem) or \
+            issubclass(sender, ResourceBase) or sender._meta.label == settings.AUTH_USER_MODEL:
+        # outside of the transaction, to keep the lock on the row short
+        transaction.on_commit(bump_catalogue_version)
+
+
 def catalogue_pre_delete(instance, sender, **kwargs):
     """Removes the layer from the catalogue"""
     catalogue = get_catalogue()
     catalogue.remove_record(instance.uuid)
 
 
+def catalogue_record_fields(catalogue, instance, context=None):
+    """Returns the catalogue fields of the resource, rendering the metadata XML"""
+
+    # generate an XML document (GeoNode's default is ISO)
+    if instance.metadata_uploaded and instance.metadata_uploaded_preserve:
+        md_doc = etree.tostring(dlxml.fromstring(instance.metadata_xml))
+    else:
+        md_doc = catalogue.catalogue.csw_gen_xml(instance, 'catalogue/full_metadata.xml', context=context)
+
+    return {
+        'metadata_xml': md_doc,
+        'csw_wkt_geometry': instance.geographic_bounding_box.split(';')[-1],
+        'csw_anytext': catalogue.catalogue.csw_gen_anytext(md_doc)
+    }
+
+
+def refresh_catalogue_records(queryset, batch_size=100, callback=None):
+    """
+    Regenerates the catalogue records of the resources of the queryset,
+    batch_size resources at a time.
+
+    The template context and the related lookups are shared by the whole run,
+    the metadata links are created in bulk and the catalogue fields are
+    written with a single bulk update per batch.
+    callback, if any, is called after each batch with the number of processed
+    resources.
+    Returns the number of refreshed records.
+    """
+    catalogue = get_catalogue()
+    context = catalogue.catalogue.csw_gen_xml_context()
+    lookups = {
+        'license': {o.id: o for o in License.objects.all()},
+        'category': {o.id: o for o in TopicCategory.objects.all()},
+        'restriction_code_type': {o.id: o for o in RestrictionCodeType.objects.all()},
+        'spatial_representation_type': {o.id: o for o in SpatialRepresentationType.objects.all()},
+    }
+    fields = ['metadata_xml', 'csw_wkt_geometry', 'csw_anytext']
+
+    queryset = queryset.select_related('owner').prefetch_related('keywords', 'regions').order_by('id')
+    processed = 0
+    refreshed = 0
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        existing_links = set(Link.objects.filter(
+            resource_id__in=[instance.id for instance in batch],
+            link_type='metadata').values_list('resource_id', 'url'))
+        links = []
+        records = []
+        for instance in batch:
+            for field, lookup in lookups.items():
+                _id = getattr(instance, '{}_id'.format(field))
+                if _id in lookup:
+                    setattr(instance, field, lookup[_id])
+            try:
+                if not catalogue.catalogue.local:
+                    catalogue.create_record(instance)
+                for mime, name, metadata_url in catalogue.catalogue.urls_for_uuid(instance.uuid):
+                    if (instance.id, metadata_url) not in existing_links:
+                        links.append(Link(resource_id=instance.id,
+                                          url=metadata_url,
+                                          name=name,
+                                          extension='xml',
+                                          mime=mime,
+                                          link_type='metadata'))
+                records.append(ResourceBase(id=instance.id, **catalogue_record_fields(catalogue, instance, context)))
+            except Exception as e:
+                LOGGER.exception(e)
+
+        if links:
+            Link.objects.bulk_create(links)
+        if records:
+            ResourceBase.objects.non_polymorphic().bulk_update(records, fields)
+        processed += len(batch)
+        refreshed += len(records)
+        if callback:
+            callback(processed)
+    return refreshed
+
+
 def catalogue_post_save(instance, sender, **kwargs):
     """Get information from catalogue"""
 
@@ -96,21 +200,8 @@ def catalogue_post_save(instance, sender, **kwargs):
                                     extension='xml',
                                     link_type='metadata').update(**_d)
 
-        # generate an XML document (GeoNode's default is ISO)
-        if instance.metadata_uploaded and instance.metadata_uploaded_preserve:
-            md_doc = etree.tostring(dlxml.fromstring(instance.metadata_xml))
-        else:
-            md_doc = catalogue.catalogue.csw_gen_xml(instance, 'catalogue/full_metadata.xml')
-
-        csw_anytext = catalogue.catalogue.csw_gen_anytext(md_doc)
-
-        csw_wkt_geometry = instance.geographic_bounding_box.split(';')[-1]
-
         resources = ResourceBase.objects.filter(id=instance.resourcebase_ptr.id)
-
-        resources.update(metadata_xml=md_doc)
-        resources.update(csw_wkt_geometry=csw_wkt_geometry)
-        resources.update(csw_anytext=csw_anytext)
+        resources.update(**catalogue_record_fields(catalogue, instance))
     except Exception as e:
         LOGGER.debug(e)
     finally:
@@ -124,3 +215,6 @@ if 'geonode.catalogue' in settings.INSTALLED_APPS:
     signals.pre_delete.connect(catalogue_pre_delete, sender=Layer)
     signals.post_save.connect(catalogue_post_save, sender=Document)
     signals.pre_delete.connect(catalogue_pre_delete, sender=Document)
+    # resources, keywords, links and points of contact are exported by data.json
+    signals.post_save.connect(catalogue_changed, dispatch_uid='catalogue_changed')
+    signals.post_delete.connect(catalogue_changed, dispatch_uid='catalogue_changed')
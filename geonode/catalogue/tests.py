@@ -21,7 +21,9 @@
 from geonode.tests.base import GeoNodeBaseTestSupport
 
 import json
+from unittest.mock import patch
 from django.urls import reverse
+from django.utils.timezone import now
 from geonode.compat import ensure_string
 from geonode.catalogue import get_catalogue
 from geonode.base.models import ResourceBase
@@ -40,8 +42,8 @@ class CatalogueTest(GeoNodeBaseTestSupport):
     def test_data_json(self):
         """Test that the data.json representation behaves correctly"""
 
-        response = self.client.get(reverse('data_json')).content
-        data_json = json.loads(ensure_string(response))
+        response = self.client.get(reverse('data_json'))
+        data_json = json.loads(ensure_string(b''.join(response.streaming_content)))
 
         len1 = len(ResourceBase.objects.all())
         len2 = len(data_json)
@@ -65,3 +67,94 @@ class CatalogueTest(GeoNodeBaseTestSupport):
                 sorted(record_keys),
                 sorted(list(record.keys())),
                 'Expected specific list of fields to output')
+
+    def test_data_json_conditional(self):
+        """Test that unchanged data.json exports are not sent again"""
+
+        response = self.client.get(reverse('data_json'))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        response = self.client.get(reverse('data_json'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        ResourceBase.objects.filter(id=ResourceBase.objects.first().id).update(csw_insert_date=now())
+        response = self.client.get(reverse('data_json'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_data_json_catalogue_changes(self):
+        """Test that changes to the exported related objects invalidate data.json"""
+        from geonode.base.models import Link
+        from geonode.catalogue.models import bump_catalogue_version
+
+        response = self.client.get(reverse('data_json'))
+        etag = response['ETag']
+
+        resource = ResourceBase.objects.first()
+        with patch('geonode.catalogue.models.transaction.on_commit') as mock_on_commit:
+            Link.objects.create(resource=resource, url='http://example.com/data.zip', mime='application/zip')
+            mock_on_commit.assert_called_with(bump_catalogue_version)
+        bump_catalogue_version()
+        response = self.client.get(reverse('data_json'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_data_json_chunks(self):
+        """Test that the data.json stream does not depend on the chunk size"""
+        from geonode.catalogue.views import _data_json_stream
+
+        data_json = json.loads(''.join(_data_json_stream()))
+        self.assertEqual(json.loads(''.join(_data_json_stream(chunk_size=1))), data_json)
+        self.assertEqual(len(data_json), ResourceBase.objects.count())
+
+    def test_authorized_resources_sql(self):
+        """Test that the pycsw permission filter matches guardian"""
+        from guardian.shortcuts import get_objects_for_user, get_anonymous_user
+        from django.contrib.auth import get_user_model
+        from geonode.catalogue.views import authorized_resources_sql
+
+        for user in (get_anonymous_user(),
+                     get_user_model().objects.get(username='bobby'),
+                     get_user_model().objects.get(username='admin')):
+            sql = authorized_resources_sql(user)
+            authorized = ResourceBase.objects.extra(where=['id IN ({})'.format(sql)])
+            self.assertEqual(
+                set(authorized.values_list('id', flat=True)),
+                set(get_objects_for_user(user, 'base.view_resourcebase').values_list('id', flat=True)))
+
+    def test_refresh_catalogue_records(self):
+        """Test the bulk regeneration of the catalogue records"""
+        from geonode.layers.models import Layer
+        from geonode.base.models import Link
+        from geonode.catalogue.models import refresh_catalogue_records, catalogue_record_fields
+
+        layers = Layer.objects.all()
+        ResourceBase.objects.filter(id__in=layers.values('id')).update(
+            metadata_xml=None, csw_wkt_geometry=None, csw_anytext=None)
+        Link.objects.filter(resource__in=layers.values('id'), link_type='metadata').delete()
+
+        batches = []
+        self.assertEqual(refresh_catalogue_records(layers, batch_size=2, callback=batches.append),
+                         layers.count())
+        self.assertEqual(batches[-1], layers.count())
+
+        catalogue = get_catalogue()
+        for layer in layers:
+            self.assertEqual(
+                {
+                    'metadata_xml': layer.metadata_xml,
+                    'csw_wkt_geometry': layer.csw_wkt_geometry,
+                    'csw_anytext': layer.csw_anytext
+                },
+                catalogue_record_fields(catalogue, layer))
+            self.assertEqual(
+                layer.link_set.filter(link_type='metadata').count(),
+                len(catalogue.catalogue.urls_for_uuid(layer.uuid)))
+
+        # links are not duplicated on the next runs
+        refresh_catalogue_records(layers)
+        self.assertEqual(
+            Link.objects.filter(resource__in=layers.values('id'), link_type='metadata').count(),
+            sum([len(catalogue.catalogue.urls_for_uuid(layer.uuid)) for layer in layers]))
@@ -20,26 +20,62 @@
 
 import json
 import os
+import hashlib
 import logging
 import xml.etree.ElementTree as ET
 from defusedxml import lxml as dlxml
 from django.conf import settings
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import render
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from pycsw import server
-from guardian.shortcuts import get_objects_for_user
+from guardian.models import UserObjectPermission, GroupObjectPermission
 from geonode.catalogue.backends.pycsw_local import CONFIGURATION
 from geonode.base.models import ResourceBase
 from geonode.layers.models import Layer
 from geonode.base.auth import get_or_create_token
-from geonode.base.models import ContactRole, SpatialRepresentationType
+from geonode.base.models import CatalogueChange, ContactRole, Link, SpatialRepresentationType
 from geonode.groups.models import GroupProfile
 from django.db import connection
+from django.db.models import Count, Max, Prefetch, IntegerField
+from django.db.models.functions import Cast
 from django.core.exceptions import ObjectDoesNotExist
 
 
+def _inline_sql(queryset):
+    sql, params = queryset.query.sql_with_params()
+    # only integer parameters can be safely inlined in the pycsw filter
+    if not all(isinstance(param, int) for param in params):
+        raise ValueError("Cannot inline the parameters %s" % (params, ))
+    return sql % tuple(params)
+
+
+def authorized_resources_sql(user):
+    """
+    Returns a SQL subquery selecting the ids of the resources the user can
+    view, against the guardian tables, so that the size of the pycsw filter
+    does not depend on the number of resources.
+    """
+    if user.is_superuser or user.has_perm('base.view_resourcebase'):
+        return _inline_sql(ResourceBase.objects.order_by().values('id'))
+    permission = Permission.objects.get(
+        content_type=ContentType.objects.get_for_model(ResourceBase),
+        codename='view_resourcebase')
+    user_perms = UserObjectPermission.objects.filter(
+        user_id=user.id,
+        permission_id=permission.id).annotate(
+            resource_id=Cast('object_pk', IntegerField())).order_by().values('resource_id')
+    group_perms = GroupObjectPermission.objects.filter(
+        group_id__in=user.groups.order_by().values('id'),
+        permission_id=permission.id).annotate(
+            resource_id=Cast('object_pk', IntegerField())).order_by().values('resource_id')
+    return "{} UNION {}".format(_inline_sql(user_perms), _inline_sql(group_perms))
+
+
 @csrf_exempt
 def csw_global_dispatch(request):
     """pycsw wrapper"""
@@ -76,31 +112,18 @@ def csw_global_dispatch(request):
 
     try:
         # Filter out Layers not accessible to the User
-        authorized_ids = []
+        authorized_layers_filter = "id = -9999"
         if request.user:
             profiles = get_user_model().objects.filter(username=str(request.user))
         else:
             profiles = get_user_model().objects.filter(username="AnonymousUser")
         if profiles:
-            authorized = list(
-                get_objects_for_user(
-                    profiles[0],
-                    'base.view_resourcebase').values('id'))
-            layers = ResourceBase.objects.filter(
-                id__in=[d['id'] for d in authorized])
-            if layers:
-                authorized_ids = [d['id'] for d in authorized]
-
-        if len(authorized_ids) > 0:
-            authorized_layers = "(" + (", ".join(str(e)
-                                                 for e in authorized_ids)) + ")"
-            authorized_layers_filter = "id IN " + authorized_layers
+            authorized_layers_filter = "id IN ({})".format(authorized_resources_sql(profiles[0]))
             mdict['repository']['filter'] += " AND " + authorized_layers_filter
             if request.user and request.user.is_authenticated:
                 mdict['repository']['filter'] = "({}) OR ({})".format(mdict['repository']['filter'],
                                                                       authorized_layers_filter)
         else:
-            authorized_layers_filter = "id = -9999"
             mdict['repository']['filter'] += " AND " + authorized_layers_filter
 
         # Filter out Documents and Maps
@@ -215,34 +238,87 @@ def opensearch_dispatch(request):
                   content_type='application/opensearchdescription+xml')
 
 
+DATA_JSON_CHUNK_SIZE = 500
+
+
+def _data_json_queryset():
+    return ResourceBase.objects.non_polymorphic().order_by('id').prefetch_related(
+        'keywords',
+        Prefetch('link_set', queryset=Link.objects.only('resource', 'url', 'mime').order_by('id')),
+        Prefetch('contactrole_set',
+                 queryset=ContactRole.objects.filter(role='pointOfContact').select_related('contact'),
+                 to_attr='_data_json_pocs'))
+
+
+def _data_json_record(resource):
+    poc = resource._data_json_pocs[0].contact if resource._data_json_pocs else None
+    return {
+        'title': resource.title,
+        'description': resource.abstract,
+        'keyword': ','.join([kw.name for kw in resource.keywords.all()]).split(','),
+        'modified': resource.csw_insert_date.isoformat() if resource.csw_insert_date else None,
+        'publisher': poc.organization if poc else None,
+        'contactPoint': poc.name_long if poc else None,
+        'mbox': poc.email if poc else None,
+        'identifier': resource.uuid,
+        'accessLevel': 'public' if resource.is_published else 'non-public',
+        'distribution': [{
+            'accessURL': link.url,
+            'format': link.mime
+        } for link in resource.link_set.all()],
+    }
+
+
+def _data_json_stream(chunk_size=DATA_JSON_CHUNK_SIZE):
+    """Yields the data.json records, fetching chunk_size resources at a time"""
+    queryset = _data_json_queryset()
+    last_id = None
+    separator = ''
+    yield '['
+    while True:
+        chunk = queryset if last_id is None else queryset.filter(id__gt=last_id)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            break
+        for resource in chunk:
+            yield separator + json.dumps(_data_json_record(resource))
+            separator = ','
+        last_id = chunk[-1].id
+    yield ']'
+
+
+def _data_json_state(request):
+    """
+    Returns the catalogue version, bumped by the signals of the exported models,
+    along with the resources count and newest catalogue record, which also
+    catch the writes bypassing the signals.
+    """
+    if not hasattr(request, '_data_json_state'):
+        state = ResourceBase.objects.aggregate(count=Count('id'), last_modified=Max('csw_insert_date'))
+        change = CatalogueChange.objects.filter(id=1).first()
+        state['version'] = change.version if change else 0
+        if change and (state['last_modified'] is None or change.modified > state['last_modified']):
+            state['last_modified'] = change.modified
+        request._data_json_state = state
+    return request._data_json_state
+
+
+def _data_json_etag(request):
+    state = _data_json_state(request)
+    last_modified = state['last_modified'].isoformat() if state['last_modified'] else ''
+    return hashlib.md5('{}-{}-{}'.format(
+        state['version'], state['count'], last_modified).encode('utf-8')).hexdigest()
+
+
+def _data_json_last_modified(request):
+    return _data_json_state(request)['last_modified']
+
+
 @csrf_exempt
+@condition(etag_func=_data_json_etag, last_modified_func=_data_json_last_modified)
 def data_json(request):
     """Return data.json representation of catalogue"""
-    json_data = []
-    for resource in ResourceBase.objects.all():
-        record = {}
-        record['title'] = resource.title
-        record['description'] = resource.abstract
-        record['keyword'] = resource.keyword_csv.split(',')
-        record['modified'] = resource.csw_insert_date.isoformat()
-        record['publisher'] = resource.poc.organization if resource.poc else None
-        record['contactPoint'] = resource.poc.name_long if resource.poc else None
-        record['mbox'] = resource.poc.email if resource.poc else None
-        record['identifier'] = resource.uuid
-        if resource.is_published:
-            record['accessLevel'] = 'public'
-        else:
-            record['accessLevel'] = 'non-public'
-
-        record['distribution'] = []
-        for link in resource.link_set.all():
-            record['distribution'].append({
-                'accessURL': link.url,
-                'format': link.mime
-            })
-        json_data.append(record)
-
-    return HttpResponse(json.dumps(json_data), 'application/json')
+    return StreamingHttpResponse(_data_json_stream(), content_type='application/json')
 
 
 # transforms a row sql query into a two dimension array
@@ -47,7 +47,8 @@ from geonode.base.auth import get_or_create_token
 from geonode.base.forms import CategoryForm, TKeywordForm
 from geonode.base.models import (
     Thesaurus,
-    TopicCategory)
+    TopicCategory,
+    get_ll_bbox_envelope)
 from geonode.documents.models import Document, get_related_resources
 from geonode.documents.forms import DocumentForm, DocumentCreateForm, DocumentReplaceForm
 from geonode.documents.models import IMGTYPES
@@ -282,7 +283,8 @@ class DocumentUploadView(CreateView):
                 bbox_x0=bbox_x0,
                 bbox_x1=bbox_x1,
                 bbox_y0=bbox_y0,
-                bbox_y1=bbox_y1)
+                bbox_y1=bbox_y1,
+                **get_ll_bbox_envelope(bbox_x0, bbox_x1, bbox_y0, bbox_y1, srid=self.object.srid))
 
         if getattr(settings, 'SLACK_ENABLED', False):
             try:
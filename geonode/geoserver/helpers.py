@@ -25,6 +25,7 @@ import uuid
 # import base64
 import json
 import errno
+import hashlib
 import logging
 import datetime
 import traceback
@@ -37,7 +38,8 @@ from itertools import cycle
 from decimal import Decimal
 from collections import namedtuple, defaultdict
 from os.path import basename, splitext, isfile
-from threading import local
+from threading import local, Lock
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode, urlsplit, urljoin
 from pinax.ratings.models import OverallRating
 from bs4 import BeautifulSoup
@@ -45,6 +47,7 @@ from dialogos.models import Comment
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
 from django.db.models.signals import pre_delete
 from django.template.loader import render_to_string
 from django.utils import timezone
@@ -543,6 +546,27 @@ def delete_from_postgis(layer_name, store):
             logger.error("Error closing PostGIS conn %s:%s", layer_name, str(e))
 
 
+def gs_resource_fingerprint(resource):
+    """
+    Returns a hash of the GeoServer resource properties gs_slurp synchronizes.
+    """
+    attributes = getattr(resource, 'attributes', None) if isinstance(resource, FeatureType) else None
+    data = {
+        'name': resource.name,
+        'workspace': resource.workspace.name if resource.workspace else None,
+        'store': resource.store.name if resource.store else None,
+        'title': resource.title,
+        'abstract': resource.abstract,
+        'native_bbox': resource.native_bbox,
+        'projection': resource.projection,
+        'keywords': resource.keywords,
+        'attributes': attributes,
+        'enabled': resource.enabled,
+        'advertised': resource.advertised,
+    }
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
 def gs_slurp(
         ignore_errors=True,
         verbosity=1,
@@ -555,16 +579,26 @@ def gs_slurp(
         skip_geonode_registered=False,
         remove_deleted=False,
         permissions=None,
-        execute_signals=False):
+        execute_signals=False,
+        incremental=False,
+        workers=1):
     """Configure the layers available in GeoServer in GeoNode.
 
        It returns a list of dictionaries with the name of the layer,
        the result of the operation and the errors and traceback if it failed.
+
+       With incremental=True the GeoServer resources whose fingerprint did not
+       change since the last synchronization are skipped. The resources are
+       processed by a pool of ``workers`` threads.
     """
+    from geonode.geoserver.models import GsResourceFingerprint
+
     if console is None:
         console = open(os.devnull, 'w')
     if verbosity > 0:
         print("Inspecting the available layers in GeoServer ...", file=console)
+    phase_start = time.time()
+    phases = {}
     cat = gs_catalog
     if workspace is not None:
         workspace = cat.get_workspace(workspace)
@@ -631,7 +665,7 @@ def gs_slurp(
                 raise
 
     # filter out layers already registered in geonode
-    layer_names = Layer.objects.all().values_list('alternate', flat=True)
+    layer_names = set(Layer.objects.all().values_list('alternate', flat=True))
     if skip_geonode_registered:
         try:
             resources = [k for k in resources
@@ -646,6 +680,10 @@ def gs_slurp(
     # i.e. look for matching layers in GeoNode and also disable?
     # disabled_resources = [k for k in resources if k.enabled == "false"]
 
+    fingerprints = {}
+    if incremental:
+        fingerprints = dict(GsResourceFingerprint.objects.values_list('alternate', 'fingerprint'))
+
     number = len(resources)
     if verbosity > 0:
         msg = "Found %d layers, starting processing" % number
@@ -656,21 +694,34 @@ def gs_slurp(
             'updated': 0,
             'created': 0,
             'deleted': 0,
+            'skipped': 0,
         },
         'layers': [],
         'deleted_layers': []
     }
+    phases['inspect'] = time.time() - phase_start
+    phase_start = time.time()
     start = datetime.datetime.now(timezone.get_current_timezone())
-    for i, resource in enumerate(resources):
+
+    def process_resource(resource):
         name = resource.name
         the_store = resource.store
         workspace = the_store.workspace
+        alternate = "%s:%s" % (workspace.name, resource.name)
+        fingerprint = None
+        info = {'name': name}
         try:
+            if incremental:
+                fingerprint = gs_resource_fingerprint(resource)
+                if alternate in layer_names and fingerprints.get(alternate) == fingerprint:
+                    info['status'] = 'skipped'
+                    return info
+
             layer, created = Layer.objects.get_or_create(name=name, workspace=workspace.name, defaults={
                 # "workspace": workspace.name,
                 "store": the_store.name,
                 "storeType": the_store.resource_type,
-                "alternate": "%s:%s" % (workspace.name, resource.name),
+                "alternate": alternate,
                 "title": resource.title or 'No title provided',
                 "abstract": resource.abstract or "{}".format(_('No abstract provided')),
                 "owner": owner,
@@ -705,10 +756,19 @@ def gs_slurp(
                     resource.metadata_links = metadata_links
                     cat.save(resource)
 
+            if created:
+                if not permissions:
+                    layer.set_default_permissions()
+                else:
+                    layer.set_permissions(permissions)
+
+            if incremental:
+                GsResourceFingerprint.objects.update_or_create(
+                    alternate=alternate, defaults={'fingerprint': fingerprint})
         except Exception as e:
             if ignore_errors:
-                status = 'failed'
-                exception_type, error, traceback = sys.exc_info()
+                info['status'] = 'failed'
+                info['exception_type'], info['error'], info['traceback'] = sys.exc_info()
             else:
                 if verbosity > 0:
                     msg = "Stopping process because --ignore-errors was not set and an error was found."
@@ -719,28 +779,32 @@ def gs_slurp(
                     sys.exc_info()[2]
                 )
         else:
-            if created:
-                if not permissions:
-                    layer.set_default_permissions()
-                else:
-                    layer.set_permissions(permissions)
-
-                status = 'created'
-                output['stats']['created'] += 1
-            else:
-                status = 'updated'
-                output['stats']['updated'] += 1
-
-        msg = "[%s] Layer %s (%d/%d)" % (status, name, i + 1, number)
-        info = {'name': name, 'status': status}
-        if status == 'failed':
-            output['stats']['failed'] += 1
-            info['traceback'] = traceback
-            info['exception_type'] = exception_type
-            info['error'] = error
-        output['layers'].append(info)
-        if verbosity > 0:
-            print(msg, file=console)
+            info['status'] = 'created' if created else 'updated'
+        finally:
+            if workers > 1:
+                # every worker thread holds its own database connection
+                connection.close()
+        return info
+
+    if workers > 1:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        results = executor.map(process_resource, resources)
+    else:
+        executor = None
+        results = map(process_resource, resources)
+    try:
+        for i, info in enumerate(results):
+            status = info['status']
+            output['stats'][status] += 1
+            output['layers'].append(info)
+            msg = "[%s] Layer %s (%d/%d)" % (status, info['name'], i + 1, number)
+            if verbosity > 0:
+                print(msg, file=console)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+    phases['process'] = time.time() - phase_start
+    phase_start = time.time()
 
     if remove_deleted:
         q = Layer.objects.filter()
@@ -760,36 +824,22 @@ def gs_slurp(
             else:
                 q = q.filter(store__exact=store)
         logger.debug("Executing 'remove_deleted' logic")
-        logger.debug("GeoNode Layers Found:")
 
         # compare the list of GeoNode layers obtained via query/filter with valid resources found in GeoServer
         # filtered per options passed to updatelayers: --workspace, --store, --skip-unadvertised
         # add any layers not found in GeoServer to deleted_layers (must match
         # workspace and store as well):
-        deleted_layers = []
-        for layer in q:
+        geoserver_index = set(
+            (resource.name, resource.workspace.name, resource.store.name)
+            for resource in resources_for_delete_compare)
+        deleted_ids = [
+            _id for _id, name, _workspace, _store in q.values_list('id', 'name', 'workspace', 'store')
+            if (name, _workspace, _store) not in geoserver_index]
+        deleted_layers = list(Layer.objects.filter(id__in=deleted_ids))
+        for layer in deleted_layers:
             logger.debug(
-                "GeoNode Layer info: name: %s, workspace: %s, store: %s",
-                layer.name,
-                layer.workspace,
-                layer.store)
-            layer_found_in_geoserver = False
-            for resource in resources_for_delete_compare:
-                # if layer.name matches a GeoServer resource, check also that
-                # workspace and store match, mark valid:
-                if layer.name == resource.name:
-                    if layer.workspace == resource.workspace.name and layer.store == resource.store.name:
-                        logger.debug(
-                            "Matches GeoServer layer: name: %s, workspace: %s, store: %s",
-                            resource.name,
-                            resource.workspace.name,
-                            resource.store.name)
-                        layer_found_in_geoserver = True
-            if not layer_found_in_geoserver:
-                logger.debug(
-                    "----- Layer %s not matched, marked for deletion ---------------",
-                    layer.name)
-                deleted_layers.append(layer)
+                "----- Layer %s not matched, marked for deletion ---------------",
+                layer.name)
 
         number_deleted = len(deleted_layers)
         if verbosity > 0:
@@ -815,6 +865,7 @@ def gs_slurp(
                 layer.keywords.clear()
 
                 layer.delete()
+                GsResourceFingerprint.objects.filter(alternate=layer.alternate).delete()
                 output['stats']['deleted'] += 1
                 status = "delete_succeeded"
             except Exception:
@@ -836,11 +887,13 @@ def gs_slurp(
             output['deleted_layers'].append(info)
             if verbosity > 0:
                 print(msg, file=console)
+        phases['delete'] = time.time() - phase_start
 
     finish = datetime.datetime.now(timezone.get_current_timezone())
     td = finish - start
     output['stats']['duration_sec'] = td.microseconds / \
         1000000 + td.seconds + td.days * 24 * 3600
+    output['stats']['phases'] = phases
     return output
 
 
@@ -1465,6 +1518,80 @@ def get_store(cat, name, workspace=None):
         raise FailedRequestError("No store found named: " + name)
 
 
+class GsResourceWriter(object):
+    """
+    Accumulates the changes to one GeoServer resource and sends them with
+    a single PUT, only if any value actually differs from the catalog.
+    """
+    # process wide counters of sent and skipped catalog writes
+    stats = {'sent': 0, 'skipped': 0, 'failed': 0}
+    _stats_lock = Lock()
+
+    def __init__(self, catalog, resource):
+        self.catalog = catalog
+        self.resource = resource
+        self.changes = {}
+
+    @staticmethod
+    def _normalize(attr, value):
+        if attr in ('title', 'abstract', 'name'):
+            return value or ''
+        if attr == 'advertised':
+            return str(value).lower() == 'true'
+        if attr == 'keywords':
+            return sorted(set(value or []))
+        if attr == 'metadata_links':
+            # GeoServer stores the unsupported metadata types as 'other'
+            links = []
+            for (mime, md_type, content_url) in [_l for _l in (value or []) if _l]:
+                if md_type not in ['ISO19115:2003', 'FGDC', 'TC211']:
+                    mime = md_type = 'other'
+                links.append((mime, md_type, content_url))
+            return links
+        return value
+
+    def set(self, attr, value):
+        """
+        Sets the attribute of the resource if it differs from the current one.
+        """
+        try:
+            current = getattr(self.resource, attr)
+        except AttributeError:
+            current = None
+        if self._normalize(attr, current) != self._normalize(attr, value):
+            setattr(self.resource, attr, value)
+            self.changes[attr] = value
+            return True
+        return False
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def save(self):
+        """
+        Sends the pending changes to GeoServer, if any.
+        Returns True if a write has been sent.
+        """
+        if not self.changes or not getattr(ogc_server_settings, "BACKEND_WRITE_ENABLED", True):
+            self._count('skipped')
+            logger.debug("Skipping GeoServer write for %s, nothing changed" % self.resource)
+            return False
+        try:
+            self.catalog.save(self.resource)
+            self._count('sent')
+            return True
+        except FailedRequestError as e:
+            self._count('failed')
+            msg = ('Error while trying to save resource named %s in GeoServer, '
+                   'try to use: "%s"' % (self.resource, str(e)))
+            e.args = (msg,)
+            logger.exception(e)
+            return False
+        finally:
+            self.changes = {}
+
+
 class ServerDoesNotExist(Exception):
     pass
 
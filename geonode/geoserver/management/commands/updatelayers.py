@@ -86,6 +86,18 @@ class Command(BaseCommand):
             dest="permissions",
             default=None,
             help="Permissions to apply to each layer")
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            dest='incremental',
+            default=False,
+            help='Skip the GeoServer layers that did not change since the last run.'),
+        parser.add_argument(
+            '--workers',
+            dest="workers",
+            type=int,
+            default=1,
+            help="Number of layers processed in parallel")
 
     def handle(self, **options):
         ignore_errors = options.get('ignore_errors')
@@ -102,6 +114,8 @@ class Command(BaseCommand):
             permissions = None
         else:
             permissions = ast.literal_eval(options.get('permissions'))
+        incremental = options.get('incremental')
+        workers = max(1, options.get('workers') or 1)
 
         if verbosity > 0:
             console = sys.stdout
@@ -120,7 +134,9 @@ class Command(BaseCommand):
             skip_geonode_registered=skip_geonode_registered,
             remove_deleted=remove_deleted,
             permissions=permissions,
-            execute_signals=True)
+            execute_signals=True,
+            incremental=incremental,
+            workers=workers)
 
         if verbosity > 1:
             print("\nDetailed report of failures:")
@@ -145,6 +161,7 @@ class Command(BaseCommand):
             print("{} Created layers".format(output['stats']['created']))
             print("{} Updated layers".format(output['stats']['updated']))
             print("{} Failed layers".format(output['stats']['failed']))
+            print("{} Skipped layers".format(output['stats']['skipped']))
             try:
                 duration_layer = round(
                     output['stats']['duration_sec'] * 1.0 / len(output['layers']), 2)
@@ -152,5 +169,13 @@ class Command(BaseCommand):
                 duration_layer = 0
             if len(output) > 0:
                 print("{} seconds per layer".format(duration_layer))
+            try:
+                throughput = round(len(output['layers']) / output['stats']['duration_sec'], 2)
+            except ZeroDivisionError:
+                throughput = 0
+            print("{} layers per second".format(throughput))
+            print("\nTiming breakdown:")
+            for phase, duration in output['stats']['phases'].items():
+                print("  {}: {} seconds".format(phase, round(duration, 2)))
             if remove_deleted:
                 print("\n{} Deleted layers".format(output['stats']['deleted']))
@@ -17,3 +17,18 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 #########################################################################
+
+from django.db import models
+
+
+class GsResourceFingerprint(models.Model):
+    """
+    Fingerprint of the GeoServer resource a layer has been last synchronized
+    with by ``gs_slurp``, used to skip the unchanged ones on incremental runs.
+    """
+    alternate = models.CharField(max_length=255, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    last_sync = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return "{0}: {1}".format(self.alternate, self.fingerprint)
@@ -19,7 +19,6 @@
 #########################################################################
 import errno
 import logging
-import geoserver
 
 from time import sleep
 from requests.exceptions import ConnectionError
@@ -37,6 +36,7 @@ from geonode.utils import (
 from geonode.decorators import on_ogc_backend
 from geonode.geoserver.upload import geoserver_upload
 from geonode.geoserver.helpers import (
+    GsResourceWriter,
     set_attributes_from_geoserver,
     set_styles,
     gs_catalog,
@@ -169,21 +169,17 @@ def geoserver_post_save_local(instance, *args, **kwargs):
                     gs_resource = None
 
         if gs_resource:
-            gs_resource.title = instance.title or ""
-            gs_resource.abstract = instance.abstract or ""
-            gs_resource.name = instance.name or ""
-
             if not values:
                 values = dict(store=gs_resource.store.name,
                               storeType=gs_resource.store.resource_type,
-                              alternate=gs_resource.store.workspace.name + ':' + gs_resource.name,
+                              alternate=gs_resource.store.workspace.name + ':' + (instance.name or gs_resource.name),
                               title=gs_resource.title or gs_resource.store.name,
                               abstract=gs_resource.abstract or '',
                               owner=instance.owner)
         else:
             msg = "There isn't a geoserver resource for this layer: %s" % instance.name
             logger.exception(msg)
-            if tries >= _max_tries:
+            if tries >= _max_tries - 1:
                 # raise GeoNodeException(msg)
                 return (values, None)
             gs_resource = None
@@ -202,17 +198,12 @@ def geoserver_post_save_local(instance, *args, **kwargs):
 
     if gs_resource:
         logger.debug("Found geoserver resource for this layer: %s" % instance.name)
-        gs_resource.metadata_links = metadata_links
-        # gs_resource should only be called if
-        # ogc_server_settings.BACKEND_WRITE_ENABLED == True
-        if getattr(ogc_server_settings, "BACKEND_WRITE_ENABLED", True):
-            try:
-                gs_catalog.save(gs_resource)
-            except geoserver.catalog.FailedRequestError as e:
-                msg = ('Error while trying to save resource named %s in GeoServer, '
-                       'try to use: "%s"' % (gs_resource, str(e)))
-                e.args = (msg,)
-                logger.exception(e)
+        # all the changes are sent to GeoServer at once, and only if needed
+        gs_writer = GsResourceWriter(gs_catalog, gs_resource)
+        gs_writer.set('title', instance.title or "")
+        gs_writer.set('abstract', instance.abstract or "")
+        gs_writer.set('name', instance.name or "")
+        gs_writer.set('metadata_links', metadata_links)
 
         # Update Attribution link
         if instance.poc:
@@ -226,16 +217,30 @@ def geoserver_post_save_local(instance, *args, **kwargs):
             profile = get_user_model().objects.get(username=instance.poc.username)
             site_url = settings.SITEURL.rstrip('/') if settings.SITEURL.startswith('http') else settings.SITEURL
             gs_resource.attribution_link = site_url + profile.get_absolute_url()
-            # gs_resource should only be called if
-            # ogc_server_settings.BACKEND_WRITE_ENABLED == True
-            if getattr(ogc_server_settings, "BACKEND_WRITE_ENABLED", True):
-                try:
-                    gs_catalog.save(gs_resource)
-                except geoserver.catalog.FailedRequestError as e:
-                    msg = ('Error while trying to save layer named %s in GeoServer, '
-                           'try to use: "%s"' % (gs_resource, str(e)))
-                    e.args = (msg,)
-                    logger.exception(e)
+
+        try:
+            if settings.RESOURCE_PUBLISHING:
+                gs_writer.set('advertised', 'true')
+
+            if not settings.FREETEXT_KEYWORDS_READONLY:
+                # AF: Warning - this won't allow people to have empty keywords on GeoNode
+                if len(instance.keyword_list()) == 0 and gs_resource.keywords:
+                    for keyword in gs_resource.keywords:
+                        if keyword not in instance.keyword_list():
+                            instance.keywords.add(keyword)
+
+            if any(instance.keyword_list()):
+                keywords = instance.keyword_list()
+                gs_writer.set('keywords', [kw for kw in list(set(keywords))])
+        except Exception as e:
+            msg = ('Error while trying to save resource named %s in GeoServer, '
+                   'try to use: "%s"' % (gs_resource, str(e)))
+            e.args = (msg,)
+            logger.exception(e)
+
+        # gs_resource should only be saved if
+        # ogc_server_settings.BACKEND_WRITE_ENABLED == True
+        gs_writer.save()
     else:
         msg = "There isn't a geoserver resource for this layer: %s" % instance.name
         logger.warn(msg)
@@ -308,35 +313,6 @@ def geoserver_post_save_local(instance, *args, **kwargs):
             # print attr_name
             setattr(instance, key, values[key])
 
-    if gs_resource:
-        try:
-            if settings.RESOURCE_PUBLISHING:
-                if instance.is_published != gs_resource.advertised:
-                    if getattr(ogc_server_settings, "BACKEND_WRITE_ENABLED", True):
-                        gs_resource.advertised = 'true'
-                        gs_catalog.save(gs_resource)
-
-            if not settings.FREETEXT_KEYWORDS_READONLY:
-                # AF: Warning - this won't allow people to have empty keywords on GeoNode
-                if len(instance.keyword_list()) == 0 and gs_resource.keywords:
-                    for keyword in gs_resource.keywords:
-                        if keyword not in instance.keyword_list():
-                            instance.keywords.add(keyword)
-
-            if any(instance.keyword_list()):
-                keywords = instance.keyword_list()
-                gs_resource.keywords = [kw for kw in list(set(keywords))]
-
-                # gs_resource should only be called if
-                # ogc_server_settings.BACKEND_WRITE_ENABLED == True
-                if getattr(ogc_server_settings, "BACKEND_WRITE_ENABLED", True):
-                    gs_catalog.save(gs_resource)
-        except Exception as e:
-            msg = ('Error while trying to save resource named %s in GeoServer, '
-                   'try to use: "%s"' % (gs_resource, str(e)))
-            e.args = (msg,)
-            logger.exception(e)
-
     to_update = {
         'title': instance.title or instance.name,
         'abstract': instance.abstract or "",
@@ -347,6 +323,7 @@ def geoserver_post_save_local(instance, *args, **kwargs):
         'bbox_y1': instance.bbox_y1,
         'srid': instance.srid
     }
+    to_update.update(instance.ll_bbox_envelope())
 
     # Update ResourceBase
     resources = ResourceBase.objects.filter(id=instance.resourcebase_ptr.id)
@@ -384,8 +361,8 @@ def geoserver_post_save_local(instance, *args, **kwargs):
 
     # Updating HAYSTACK Indexes if needed
     if settings.HAYSTACK_SEARCH:
-        from django.core.management import call_command
-        call_command('update_index')
+        from geonode.base.search_index import enqueue
+        enqueue(instance)
 
 
 @on_ogc_backend(BACKEND_PACKAGE)
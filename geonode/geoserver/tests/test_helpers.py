@@ -191,3 +191,63 @@ xlink:href="http://localhost:8080/geoserver/ows?service=WMS&amp;request=GetLegen
                   'content_type': 'text/xml; charset=UTF-8'}
         _content = _response_callback(**kwargs).content
         self.assertTrue(re.findall('http://localhost:8000/gs/ows', str(_content)))
+
+    @on_ogc_backend(geoserver.BACKEND_PACKAGE)
+    def test_gs_resource_writer(self):
+        from unittest.mock import MagicMock
+        from geonode.geoserver.helpers import GsResourceWriter
+
+        class FakeResource(object):
+            title = 'Title'
+            abstract = None
+            advertised = 'true'
+            keywords = ['b', 'a']
+            metadata_links = [('other', 'other', 'http://localhost/md')]
+
+        catalog = MagicMock()
+        resource = FakeResource()
+        writer = GsResourceWriter(catalog, resource)
+        sent = GsResourceWriter.stats['sent']
+        skipped = GsResourceWriter.stats['skipped']
+
+        # equivalent values do not trigger any write
+        self.assertFalse(writer.set('title', 'Title'))
+        self.assertFalse(writer.set('abstract', ''))
+        self.assertFalse(writer.set('advertised', True))
+        self.assertFalse(writer.set('keywords', ['a', 'b', 'a']))
+        self.assertFalse(writer.set('metadata_links', [('text/html', 'html', 'http://localhost/md')]))
+        self.assertFalse(writer.save())
+        self.assertFalse(catalog.save.called)
+        self.assertEqual(GsResourceWriter.stats['skipped'], skipped + 1)
+
+        # several changes end up in one single write
+        self.assertTrue(writer.set('title', 'New Title'))
+        self.assertTrue(writer.set('keywords', ['a', 'b', 'c']))
+        self.assertTrue(writer.save())
+        catalog.save.assert_called_once_with(resource)
+        self.assertEqual(resource.title, 'New Title')
+        self.assertEqual(GsResourceWriter.stats['sent'], sent + 1)
+        self.assertEqual(writer.changes, {})
+
+    @on_ogc_backend(geoserver.BACKEND_PACKAGE)
+    def test_gs_resource_fingerprint(self):
+        from unittest.mock import MagicMock
+        from geonode.geoserver.helpers import gs_resource_fingerprint
+
+        resource = MagicMock()
+        resource.configure_mock(
+            name='san_andres_y_providencia_poi',
+            title='San Andres',
+            abstract=None,
+            native_bbox=['-81.8', '-81.3', '12.4', '13.4', 'EPSG:4326'],
+            projection='EPSG:4326',
+            keywords=['poi'],
+            enabled='true',
+            advertised='true')
+        resource.workspace.name = 'geonode'
+        resource.store.name = 'geonode_data'
+        fingerprint = gs_resource_fingerprint(resource)
+        self.assertEqual(fingerprint, gs_resource_fingerprint(resource))
+
+        resource.native_bbox = ['-81.8', '-81.3', '12.4', '13.5', 'EPSG:4326']
+        self.assertNotEqual(fingerprint, gs_resource_fingerprint(resource))
@@ -292,4 +292,12 @@ def group_pre_delete(instance, sender, **kwargs):
          not permitted as will break the geonode permissions system')
 
 
+def groupmember_post_change(instance, sender, **kwargs):
+    """Drop the visibility of the member, which depends on its groups"""
+    from geonode.security.utils import invalidate_user_visibility
+    invalidate_user_visibility(instance.user)
+
+
 signals.pre_delete.connect(group_pre_delete, sender=Group)
+signals.post_save.connect(groupmember_post_change, sender=GroupMember)
+signals.post_delete.connect(groupmember_post_change, sender=GroupMember)
@@ -395,6 +395,34 @@ class LayersTest(GeoNodeBaseTestSupport):
             links = Link.objects.filter(resource=lyr.resourcebase_ptr, link_type="image")
             self.assertIsNotNone(links)
 
+    def test_sync_resource_links(self):
+        from geonode.utils import sync_resource_links
+        lyr = Layer.objects.first()
+        resource = lyr.resourcebase_ptr
+        Link.objects.filter(resource=resource).delete()
+        for _ in range(2):
+            Link.objects.create(resource=resource, name='Legend', url='http://localhost/legend',
+                                extension='png', mime='image/png', link_type='image')
+        Link.objects.create(resource=resource, name='PNG', url='http://localhost/old.png',
+                            extension='png', mime='image/png', link_type='image')
+        Link.objects.create(resource=resource, name='Stale', url='http://localhost/stale',
+                            extension='zip', mime='application/zip', link_type='data')
+        links = [
+            (dict(name='Legend', url='http://localhost/legend'),
+             dict(extension='png', mime='image/png', link_type='image'), True),
+            (dict(name='PNG', link_type='image'),
+             dict(extension='png', mime='image/png', url='http://localhost/new.png'), True),
+            (dict(name='Zipped Shapefile', url='http://localhost/shp', link_type='data'),
+             dict(extension='zip', mime='SHAPE-ZIP'), True),
+        ]
+        self.assertEqual(sync_resource_links(resource, links, prune_types=('data', 'image')), (1, 1, 2))
+        self.assertEqual(Link.objects.filter(resource=resource).count(), 3)
+        self.assertEqual(Link.objects.get(resource=resource, name='PNG').url, 'http://localhost/new.png')
+        self.assertFalse(Link.objects.filter(resource=resource, name='Stale').exists())
+
+        # nothing to do the second time
+        self.assertEqual(sync_resource_links(resource, links, prune_types=('data', 'image')), (0, 0, 0))
+
     def test_get_valid_user(self):
         # Verify it accepts an admin user
         adminuser = get_user_model().objects.get(is_superuser=True)
@@ -59,7 +59,7 @@ from geonode.people.utils import get_valid_user
 from geonode.layers.models import UploadSession, LayerFile
 from geonode.base.thumb_utils import thumb_exists
 from geonode.base.models import Link, SpatialRepresentationType,  \
-    TopicCategory, Region, License, ResourceBase
+    TopicCategory, Region, License, ResourceBase, get_ll_bbox_envelope
 from geonode.layers.models import shp_exts, csv_exts, vec_exts, cov_exts, Layer
 from geonode.layers.metadata import set_metadata
 from geonode.upload.utils import _fixup_base_file
@@ -711,6 +711,10 @@ def file_upload(filename,
             'is_published', is_published) or layer.is_published
         defaults['license'] = defaults.get('license', None) or layer.license
         defaults['category'] = defaults.get('category', None) or layer.category
+        # update() skips save(), keep the envelope used by the extent filters in sync
+        defaults.update(get_ll_bbox_envelope(
+            defaults['bbox_x0'], defaults['bbox_x1'], defaults['bbox_y0'], defaults['bbox_y1'],
+            srid=defaults.get('srid', None) or layer.srid))
 
         try:
             Layer.objects.filter(id=layer.id).update(**defaults)
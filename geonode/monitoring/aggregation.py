@@ -232,71 +232,83 @@ def aggregate_past_periods(metric_data_q=None, periods=None, cleanup=True, now=N
     return counter
 
 
+AGGREGATION_KEYS = ('service_id', 'service_metric_id', 'resource_id', 'event_type_id', 'label_id',)
+
+
 def aggregate_period(period_start, period_end, metric_data_q, cleanup=True):
-    counter = 0
+    """
+    Aggregate metric values within period into one value per
+    (service, metric, resource, event type, label) combination.
+
+    Values are computed with one grouped query per metric type and
+    stored with bulk inserts/updates. Returns number of aggregated rows.
+    """
     to_remove_data = {'remove_at': period_start.strftime("%Y%m%d%H%M%S")}
     source_metric_data = metric_data_q.filter(valid_from__gte=period_start,
                                               valid_to__lte=period_end)\
                                       .exclude(valid_from=period_start,
                                                valid_to=period_end,
                                                data={})
-    r = source_metric_data.values_list('service_id', 'service_metric_id', 'resource_id', 'event_type_id', 'label_id',)\
-                          .distinct('service_id', 'service_metric_id', 'resource_id', 'event_type_id', 'label_id')
-    source_metric_data.update(data=to_remove_data)
-
-    for service_id, metric_id, resource_id, event_type_id, label_id in r:
-        m = Metric.objects.filter(service_type__id=metric_id).get()
-        f = m.get_aggregate_field()
-        per_metric_q = source_metric_data.filter(service_metric_id=metric_id,
-                                                 service_id=service_id,
-                                                 resource_id=resource_id,
-                                                 event_type_id=event_type_id,
-                                                 label_id=label_id)
-
+    if not source_metric_data.update(data=to_remove_data):
+        return 0
+
+    # one aggregate query per aggregation function, not per metric
+    service_metric_ids = source_metric_data.order_by().values_list('service_metric_id', flat=True).distinct()
+    service_metrics = ServiceTypeMetric.objects.filter(id__in=list(service_metric_ids))\
+                                               .values_list('id', 'metric__type')
+    metric_types = {}
+    for service_metric_id, metric_type in service_metrics:
+        metric_types.setdefault(metric_type, []).append(service_metric_id)
+
+    aggregated = {}
+    for metric_type, ids in metric_types.items():
+        f = Metric.AGGREGATE_DJANGO_MAP[metric_type]
+        per_type_q = source_metric_data.filter(service_metric_id__in=ids)\
+                                       .order_by()\
+                                       .values(*AGGREGATION_KEYS)
         try:
-            value_q = per_metric_q.aggregate(fvalue=f,
-                                             fsamples_count=Sum(F('samples_count')))
+            rows = per_type_q.annotate(fvalue=f, fsamples_count=Sum(F('samples_count')))
+            for row in rows:
+                key = tuple(row[k] for k in AGGREGATION_KEYS)
+                aggregated[key] = (row['fvalue'], row['fsamples_count'],)
         except TypeError as err:
-            raise ValueError(f, m, err)
-        value = value_q['fvalue']
-        samples_count = value_q['fsamples_count']
-        if cleanup:
-            per_metric_q.delete()
-        log.debug('Metric %s: %s - %s (value: %s, samples: %s)',
-                  m, period_start, period_end, value, samples_count)
-        if not metric_data_q.filter(service_metric_id=metric_id,
-                                    service_id=service_id,
-                                    resource_id=resource_id,
-                                    event_type_id=event_type_id,
-                                    valid_from=period_start,
-                                    valid_to=period_end,
-                                    label_id=label_id).exists():
-            MetricValue.objects.create(service_metric_id=metric_id,
-                                       service_id=service_id,
-                                       resource_id=resource_id,
-                                       event_type_id=event_type_id,
-                                       value=value,
-                                       value_num=value,
-                                       value_raw=value,
-                                       valid_from=period_start,
-                                       valid_to=period_end,
-                                       label_id=label_id,
-                                       samples_count=samples_count)
-        else:
-            metric_data_q.filter(service_metric_id=metric_id,
-                                 service_id=service_id,
-                                 resource_id=resource_id,
-                                 event_type_id=event_type_id,
-                                 valid_from=period_start,
-                                 valid_to=period_end,
-                                 label_id=label_id)\
-                         .update(value=value,
-                                 value_num=value,
-                                 value_raw=value,
-                                 data=None,
-                                 samples_count=samples_count)
-        counter += 1
+            raise ValueError(f, metric_type, err)
+        log.debug('Metric type %s: %s - %s (%s aggregated values)',
+                  metric_type, period_start, period_end, len(aggregated))
 
     if cleanup:
-        source_metric_data.filter(data=to_remove_data).delete()
-    return counter
+        source_metric_data.delete()
+
+    existing = metric_data_q.filter(valid_from=period_start, valid_to=period_end)
+    to_update = []
+    for mv in existing.filter(service_metric_id__in=[k[1] for k in aggregated]).iterator():
+        key = tuple(getattr(mv, k) for k in AGGREGATION_KEYS)
+        if key not in aggregated:
+            continue
+        value, samples_count = aggregated.pop(key)
+        mv.value = mv.value_num = mv.value_raw = value
+        mv.data = None
+        mv.samples_count = samples_count
+        to_update.append(mv)
+
+    to_create = []
+    for (service_id, metric_id, resource_id, event_type_id, label_id), (value, samples_count) in aggregated.items():
+        to_create.append(MetricValue(service_metric_id=metric_id,
+                                     service_id=service_id,
+                                     resource_id=resource_id,
+                                     event_type_id=event_type_id,
+                                     value=value,
+                                     value_num=value,
+                                     value_raw=value,
+                                     valid_from=period_start,
+                                     valid_to=period_end,
+                                     label_id=label_id,
+                                     samples_count=samples_count))
+
+    if to_update:
+        MetricValue.objects.bulk_update(to_update,
+                                        ['value', 'value_num', 'value_raw', 'data', 'samples_count'],
+                                        batch_size=500)
+    if to_create:
+        MetricValue.objects.bulk_create(to_create, batch_size=500)
+    return len(to_update) + len(to_create)
@@ -384,10 +384,6 @@ class CollectorAPI(object):
     def set_metric_values(self, metric_name, column_name,
                           requests, service, **metric_values):
         metric = Metric.get_for(metric_name, service=service)
-        q = requests
-
-        def _key(v):
-            return v['value']
 
         # we need list of three items:
         #  * value - numeric value for given metric
@@ -400,43 +396,22 @@ class CollectorAPI(object):
             q = [row]
 
         elif metric.is_count:
-            q = []
-            values = requests.distinct(
-                column_name).values_list(column_name, flat=True)
-            for v in values:
-                rqs = requests.filter(**{column_name: v})
-                row = rqs.aggregate(
-                    value=models.Sum(column_name),
-                    samples=models.Count(column_name)
-                )
-                row['label'] = v
-                q.append(row)
-            q.sort(key=_key)
-            q.reverse()
+            q = requests.order_by().values(column_name)\
+                        .annotate(value=models.Sum(column_name),
+                                  samples=models.Count(column_name))\
+                        .order_by(models.F('value').desc(nulls_last=True))[:100]
+            q = [dict(row, label=row[column_name]) for row in q]
 
         elif metric.is_value:
-            q = []
             is_user_metric = column_name == "user_identifier"
-            if is_user_metric:
-                values = requests.distinct(
-                    column_name).values_list(column_name, "user_username")
-            else:
-                values = requests.distinct(
-                    column_name).values_list(column_name, flat=True)
-            for v in values:
-                if v is not None:
-                    value = v
-                    if is_user_metric:
-                        value = v[0]
-                    rqs = requests.filter(**{column_name: value})
-                    row = rqs.aggregate(
-                        value=models.Count(column_name),
-                        samples=models.Count(column_name)
-                    )
-                    row['label'] = v
-                    q.append(row)
-            q.sort(key=_key)
-            q.reverse()
+            columns = (column_name, "user_username",) if is_user_metric else (column_name,)
+            q = requests.exclude(**{'{}__isnull'.format(column_name): True})\
+                        .order_by().values(*columns)\
+                        .annotate(value=models.Count(column_name),
+                                  samples=models.Count(column_name))\
+                        .order_by('-value')[:100]
+            q = [dict(row, label=tuple(row[c] for c in columns) if is_user_metric else row[column_name])
+                 for row in q]
 
         elif metric.is_value_numeric:
             q = []
@@ -448,17 +423,17 @@ class CollectorAPI(object):
         else:
             raise ValueError("Unsupported metric type: {}".format(metric.type))
         rows = q[:100]
-        metric_values.update({'metric': metric_name, 'service': service})
+        values = []
         for row in rows:
             label = row['label']
             value = row['value']
             samples = row['samples']
-            metric_values.update({'value': value or 0,
-                                  'label': label,
-                                  'samples_count': samples,
-                                  'value_raw': value or 0,
-                                  'value_num': value if isinstance(value, integer_types + (float, Decimal,)) else None})
-            log.debug(MetricValue.add(**metric_values))
+            values.append({'value': value or 0,
+                           'label': label,
+                           'samples_count': samples,
+                           'value_raw': value or 0,
+                           'value_num': value if isinstance(value, integer_types + (float, Decimal,)) else None})
+        log.debug(MetricValue.add_many(metric_name, service=service, values=values, **metric_values))
 
     def process(self, service, data, valid_from, valid_to, *args, **kwargs):
         if service.is_hostgeonode:
@@ -543,17 +518,14 @@ class CollectorAPI(object):
 
             log.debug(MetricValue.add('request.count', **count_mdefaults))
 
-            paths = srequests.distinct('request_path') \
-                .values_list('request_path', flat=True)
-            for path in paths:
-                count = srequests.filter(request_path=path).count()
-                count_mdefaults['value'] = count
-                count_mdefaults['label'] = path
-                count_mdefaults['value_num'] = count
-                count_mdefaults['value_raw'] = count
-                count_mdefaults['samples_count'] = count
-
-                log.debug(MetricValue.add('request.path', **count_mdefaults))
+            paths = srequests.order_by().values('request_path') \
+                .annotate(count=models.Count('id'))
+            path_values = [{'value': p['count'],
+                            'label': p['request_path'],
+                            'value_num': p['count'],
+                            'value_raw': p['count'],
+                            'samples_count': p['count']} for p in paths]
+            log.debug(MetricValue.add_many('request.path', values=path_values, **mdefaults))
 
             for mname, cname in (('request.ip', 'client_ip',),
                                  ('request.users', 'user_identifier',),
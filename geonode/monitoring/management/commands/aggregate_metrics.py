@@ -18,6 +18,7 @@
 #
 #########################################################################
 
+import time
 import logging
 
 from django.core.management.base import BaseCommand
@@ -28,7 +29,15 @@ log = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
+    """
+    Aggregate past monitoring metric values into longer periods
+    """
 
     def handle(self, *args, **kwargs):
         c = CollectorAPI()
-        c.aggregate_past_periods()
+        start = time.time()
+        rows = c.aggregate_past_periods()
+        elapsed = time.time() - start
+        self.stdout.write(
+            'Aggregated {} rows in {:.2f}s ({:.1f} rows/s)'.format(
+                rows, elapsed, rows / elapsed if elapsed else 0))
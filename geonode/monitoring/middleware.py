@@ -144,6 +144,8 @@ class MonitoringMiddleware(MiddlewareMixin):
         utc = pytz.utc
         now = datetime.utcnow().replace(tzinfo=utc)
         m['finished'] = now
+        # the event may be stored later by the async writer
+        m['received'] = now
         self.register_request(request, response)
         return response
 
@@ -154,4 +156,5 @@ class MonitoringMiddleware(MiddlewareMixin):
         utc = pytz.utc
         now = datetime.utcnow().replace(tzinfo=utc)
         m['finished'] = now
+        m['received'] = now
         self.register_exception(request, exception)
@@ -29,7 +29,7 @@ from decimal import Decimal
 from six import string_types
 
 from django import forms
-from django.db import models
+from django.db import models, connection
 from django.conf import settings
 from django.http import Http404
 from jsonfield import JSONField
@@ -636,10 +636,67 @@ class RequestEvent(models.Model):
 
     @classmethod
     def from_geonode(cls, service, request, response):
+        data = cls._get_geonode_data(service, request, response)
+
+        try:
+            inst = cls.objects.create(**data)
+            resources = cls._get_geonode_resources(request)
+            if resources:
+                inst.resources.add(*resources)
+                inst.save()
+            return inst
+        except Exception:
+            return None
+
+    @classmethod
+    def bulk_from_geonode(cls, service, items):
+        """
+        Stores a batch of (request, response) pairs with a single bulk insert
+        of RequestEvents and one of their resources m2m rows.
+        Returns the number of stored events.
+        """
+        events = []
+        events_resources = []
+        for request, response in items:
+            try:
+                events.append(cls(**cls._get_geonode_data(service, request, response)))
+                events_resources.append(cls._get_geonode_resources(request))
+            except Exception as e:
+                log.exception(e)
+        if not events:
+            return 0
+
+        if connection.features.can_return_ids_from_bulk_insert:
+            cls.objects.bulk_create(events)
+        else:
+            # ids are needed to link the resources
+            for event, resources in zip(events, events_resources):
+                if resources:
+                    event.save()
+            cls.objects.bulk_create([event for event in events if event.pk is None])
+
+        through = cls.resources.through
+        through.objects.bulk_create([
+            through(requestevent_id=event.pk, monitoredresource_id=resource.pk)
+            for event, resources in zip(events, events_resources) if event.pk
+            for resource in set(resources)])
+        return len(events)
+
+    @staticmethod
+    def _get_response_size(response):
+        # reading a streamed body would consume it before the client does,
+        # its size is unknown unless the upstream declared it
+        if response.get('Content-length'):
+            return response.get('Content-length')
+        return 0 if getattr(response, 'streaming', False) else len(response.getvalue())
+
+    @classmethod
+    def _get_geonode_data(cls, service, request, response):
         from geonode.utils import parse_datetime
 
-        received = datetime.utcnow().replace(tzinfo=pytz.utc)
         rqmeta = getattr(request, '_monitoring', {})
+        # set by the middleware when the response was sent
+        received = rqmeta.get('received') or datetime.utcnow().replace(tzinfo=pytz.utc)
         created = rqmeta.get('started', received)
         if not isinstance(created, datetime):
             created = parse_datetime(created)
@@ -695,22 +752,12 @@ class RequestEvent(models.Model):
                 'request_path': request.get_full_path(),
                 'request_method': request.method,
                 'response_status': response.status_code,
-                'response_size':
-                    response.get('Content-length') or len(response.getvalue()),
+                'response_size': cls._get_response_size(response),
                 'response_type': response.get('Content-type'),
                 'response_time': duration}
 
         data.update(sensitive_data)
-
-        try:
-            inst = cls.objects.create(**data)
-            resources = cls._get_geonode_resources(request)
-            if resources:
-                inst.resources.add(*resources)
-                inst.save()
-            return inst
-        except Exception:
-            return None
+        return data
 
     @classmethod
     def from_geoserver(cls, service, request_data, received=None):
@@ -1016,6 +1063,105 @@ class MetricValue(models.Model):
                                   samples_count=samples_count or 0,
                                   data=data or {})
 
+    @classmethod
+    def add_many(cls, metric, valid_from, valid_to, service, values,
+                 resource=None, event_type=None):
+        """
+        Bulk version of MetricValue.add() for values of one metric.
+
+        values is a list of dicts with label, value, value_raw,
+        value_num and samples_count keys.
+        """
+        if not values:
+            return []
+        if isinstance(metric, Metric):
+            service_metric = ServiceTypeMetric.objects.get(
+                service_type=service.service_type, metric=metric)
+        else:
+            service_metric = ServiceTypeMetric.objects.get(
+                service_type=service.service_type, metric__name=metric)
+        if event_type:
+            if not isinstance(event_type, EventType):
+                event_type = EventType.get(event_type)
+
+        # values sharing a label, e.g. a user identifier seen with several
+        # usernames, are accumulated instead of overwriting each other
+        merged = {}
+        label_users = {}
+        for v in values:
+            label_name = v['label']
+            label_user = None
+            if label_name and isinstance(label_name, tuple):
+                label_name, label_user = label_name
+            label_name = label_name or 'count'
+            if label_name not in merged:
+                merged[label_name] = dict(v)
+            else:
+                for field in ('value', 'value_raw', 'value_num', 'samples_count'):
+                    if v.get(field) is not None:
+                        merged[label_name][field] = (merged[label_name].get(field) or 0) + v[field]
+            # an authenticated username wins over the anonymous one
+            if label_user and label_users.get(label_name) in (None, 'AnonymousUser'):
+                label_users[label_name] = label_user
+            label_users.setdefault(label_name, label_user)
+        labels = {}
+        for label in MetricLabel.objects.filter(name__in=list(label_users)).order_by('id'):
+            labels.setdefault(label.name, label)
+        missing = [MetricLabel(name=name, user=user) for name, user in label_users.items()
+                   if name not in labels]
+        if missing:
+            if connection.features.can_return_ids_from_bulk_insert:
+                MetricLabel.objects.bulk_create(missing)
+            else:
+                for label in missing:
+                    label.save()
+            labels.update((label.name, label,) for label in missing)
+
+        existing = {}
+        for inst in cls.objects.filter(valid_from=valid_from,
+                                       valid_to=valid_to,
+                                       service=service,
+                                       resource=resource,
+                                       event_type=event_type,
+                                       service_metric=service_metric,
+                                       label__in=list(labels.values())):
+            existing[inst.label_id] = inst
+
+        to_update = []
+        to_create = []
+        for label_name, v in merged.items():
+            label = labels[label_name]
+            value, value_raw, value_num = v.get('value'), v.get('value_raw'), v.get('value_num')
+            samples_count = v.get('samples_count')
+            inst = existing.get(label.id)
+            if inst is not None:
+                inst.value = abs(value) if value else 0
+                inst.value_raw = abs(value_raw) if value_raw else 0
+                inst.value_num = abs(value_num) if value_num else 0
+                inst.samples_count = samples_count or 0
+                if inst.pk is not None and inst not in to_update:
+                    to_update.append(inst)
+            else:
+                inst = cls(valid_from=valid_from,
+                           valid_to=valid_to,
+                           service=service,
+                           service_metric=service_metric,
+                           label=label,
+                           resource=resource,
+                           event_type=event_type,
+                           value=value_raw,
+                           value_raw=value_raw,
+                           value_num=value_num,
+                           samples_count=samples_count or 0,
+                           data={})
+                existing[label.id] = inst
+                to_create.append(inst)
+        if to_update:
+            cls.objects.bulk_update(to_update, ['value', 'value_raw', 'value_num', 'samples_count'])
+        if to_create:
+            cls.objects.bulk_create(to_create)
+        return to_update + to_create
+
     @classmethod
     def get_for(cls, metric, service=None, valid_on=None,
                 resource=None, label=None, event_type=None):
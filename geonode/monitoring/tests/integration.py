@@ -316,6 +316,90 @@ class RequestsTestCase(MonitoringTestBase):
                 list(rq.resources.all().values_list('name', 'type')), [(_l.alternate, 'layer',)])
             self.assertEqual(rq.request_method, 'GET')
 
+    def test_streaming_response_size(self):
+        """
+        Test the size of a streamed response is not read from its body
+        """
+        from django.http import StreamingHttpResponse
+        response = StreamingHttpResponse(iter([b'abc', b'def']))
+        self.assertEqual(RequestEvent._get_response_size(response), 0)
+        self.assertEqual(b''.join(response.streaming_content), b'abcdef')
+
+    def test_async_ingest_exception_stored_once(self):
+        """
+        Test a request raising an exception is not queued again to the writer
+        """
+        import sys
+        from unittest.mock import MagicMock
+        from django.http import HttpResponse
+        from django.test.client import RequestFactory
+        from geonode.monitoring.utils import MonitoringHandler
+
+        handler = MonitoringHandler(self.service)
+        handler.writer = MagicMock()
+        request = RequestFactory(HTTP_USER_AGENT=self.ua).get('/layers/geonode:layer_0')
+        request._monitoring = {
+            'started': datetime.utcnow().replace(tzinfo=pytz.utc),
+            'finished': datetime.utcnow().replace(tzinfo=pytz.utc),
+            'resources': {},
+            'events': [],
+        }
+        response = HttpResponse('error', status=500)
+        try:
+            raise ValueError('failure')
+        except ValueError:
+            exc_info = sys.exc_info()
+        # process_exception, then process_response
+        for _exc_info in (exc_info, None):
+            record = logging.LogRecord('request', logging.DEBUG, __file__, 0, 'request', None, _exc_info)
+            record.request = request
+            record.response = response
+            handler.emit(record)
+        handler.writer.add.assert_not_called()
+        self.assertEqual(RequestEvent.objects.count(), 1)
+
+    def test_gn_request_bulk_ingest(self):
+        """
+        Test the batched ingest writer throughput with synthetic requests
+        """
+        from django.http import HttpResponse
+        from django.test.client import RequestFactory
+        from geonode.monitoring.utils import RequestToMonitoringThread
+
+        factory = RequestFactory(HTTP_USER_AGENT=self.ua)
+        received = datetime.utcnow().replace(tzinfo=pytz.utc)
+        items = []
+        for i in range(10000):
+            request = factory.get('/layers/geonode:layer_{}'.format(i % 10))
+            request._monitoring = {
+                'started': datetime.utcnow().replace(tzinfo=pytz.utc),
+                'finished': datetime.utcnow().replace(tzinfo=pytz.utc),
+                'received': received,
+                'resources': {},
+                'events': [('view', 'layer', 'geonode:layer_{}'.format(i % 10), None)],
+            }
+            items.append((request, HttpResponse('ok')))
+
+        writer = RequestToMonitoringThread(
+            self.service, batch_size=1000, flush_interval=0.5, put_timeout=1.0)
+        writer.start()
+        start = time.time()
+        for request, response in items:
+            writer.add(request, response)
+        writer.stop()
+        elapsed = time.time() - start
+        logger.info('Ingested %s requests in %.2fs (%.0f req/s, %s dropped)',
+                    writer.stats['written'], elapsed,
+                    writer.stats['written'] / elapsed, writer.stats['dropped'])
+
+        self.assertEqual(writer.stats['written'] + writer.stats['dropped'], len(items))
+        self.assertEqual(RequestEvent.objects.count(), writer.stats['written'])
+        self.assertEqual(
+            RequestEvent.resources.through.objects.count(), writer.stats['written'])
+        self.assertEqual(MonitoredResource.objects.filter(type='layer').count(), 10)
+        # the time of the request, not the one of the write
+        self.assertFalse(RequestEvent.objects.exclude(received=received).exists())
+
     def test_gn_error(self):
         """
         Test if we get geonode errors logged
@@ -606,6 +690,86 @@ class MonitoringChecksTestCase(MonitoringTestBase):
         with self.assertRaises(ValueError):
             mc.check_metric(for_timestamp=start)
 
+    def test_aggregate_period(self):
+        """
+        Test period rollup of metric values
+        """
+        from geonode.monitoring.aggregation import aggregate_period
+
+        period_start = datetime(2017, 6, 20, 12, 0, 0, tzinfo=pytz.utc)
+        period_end = period_start + timedelta(hours=1)
+        resource, _ = MonitoredResource.objects.get_or_create(
+            type='layer', name='test:test')
+        resource2, _ = MonitoredResource.objects.get_or_create(
+            type='layer', name='test:test2')
+        for idx in range(4):
+            valid_from = period_start + timedelta(minutes=15 * idx)
+            for res in (resource, resource2,):
+                MetricValue.add(self.metric, valid_from,
+                                valid_from + timedelta(minutes=15),
+                                self.service,
+                                label="Count",
+                                value_raw=idx + 1,
+                                value_num=idx + 1,
+                                value=idx + 1,
+                                resource=res,
+                                samples_count=1)
+        self.assertEqual(MetricValue.objects.count(), 8)
+
+        self.assertEqual(aggregate_period(period_start, period_end, MetricValue.objects.all()), 2)
+        self.assertEqual(MetricValue.objects.count(), 2)
+        for res in (resource, resource2,):
+            mv = MetricValue.objects.get(resource=res)
+            self.assertEqual(mv.valid_from, period_start)
+            self.assertEqual(mv.valid_to, period_end)
+            self.assertEqual(mv.value_num, 10)
+            self.assertEqual(mv.samples_count, 4)
+
+        # already aggregated values are left untouched
+        self.assertEqual(aggregate_period(period_start, period_end, MetricValue.objects.all()), 0)
+        self.assertEqual(MetricValue.objects.count(), 2)
+
+    def test_metric_value_add_many(self):
+        """
+        Test bulk storage of metric values
+        """
+        start = datetime(2017, 6, 20, 12, 0, 0, tzinfo=pytz.utc)
+        end = start + timedelta(minutes=1)
+        values = [{'label': '127.0.0.{}'.format(idx),
+                   'value': idx,
+                   'value_raw': idx,
+                   'value_num': idx,
+                   'samples_count': idx} for idx in range(1, 51)]
+        event_type = EventType.get(EventType.EVENT_ALL)
+        stored = MetricValue.add_many('request.ip', start, end, self.service, values,
+                                      event_type=event_type)
+        self.assertEqual(len(stored), 50)
+        self.assertEqual(MetricValue.objects.filter(service_metric__metric__name='request.ip').count(), 50)
+
+        # same period and labels are updated in place
+        for v in values:
+            v['value'] = v['value_raw'] = v['value_num'] = v['samples_count'] = 1
+        MetricValue.add_many('request.ip', start, end, self.service, values,
+                             event_type=event_type)
+        q = MetricValue.objects.filter(service_metric__metric__name='request.ip')
+        self.assertEqual(q.count(), 50)
+        self.assertEqual(set(q.values_list('samples_count', flat=True)), {1})
+        self.assertEqual(set(q.values_list('label__name', flat=True)),
+                         set(v['label'] for v in values))
+
+        # a user identifier seen with several usernames is accumulated in one value
+        user_values = [{'label': ('session-hash', username),
+                        'value': 2,
+                        'value_raw': 2,
+                        'value_num': 2,
+                        'samples_count': 2} for username in ('AnonymousUser', 'bobby')]
+        stored = MetricValue.add_many('request.users', start, end, self.service, user_values,
+                                      event_type=event_type)
+        self.assertEqual(len(stored), 1)
+        self.assertEqual(stored[0].value_num, 4)
+        self.assertEqual(stored[0].samples_count, 4)
+        self.assertEqual(stored[0].label.user, 'bobby')
+
     def test_notifications_views(self):
         start = datetime.utcnow().replace(tzinfo=pytz.utc)
         start_aligned = align_period_start(start, self.service.check_interval)
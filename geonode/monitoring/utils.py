@@ -19,6 +19,8 @@
 #########################################################################
 
 import os
+import time
+import atexit
 import pytz
 import queue
 import logging
@@ -38,6 +40,7 @@ from datetime import datetime, timedelta
 from defusedxml import lxml as dlxml
 
 from django.conf import settings
+from django.db import close_old_connections
 from django.db.models.fields.related import RelatedField
 
 from geonode.settings import DATETIME_INPUT_FORMATS
@@ -53,6 +56,9 @@ class MonitoringHandler(logging.Handler):
     def __init__(self, service, *args, **kwargs):
         super(MonitoringHandler, self).__init__(*args, **kwargs)
         self.service = service
+        self.writer = None
+        if getattr(settings, 'MONITORING_ASYNC_INGEST', False):
+            self.writer = RequestToMonitoringThread.get_instance(service)
 
     def emit(self, record):
         from geonode.monitoring.models import RequestEvent, ExceptionEvent
@@ -60,6 +66,12 @@ class MonitoringHandler(logging.Handler):
         exc_info = record.exc_info
         req = record.request
         resp = record.response
+        if self.writer and not exc_info:
+            # requests raising an exception are already stored synchronously
+            if 'processed' not in req._monitoring:
+                self.writer.add(req, resp)
+            return
+
         if not req._monitoring.get('processed'):
             try:
                 re = RequestEvent.from_geonode(self.service, req, resp)
@@ -74,25 +86,119 @@ class MonitoringHandler(logging.Handler):
 
 
 class RequestToMonitoringThread(threading.Thread):
-    q = queue.Queue()
+    """
+    Background writer storing monitored requests as RequestEvents.
 
-    def __init__(self, service, *args, **kwargs):
+    Items are read from a bounded queue with a blocking get and flushed
+    with bulk inserts every ``batch_size`` items or ``flush_interval``
+    seconds, whatever comes first. When the queue is full, ``add`` waits
+    up to ``put_timeout`` seconds and then drops the item. The items still
+    queued are flushed when the process exits.
+    """
+    q = queue.Queue(maxsize=getattr(settings, 'MONITORING_INGEST_QUEUE_SIZE', 10000))
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, service, batch_size=None, flush_interval=None, put_timeout=None, *args, **kwargs):
+        kwargs.setdefault('daemon', True)
         super(RequestToMonitoringThread, self).__init__(*args, **kwargs)
         self.service = service
+        self.batch_size = batch_size or getattr(settings, 'MONITORING_INGEST_BATCH_SIZE', 500)
+        self.flush_interval = flush_interval or getattr(settings, 'MONITORING_INGEST_FLUSH_INTERVAL', 5.0)
+        self.put_timeout = put_timeout if put_timeout is not None else \
+            getattr(settings, 'MONITORING_INGEST_PUT_TIMEOUT', 0.05)
+        self.stats = {
+            'queued': 0,
+            'written': 0,
+            'dropped': 0,
+            'waits': 0,
+            'flushes': 0,
+            'errors': 0,
+        }
+        self._stats_lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    @classmethod
+    def get_instance(cls, service):
+        with cls._instance_lock:
+            if cls._instance is None or not cls._instance.is_alive():
+                cls._instance = cls(service)
+                cls._instance.start()
+                atexit.register(cls._instance.stop, cls._instance.flush_interval)
+            return cls._instance
+
+    def _count(self, key, value=1):
+        with self._stats_lock:
+            self.stats[key] += value
 
     def add(self, req, resp):
         item = (req, resp,)
-        RequestToMonitoringThread.q.put(item)
-
-    def run(self):
+        q = RequestToMonitoringThread.q
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            self._count('waits')
+            try:
+                q.put(item, timeout=self.put_timeout)
+            except queue.Full:
+                self._count('dropped')
+                return False
+        self._count('queued')
+        return True
+
+    def flush(self, items):
         from geonode.monitoring.models import RequestEvent
 
+        if not items:
+            return 0
+        close_old_connections()
+        try:
+            written = RequestEvent.bulk_from_geonode(self.service, items)
+        except Exception as e:
+            log.exception(e)
+            self._count('errors')
+            written = 0
+        self._count('written', written)
+        self._count('flushes')
+        return written
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        # wakes the writer up instead of waiting for the flush deadline
+        try:
+            RequestToMonitoringThread.q.put_nowait(None)
+        except queue.Full:
+            pass
+        self.join(timeout)
+
+    def run(self):
         q = RequestToMonitoringThread.q
+        batch = []
+        deadline = time.time() + self.flush_interval
         while True:
-            if not q.empty():
-                item = q.get()
-                req, resp = item
-                RequestEvent.from_geonode(self.service, req, resp)
+            try:
+                item = q.get(timeout=max(deadline - time.time(), 0.01))
+                if item is not None:
+                    batch.append(item)
+            except queue.Empty:
+                pass
+            stopping = self._stop_event.is_set()
+            if stopping:
+                # drain what is left before leaving
+                while True:
+                    try:
+                        item = q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        batch.append(item)
+            if len(batch) >= self.batch_size or time.time() >= deadline or stopping:
+                while batch:
+                    self.flush(batch[:self.batch_size])
+                    batch = batch[self.batch_size:]
+                deadline = time.time() + self.flush_interval
+            if stopping:
+                break
 
 
 class GeoServerMonitorClient(object):
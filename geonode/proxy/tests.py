@@ -27,9 +27,9 @@ Replace these with more appropriate tests for your application.
 import json
 
 try:
-    from unittest.mock import MagicMock
+    from unittest.mock import MagicMock, patch
 except ImportError:
-    from mock import MagicMock
+    from mock import MagicMock, patch
 
 from django.urls import reverse
 from django.contrib.auth import get_user_model
@@ -102,6 +102,28 @@ class ProxyTest(GeoNodeBaseTestSupport):
         # 200 - FOUND
         self.assertTrue(response.status_code in (200, 301))
 
+    @override_settings(DEBUG=False, PROXY_ALLOWED_HOSTS=(), CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_remote_services_hosts_cache(self):
+        """The remote services hosts index should be computed once and invalidated by Service signals."""
+        from geonode.services.models import Service
+        from geonode.services.enumerations import WMS, INDEXED
+        from geonode.services.utils import get_services_hosts, invalidate_services_hosts
+        invalidate_services_hosts()
+        for _i in range(10):
+            Service.objects.get_or_create(
+                type=WMS,
+                name='Bogus_%s' % _i,
+                title='Pocus',
+                owner=self.admin,
+                method=INDEXED,
+                base_url='http://bogus%s.pocus.com/ows' % _i)
+        self.assertIn('bogus9.pocus.com', get_services_hosts())
+        with self.assertNumQueries(0):
+            self.assertEqual(len(get_services_hosts()), 10)
+        Service.objects.get(name='Bogus_9').delete()
+        self.assertNotIn('bogus9.pocus.com', get_services_hosts())
+
     @override_settings(DEBUG=False, PROXY_ALLOWED_HOSTS=('.example.org',))
     def test_relative_urls(self):
         """Proxying to a URL with a relative path element should normalise the path into
@@ -122,6 +144,44 @@ class ProxyTest(GeoNodeBaseTestSupport):
         self.client.get('%s?url=%s' % (self.proxy_url, url))
         assert request_mock.call_args[0][0] == 'http://example.org/index.html'
 
+    @override_settings(DEBUG=False, PROXY_ALLOWED_HOSTS=('.example.org',), PROXY_STREAMING_ENABLED=True)
+    def test_streaming_passthrough(self):
+        """Streaming mode should pass compressed bodies through when the client accepts them."""
+        response = MagicMock()
+        response.status_code = 200
+        response.headers = {
+            'Content-Type': 'image/tiff',
+            'Content-Encoding': 'gzip',
+            'Content-Length': '6'}
+        response.raw.stream.return_value = iter([b'abc', b'def'])
+
+        with patch('geonode.proxy.views.http_client.request', return_value=(response, None)) as request_mock:
+            _response = self.client.get(
+                '%s?url=%s' % (self.proxy_url, 'http://example.org/wcs?request=GetCoverage'),
+                HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertTrue(request_mock.call_args[1]['stream'])
+        self.assertTrue(_response.streaming)
+        self.assertEqual(_response['Content-Encoding'], 'gzip')
+        self.assertEqual(b''.join(_response.streaming_content), b'abcdef')
+        self.assertFalse(response.raw.stream.call_args[1]['decode_content'])
+
+    @override_settings(DEBUG=False, PROXY_ALLOWED_HOSTS=('.example.org',), PROXY_STREAMING_ENABLED=True)
+    def test_streaming_decodes_when_not_accepted(self):
+        """Streaming mode should decode compressed bodies when the client does not accept them."""
+        response = MagicMock()
+        response.status_code = 200
+        response.headers = {'Content-Type': 'image/png', 'Content-Encoding': 'gzip'}
+        response.raw.stream.return_value = iter([b'png'])
+
+        with patch('geonode.proxy.views.http_client.request', return_value=(response, None)):
+            _response = self.client.get(
+                '%s?url=%s' % (self.proxy_url, 'http://example.org/wms?request=GetMap'),
+                HTTP_ACCEPT_ENCODING='identity')
+        self.assertTrue(_response.streaming)
+        self.assertFalse(_response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(_response.streaming_content), b'png')
+        self.assertTrue(response.raw.stream.call_args[1]['decode_content'])
+
 
 class DownloadResourceTestCase(GeoNodeBaseTestSupport):
 
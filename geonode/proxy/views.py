@@ -35,7 +35,7 @@ from urllib.parse import urlparse, urlsplit, urljoin
 
 from django.conf import settings
 from django.template import loader
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.views.generic import View
 from distutils.version import StrictVersion
 from django.http.request import validate_host
@@ -62,6 +62,17 @@ from geonode.monitoring import register_event
 
 TIMEOUT = 300
 
+STREAMING_CHUNK_SIZE = 64 * 1024
+
+PLAIN_CONTENT_TYPES = [
+    'text',
+    'plain',
+    'html',
+    'json',
+    'xml',
+    'gml'
+]
+
 LINK_TYPES = [L for L in _LT if L.startswith("OGC:")]
 
 logger = logging.getLogger(__name__)
@@ -75,11 +86,16 @@ ows_regexp = re.compile(
 @requires_csrf_token
 def proxy(request, url=None, response_callback=None,
           sec_chk_hosts=True, sec_chk_rules=True, timeout=None,
-          allowed_hosts=[], **kwargs):
+          allowed_hosts=[], stream=None, **kwargs):
     # Request default timeout
     if not timeout:
         timeout = TIMEOUT
 
+    # Streaming pass-through mode; GET requests only
+    if stream is None:
+        stream = getattr(settings, 'PROXY_STREAMING_ENABLED', False)
+    stream = stream and request.method == "GET"
+
     # Security rules and settings
     PROXY_ALLOWED_HOSTS = getattr(settings, 'PROXY_ALLOWED_HOSTS', ())
 
@@ -130,13 +146,9 @@ def proxy(request, url=None, response_callback=None,
                     PROXY_ALLOWED_HOSTS += (url.hostname, )
 
         # Check Remote Services base_urls
-        from geonode.services.models import Service
-        for _s in Service.objects.all():
-            _remote_host = urlsplit(_s.base_url).hostname
-            PROXY_ALLOWED_HOSTS += (_remote_host, )
-
+        from geonode.services.utils import get_services_hosts
         if not validate_host(
-                url.hostname, PROXY_ALLOWED_HOSTS):
+                url.hostname, PROXY_ALLOWED_HOSTS) and url.hostname not in get_services_hosts():
             return HttpResponse("DEBUG is set to False but the host of the path provided to the proxy service"
                                 " is not in the PROXY_ALLOWED_HOSTS setting.",
                                 status=403,
@@ -188,11 +200,22 @@ def proxy(request, url=None, response_callback=None,
                                             data=_data,
                                             headers=headers,
                                             timeout=timeout,
+                                            stream=stream,
                                             user=request.user)
-    content = response.content or response.reason
     status = response.status_code
     content_type = response.headers.get('Content-Type')
 
+    # Response callbacks only need to rewrite textual payloads, and sniff
+    # the untyped ones; everything else can be passed through without buffering
+    if stream and 200 <= status < 300 and \
+            (response_callback is None or (content_type and not _is_plain_content(content_type))):
+        return _streaming_response(request, response, status, content_type)
+
+    content = response.content or response.reason
+    if stream:
+        # releases the host slot held by the streamed request
+        response.close()
+
     if status >= 400:
         return HttpResponse(
             content=content,
@@ -207,14 +230,6 @@ def proxy(request, url=None, response_callback=None,
         f = gzip.GzipFile(fileobj=buf)
         content = f.read()
 
-    PLAIN_CONTENT_TYPES = [
-        'text',
-        'plain',
-        'html',
-        'json',
-        'xml',
-        'gml'
-    ]
     for _ct in PLAIN_CONTENT_TYPES:
         if content_type and _ct in content_type and not isinstance(content, six.string_types):
             try:
@@ -260,6 +275,45 @@ def proxy(request, url=None, response_callback=None,
                 content_type=content_type)
 
 
+def _is_plain_content(content_type):
+    return bool(content_type) and any(_ct in content_type for _ct in PLAIN_CONTENT_TYPES)
+
+
+def _streaming_response(request, response, status, content_type):
+    """
+    Builds a StreamingHttpResponse iterating over the upstream raw body.
+
+    Compressed bodies are passed through untouched whenever the client
+    accepts the upstream Content-Encoding, otherwise they are decoded on the fly.
+    """
+    content_encoding = response.headers.get('Content-Encoding')
+    accepted_encodings = [
+        _e.split(';')[0].strip().lower() for _e in
+        request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')]
+    passthrough = not content_encoding or content_encoding.lower() in accepted_encodings
+
+    def _stream_content():
+        try:
+            for chunk in response.raw.stream(STREAMING_CHUNK_SIZE, decode_content=not passthrough):
+                yield chunk
+        finally:
+            response.close()
+
+    _response = StreamingHttpResponse(
+        _stream_content(),
+        status=status,
+        content_type=content_type)
+    if passthrough:
+        if content_encoding:
+            _response['Content-Encoding'] = content_encoding
+        if response.headers.get('Content-Length'):
+            _response['Content-Length'] = response.headers.get('Content-Length')
+    for _header in ('Content-Disposition', 'Last-Modified', 'ETag'):
+        if response.headers.get(_header):
+            _response[_header] = response.headers.get(_header)
+    return _response
+
+
 def download(request, resourceid, sender=Layer):
 
     _not_authorized = _("You are not authorized to download this resource.")
@@ -368,6 +422,7 @@ def download(request, resourceid, sender=Layer):
                     elif link.link_type in ('metadata', 'image'):
                         # Dumping metadata files and images
                         link_file = open(link_file, "wb")
+                        response = None
                         try:
                             # Collecting headers and cookies
                             headers, access_token = get_headers(request, urlsplit(link.url), link.url)
@@ -385,6 +440,8 @@ def download(request, resourceid, sender=Layer):
                             tb = traceback.format_exc()
                             logger.debug(tb)
                         finally:
+                            if response is not None:
+                                response.close()
                             link_file.close()
                     elif link.link_type.startswith('OGC'):
                         # Dumping OGC/OWS links
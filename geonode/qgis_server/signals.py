@@ -358,7 +358,8 @@ def qgis_server_post_save_map(instance, sender, **kwargs):
         srid=instance.srid,
         zoom=instance.zoom,
         center_x=instance.center_x,
-        center_y=instance.center_y)
+        center_y=instance.center_y,
+        **instance.ll_bbox_envelope())
 
     # Check overwrite flag
     overwrite = getattr(instance, 'overwrite', False)
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2020 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+"""Diff based reconciliation of the GeoFence rules
+
+Instead of purging the rules of a layer and posting them again one by one,
+the rules GeoFence holds for the layer are mirrored locally and compared with
+the ones derived from the Guardian perm spec, so that only the missing rules
+are added and only the stale ones are deleted.
+"""
+
+import logging
+
+from threading import Lock, local
+
+import requests
+from requests.auth import HTTPBasicAuth
+
+from django.conf import settings
+from django.contrib.gis.geos import GEOSGeometry
+
+from geonode.utils import get_layer_workspace
+from geonode.security.utils import (
+    get_highest_priority,
+    _get_geofence_payload,
+    _get_geofence_rules_for,
+    _toggle_layer_cache_for)
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_area(area):
+    if not area:
+        return ''
+    try:
+        return GEOSGeometry(area).ewkt
+    except Exception:
+        return area.strip()
+
+
+def _rule_key(user=None, role=None, service=None, access=None, area=None, request=None):
+    return (user or '', role or '', service or '', access or '', _normalize_area(area), request or '')
+
+
+def _geofence_rule_key(rule):
+    """Key of a rule as returned by the GeoFence REST API"""
+    return _rule_key(user=rule.get('userName'),
+                     role=rule.get('roleName'),
+                     service=rule.get('service'),
+                     access=rule.get('access'),
+                     area=(rule.get('limits') or {}).get('allowedArea'),
+                     request=rule.get('request') or rule.get('addressRange'))
+
+
+def _desired_rule_key(rule):
+    """Key of a rule as computed from the Guardian permissions"""
+    limit = rule['service'] == '*' and rule['geo_limit']
+    return _rule_key(user=rule['user'],
+                     role='ROLE_{}'.format(rule['group'].upper()) if rule['group'] else None,
+                     service=rule['service'] if rule['service'] != '*' else None,
+                     access='LIMIT' if limit else 'ALLOW',
+                     area=rule['geo_limit'] if limit else None)
+
+
+def _describe(key):
+    user, role, service, access, area, request = key
+    return "{} user={} role={} service={}{}".format(
+        access, user or '*', role or '*', service or '*', ' area={}'.format(area) if area else '')
+
+
+class GeoFenceRulesReconciler(object):
+    """
+    Reconciles the GeoFence rules of the layers with their Guardian perm spec.
+
+    The rules of each layer are fetched once and kept in a local mirror, the
+    priority of the new rules is looked up once, and the changes queued by
+    reconcile() are sent by push() over a single HTTP session.
+    With dry_run nothing is sent to GeoFence and the diffs are only returned.
+
+    Different layers can be reconciled and applied from several threads,
+    each one using its own HTTP session.
+    """
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.url = settings.OGC_SERVER['default']['LOCATION']
+        self.priority = None
+        self.pending = []
+        self.stats = {'added': 0, 'deleted': 0, 'unchanged': 0, 'failed': 0}
+        self._mirror = {}
+        self._lock = Lock()
+        self._local = local()
+
+    @property
+    def session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+            self._local.session.auth = HTTPBasicAuth(settings.OGC_SERVER['default']['USER'],
+                                                     settings.OGC_SERVER['default']['PASSWORD'])
+        return self._local.session
+
+    def _count(self, stat, value=1):
+        with self._lock:
+            self.stats[stat] += value
+
+    def get_priority(self):
+        # new rules are inserted right before the last one, i.e. all of them
+        # at the highest priority found when the reconciliation started
+        with self._lock:
+            if self.priority is None:
+                self.priority = max(get_highest_priority(), 0)
+            return self.priority
+
+    def layer_rules(self, workspace, layer_name):
+        """Returns the mirrored GeoFence rules of a layer"""
+        key = (workspace, layer_name)
+        if key not in self._mirror:
+            r = self.session.get(
+                "{}rest/geofence/rules.json".format(self.url),
+                params={'workspace': workspace, 'layer': layer_name},
+                headers={'Content-type': 'application/json'},
+                timeout=10,
+                verify=False)
+            r.raise_for_status()
+            rules = r.json().get('rules') or []
+            # the filters also match the rules of any workspace or layer
+            self._mirror[key] = [rule for rule in rules
+                                 if rule.get('workspace') == workspace and rule.get('layer') == layer_name]
+        return self._mirror[key]
+
+    def desired_rules(self, layer, perm_spec=None):
+        """
+        Returns the rules, by key, matching the perm spec of the layer and
+        whether the layer cache must be disabled.
+        """
+        if perm_spec is None:
+            perm_spec = layer.get_all_level_info()
+        rules = {}
+        disable_layer_cache = False
+        principals = []
+        for user, perms in (perm_spec.get('users') or {}).items():
+            geofence_user = str(user)
+            if "AnonymousUser" in geofence_user:
+                geofence_user = None
+            principals.append((perms, {'user': geofence_user}))
+        for group, perms in (perm_spec.get('groups') or {}).items():
+            principals.append((perms, {'group': group}))
+        for perms, principal in principals:
+            _rules, _disable_layer_cache = _get_geofence_rules_for(layer, perms, **principal)
+            disable_layer_cache = disable_layer_cache or _disable_layer_cache
+            for rule in _rules:
+                rules.setdefault(_desired_rule_key(rule), rule)
+        return rules, disable_layer_cache
+
+    def reconcile(self, layer, perm_spec=None, queue=True):
+        """
+        Computes the rules to add and to delete for the layer and, unless
+        queue is False, queues them for the next push().
+        Returns the diff.
+        """
+        layer_name = layer.name if layer and hasattr(layer, 'name') else layer.alternate.split(":")[0]
+        workspace = get_layer_workspace(layer)
+        desired, disable_layer_cache = self.desired_rules(layer, perm_spec=perm_spec)
+        existing = self.layer_rules(workspace, layer_name)
+
+        found = set()
+        to_delete = []
+        for rule in existing:
+            key = _geofence_rule_key(rule)
+            if key in desired and key not in found:
+                found.add(key)
+            else:
+                # stale or duplicated rule
+                to_delete.append(rule)
+        to_add = [(key, rule) for key, rule in desired.items() if key not in found]
+
+        diff = {
+            'layer': layer,
+            'layer_name': layer_name,
+            'workspace': workspace,
+            'add': to_add,
+            'delete': to_delete,
+            'unchanged': len(found),
+            'disable_layer_cache': disable_layer_cache,
+            'failed': False,
+        }
+        self._count('unchanged', len(found))
+        if queue:
+            with self._lock:
+                self.pending.append(diff)
+        return diff
+
+    def _delete(self, workspace, layer_name, rule):
+        r = self.session.delete("{}rest/geofence/rules/id/{}".format(self.url, rule['id']))
+        if r.status_code < 200 or r.status_code > 204:
+            raise RuntimeError("Could not DELETE GeoServer Rule id[{}]: {}".format(rule['id'], r.text))
+        self._mirror[(workspace, layer_name)].remove(rule)
+
+    def _add(self, diff, key, rule):
+        payload = _get_geofence_payload(
+            layer=diff['layer'],
+            layer_name=diff['layer_name'],
+            workspace=diff['workspace'],
+            access="ALLOW",
+            user=rule['user'],
+            group=rule['group'],
+            service=rule['service'],
+            geo_limit=rule['geo_limit'],
+            priority=self.get_priority())
+        r = self.session.post(
+            "{}rest/geofence/rules".format(self.url),
+            data=payload,
+            headers={'Content-type': 'application/xml'})
+        if r.status_code not in (200, 201) and 'Duplicate Rule' not in r.text:
+            raise RuntimeError("Could not ADD GeoServer Rule for Layer {!r}: {}".format(
+                diff['layer_name'], r.text))
+        user, role, service, access, area, request = key
+        self._mirror[(diff['workspace'], diff['layer_name'])].append({
+            'id': int(r.text) if r.text.strip().isdigit() else None,
+            'userName': user or None,
+            'roleName': role or None,
+            'workspace': diff['workspace'],
+            'layer': diff['layer_name'],
+            'service': service or None,
+            'access': access,
+            'limits': {'allowedArea': area} if area else None,
+        })
+
+    def apply(self, diff):
+        """
+        Sends the changes of a diff to GeoFence, deletions first, flagging it
+        as 'failed' if any of them could not be applied.
+        """
+        if self.dry_run:
+            return diff
+        try:
+            _toggle_layer_cache_for('{}:{}'.format(diff['workspace'], diff['layer_name']),
+                                    diff['disable_layer_cache'])
+            for rule in diff['delete']:
+                self._delete(diff['workspace'], diff['layer_name'], rule)
+                self._count('deleted')
+            for key, rule in diff['add']:
+                self._add(diff, key, rule)
+                self._count('added')
+        except Exception as e:
+            logger.exception(e)
+            diff['failed'] = True
+            self._count('failed')
+            # the mirror may be out of sync now
+            self._mirror.pop((diff['workspace'], diff['layer_name']), None)
+        return diff
+
+    def push(self):
+        """
+        Sends the queued changes to GeoFence.
+        Returns the diffs processed.
+        """
+        with self._lock:
+            pushed, self.pending = self.pending, []
+        return [self.apply(diff) for diff in pushed]
+
+    @staticmethod
+    def format_diff(diff):
+        lines = ["{}:{}".format(diff['workspace'], diff['layer_name'])]
+        lines.extend(["  - [{}] {}".format(rule.get('id'), _describe(_geofence_rule_key(rule)))
+                      for rule in diff['delete']])
+        lines.extend(["  + {}".format(_describe(key)) for key, rule in diff['add']])
+        lines.append("  = {} unchanged".format(diff['unchanged']))
+        return "\n".join(lines)
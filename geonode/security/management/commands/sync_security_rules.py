@@ -18,8 +18,11 @@
 #
 #########################################################################
 
+import time
+
 from django.core.management.base import BaseCommand
 from geonode.security.utils import sync_resources_with_guardian
+from geonode.security.geofence import GeoFenceRulesReconciler
 
 
 class Command(BaseCommand):
@@ -27,6 +30,33 @@ class Command(BaseCommand):
     Sync resources with Guardian and clear their dirty state
     """
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            dest='dry_run',
+            default=False,
+            help='Print the GeoFence rules that would be added and deleted without changing them')
+        parser.add_argument(
+            '-w',
+            '--workers',
+            dest='workers',
+            type=int,
+            default=None,
+            help='Number of layers synched in parallel (defaults to SECURITY_SYNC_WORKERS)')
+
     def handle(self, *args, **options):
-        sync_resources_with_guardian()
+        dry_run = options.get('dry_run')
+        start = time.time()
+        diffs = sync_resources_with_guardian(dry_run=dry_run, workers=options.get('workers'))
+        if dry_run:
+            for diff in diffs:
+                print(GeoFenceRulesReconciler.format_diff(diff))
+        print("%s %s rules, %s %s rules on %s layers" % (
+            'Would add' if dry_run else 'Added',
+            sum([len(diff['add']) for diff in diffs]),
+            'would delete' if dry_run else 'deleted',
+            sum([len(diff['delete']) for diff in diffs]),
+            len(diffs)))
+        print("Synched %s layers in %.2f seconds" % (len(diffs), time.time() - start))
 
@@ -40,6 +40,7 @@ from guardian.shortcuts import (
 )
 from geonode import qgis_server, geoserver
 from geonode.base.models import (
+    ResourceBase,
     UserGeoLimit,
     GroupGeoLimit
 )
@@ -56,10 +57,14 @@ from geonode.geoserver.upload import geoserver_upload
 from geonode.layers.populate_layers_data import create_layer_data
 
 from .utils import (purge_geofence_all,
+                    get_perm_specs,
                     get_users_with_perms,
                     get_geofence_rules,
                     get_geofence_rules_count,
                     get_highest_priority,
+                    get_resources_with_perms,
+                    get_user_visibility,
+                    get_visible_resources,
                     set_geofence_all,
                     set_geowebcache_invalidate_cache,
                     sync_geofence_with_guardian,
@@ -188,6 +193,29 @@ class SecurityTest(GeoNodeBaseTestSupport):
         response = self.client.get('/admin')
         self.assertEqual(response.status_code, 302)
 
+    @dump_func_name
+    def test_get_perm_specs(self):
+        """
+        Tests the perm specs loaded in bulk match the ones of get_all_level_info.
+        """
+        layers = list(Layer.objects.all().select_related('owner', 'group'))
+        bobby = get_user_model().objects.get(username='bobby')
+        assign_perm('change_layer_style', bobby, layers[0])
+        assign_perm('download_resourcebase', Group.objects.get(name='anonymous'), layers[0].get_self_resource())
+
+        def _sorted(perms):
+            return {principal: sorted(_perms) for principal, _perms in perms.items()}
+
+        from guardian.models import UserObjectPermission
+        user_perms = UserObjectPermission.objects.count()
+        specs = get_perm_specs(layers)
+        # loading the specs never writes permissions
+        self.assertEqual(UserObjectPermission.objects.count(), user_perms)
+        for layer in layers:
+            perm_spec = layer.get_all_level_info()
+            self.assertEqual(_sorted(specs[layer.id]['users']), _sorted(perm_spec['users']))
+            self.assertEqual(_sorted(specs[layer.id]['groups']), _sorted(perm_spec['groups']))
+
 
 class SecurityViewsTests(ResourceTestCaseMixin, GeoNodeBaseTestSupport):
 
@@ -1504,3 +1532,95 @@ class SecurityRulesTest(ResourceTestCaseMixin, GeoNodeBaseTestSupport):
             clean_layer = Layer.objects.get(pk=self._l.id)
             # Check dirty state
             self.assertFalse(clean_layer.dirty_state)
+
+    @dump_func_name
+    def test_sync_resources_with_guardian_reconcile(self):
+        with self.settings(DELAYED_SECURITY_SIGNALS=True):
+            self._l.set_dirty_state()
+            sync_resources_with_guardian()
+            rules_count = get_geofence_rules_count()
+            self.assertTrue(rules_count > 0)
+
+            # Nothing left to change once the rules have been synched
+            diffs = sync_resources_with_guardian(self._l, dry_run=True)
+            self.assertEqual(len(diffs), 1)
+            self.assertEqual(diffs[0]['add'], [])
+            self.assertEqual(diffs[0]['delete'], [])
+            self.assertTrue(diffs[0]['unchanged'] > 0)
+
+            # Only the rules of the new permissions are added
+            bobby = get_user_model().objects.get(username='bobby')
+            assign_perm('view_resourcebase', bobby, self._l.get_self_resource())
+            diffs = sync_resources_with_guardian(self._l, dry_run=True)
+            self.assertEqual(len(diffs[0]['delete']), 0)
+            self.assertTrue(len(diffs[0]['add']) > 0)
+            self.assertEqual(get_geofence_rules_count(), rules_count)
+            sync_resources_with_guardian(self._l)
+            self.assertEqual(get_geofence_rules_count(), rules_count + len(diffs[0]['add']))
+
+            # and removed as soon as they are revoked
+            remove_perm('view_resourcebase', bobby, self._l.get_self_resource())
+            diffs = sync_resources_with_guardian(self._l)
+            self.assertEqual(len(diffs[0]['add']), 0)
+            self.assertTrue(len(diffs[0]['delete']) > 0)
+            self.assertEqual(get_geofence_rules_count(), rules_count)
+
+
+class VisibleResourcesTest(GeoNodeBaseTestSupport):
+
+    def setUp(self):
+        super(VisibleResourcesTest, self).setUp()
+        self.bobby = get_user_model().objects.get(username='bobby')
+        self.norman = get_user_model().objects.get(username='norman')
+        self.private_group = GroupProfile.objects.create(
+            title='Private Group', slug='private-group', access='private')
+        self.private_group.join(self.bobby, role='member')
+
+    def test_user_visibility_is_cached_per_user_instance(self):
+        user = get_user_model().objects.get(username='bobby')
+        visibility = get_user_visibility(user)
+        self.assertEqual(visibility['owner_id'], self.bobby.id)
+        self.assertIn(self.private_group.group_id, list(visibility['group_ids']))
+        self.assertFalse(visibility['is_manager'])
+        with self.assertNumQueries(0):
+            self.assertIs(get_user_visibility(user), visibility)
+
+        # a change of the memberships drops the cached visibility
+        managed_group = GroupProfile.objects.create(title='Managed Group', slug='managed-group')
+        managed_group.join(user, role='manager')
+        visibility = get_user_visibility(user)
+        self.assertTrue(visibility['is_manager'])
+        self.assertEqual(list(visibility['manager_group_ids']), [managed_group.group_id])
+
+    def test_private_group_resources_visibility(self):
+        resource = ResourceBase.objects.first()
+        resource.group = self.private_group.group
+        resource.owner = get_user_model().objects.get(username='admin')
+        resource.save()
+        queryset = ResourceBase.objects.all()
+        visible_to_bobby = get_visible_resources(
+            queryset,
+            get_user_model().objects.get(username='bobby'),
+            private_groups_not_visibile=True)
+        visible_to_norman = get_visible_resources(
+            queryset,
+            get_user_model().objects.get(username='norman'),
+            private_groups_not_visibile=True)
+        self.assertTrue(visible_to_bobby.filter(id=resource.id).exists())
+        self.assertFalse(visible_to_norman.filter(id=resource.id).exists())
+
+    def test_resources_with_perms_matches_has_perm(self):
+        resources = list(ResourceBase.objects.all())
+        remove_perm('view_resourcebase', self.bobby, resources[0])
+        remove_perm('view_resourcebase', get_anonymous_user(), resources[0])
+        assign_perm('view_resourcebase', self.private_group.group, resources[0])
+        remove_perm('view_resourcebase', get_anonymous_user(), resources[1])
+        remove_perm('view_resourcebase', self.bobby, resources[1])
+        resource_ids = [_r.id for _r in resources]
+        for user in (self.bobby, self.norman, get_anonymous_user()):
+            user = get_user_model().objects.get(pk=user.pk)
+            expected = {_r.id for _r in resources if user.has_perm('view_resourcebase', _r)}
+            self.assertEqual(get_resources_with_perms(user, resource_ids), expected)
+        self.assertIn(resources[0].id, get_resources_with_perms(self.bobby, resource_ids))
+        with self.assertNumQueries(2):
+            get_resources_with_perms(self.norman, resource_ids)
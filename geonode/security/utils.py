@@ -27,11 +27,13 @@ import json
 import logging
 import traceback
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from . import models
 
 from six import string_types
 from requests.auth import HTTPBasicAuth
 from django.conf import settings
+from django.db import connection
 from django.db.models import Q
 from django.contrib.auth import get_user_model
 # from django.contrib.gis.geos import GEOSGeometry
@@ -39,7 +41,8 @@ from django.contrib.contenttypes.models import ContentType
 # from django.contrib.auth import login
 from django.contrib.auth.models import Group, Permission
 from django.core.exceptions import ObjectDoesNotExist
-from guardian.utils import get_user_obj_perms_model
+from guardian.utils import get_user_obj_perms_model, get_group_obj_perms_model
+from guardian.conf import settings as guardian_settings
 from guardian.shortcuts import assign_perm, get_anonymous_user
 from geonode.groups.models import GroupProfile
 from geonode.utils import get_layer_workspace
@@ -47,41 +50,62 @@ from geonode.utils import get_layer_workspace
 logger = logging.getLogger("geonode.security.utils")
 
 
+def get_user_visibility(user):
+    """
+    Returns the effective visibility of a user as a dict of:
+     - is_admin, is_manager
+     - owner_id: the user id, if authenticated
+     - group_ids: subquery of the ids of the groups the user belongs to
+     - manager_group_ids: subquery of the ids of the groups the user manages
+
+    The structure is cached on the user instance, i.e. for the lifetime of the
+    request, and dropped as soon as the group memberships of the user change.
+    """
+    visibility = getattr(user, '_visibility_cache', None) if user else None
+    if visibility is not None:
+        return visibility
+
+    from geonode.groups.models import GroupMember
+    owner_id = user.id if user and user.is_authenticated else None
+    memberships = GroupMember.objects.filter(user_id=owner_id) if owner_id else GroupMember.objects.none()
+    visibility = {
+        'is_admin': user.is_superuser if user else False,
+        'is_manager': memberships.filter(role=GroupMember.MANAGER).exists() if owner_id else False,
+        'owner_id': owner_id,
+        'group_ids': memberships.values_list('group__group_id', flat=True),
+        'manager_group_ids': Group.objects.filter(
+            name__in=memberships.filter(role=GroupMember.MANAGER).values('group__slug')).values_list('id', flat=True),
+    }
+
+    if user:
+        try:
+            setattr(user, '_visibility_cache', visibility)
+        except Exception:
+            pass
+    return visibility
+
+
+def invalidate_user_visibility(user):
+    """Drops the visibility cached by get_user_visibility on the user instance"""
+    if user is not None:
+        user.__dict__.pop('_visibility_cache', None)
+
+
 def get_visible_resources(queryset,
                           user,
                           admin_approval_required=False,
                           unpublished_not_visible=False,
                           private_groups_not_visibile=False):
-    is_admin = False
-    is_manager = False
-    if user:
-        is_admin = user.is_superuser if user else False
-        try:
-            is_manager = user.groupmember_set.all().filter(role='manager').exists()
-        except Exception:
-            is_manager = False
+    visibility = get_user_visibility(user)
+    is_admin = visibility['is_admin']
+    is_manager = visibility['is_manager']
 
     # Get the list of objects the user has access to
-    anonymous_group = None
     public_groups = GroupProfile.objects.exclude(access="private").values('group')
-    groups = []
-    group_list_all = []
-    manager_groups = []
-    try:
-        group_list_all = user.group_list_all().values('group')
-    except Exception:
-        pass
-    try:
-        manager_groups = Group.objects.filter(
-            name__in=user.groupmember_set.filter(role="manager").values_list("group__slug", flat=True))
-    except Exception:
-        pass
-    try:
-        anonymous_group = Group.objects.get(name='anonymous')
-        if anonymous_group and anonymous_group not in groups:
-            groups.append(anonymous_group)
-    except Exception:
-        pass
+    groups = Group.objects.filter(name='anonymous').values('id')
+    group_list_all = visibility['group_ids']
+    manager_groups = visibility['manager_group_ids']
+    owned = Q(owner_id=visibility['owner_id']) if visibility['owner_id'] else Q(pk__in=[])
 
     filter_set = queryset
 
@@ -94,14 +118,14 @@ def get_visible_resources(queryset,
                     Q(group__in=manager_groups) |
                     Q(group__in=group_list_all) |
                     Q(group__in=public_groups) |
-                    Q(owner__username__iexact=str(user)))
+                    owned)
             elif user:
                 filter_set = filter_set.filter(
                     Q(is_published=True) |
                     Q(group__in=groups) |
                     Q(group__in=group_list_all) |
                     Q(group__in=public_groups) |
-                    Q(owner__username__iexact=str(user)))
+                    owned)
             else:
                 filter_set = filter_set.filter(
                     Q(is_published=True) |
@@ -113,7 +137,7 @@ def get_visible_resources(queryset,
             if user:
                 filter_set = filter_set.exclude(
                     Q(is_published=False) & ~(
-                        Q(owner__username__iexact=str(user)) | Q(group__in=group_list_all)))
+                        owned | Q(group__in=group_list_all)))
             else:
                 filter_set = filter_set.exclude(Q(is_published=False))
 
@@ -123,7 +147,7 @@ def get_visible_resources(queryset,
             if user:
                 filter_set = filter_set.exclude(
                     Q(group__in=private_groups) & ~(
-                        Q(owner__username__iexact=str(user)) | Q(group__in=group_list_all)))
+                        owned | Q(group__in=group_list_all)))
             else:
                 filter_set = filter_set.exclude(group__in=private_groups)
 
@@ -132,12 +156,47 @@ def get_visible_resources(queryset,
         if user:
             filter_set = filter_set.exclude(
                 Q(dirty_state=True) & ~(
-                    Q(owner__username__iexact=str(user)) | Q(group__in=group_list_all)))
+                    owned | Q(group__in=group_list_all)))
         else:
             filter_set = filter_set.exclude(Q(dirty_state=True))
     return filter_set
 
 
+def get_resources_with_perms(user, resource_ids, perm='view_resourcebase'):
+    """
+    Returns the subset of ``resource_ids`` on which ``user`` holds the ``perm`` object permission.
+
+    Equivalent to calling ``user.has_perm(perm, resource)`` for every resource, but user and
+    group object permissions are resolved with one query each for the whole batch.
+    """
+    from geonode.base.models import ResourceBase
+    resource_ids = set(resource_ids)
+    if not resource_ids or not user:
+        return set()
+    if not user.is_authenticated:
+        user = get_anonymous_user()
+    if not user.is_active:
+        return set()
+    if user.is_superuser:
+        return resource_ids
+
+    ctype = ContentType.objects.get_for_model(ResourceBase)
+    object_pks = [str(_id) for _id in resource_ids]
+    user_model = get_user_obj_perms_model(ResourceBase)
+    group_model = get_group_obj_perms_model(ResourceBase)
+    allowed = set(user_model.objects.filter(
+        user=user,
+        content_type=ctype,
+        permission__codename=perm,
+        object_pk__in=object_pks).values_list('object_pk', flat=True))
+    allowed.update(group_model.objects.filter(
+        group__user=user,
+        content_type=ctype,
+        permission__codename=perm,
+        object_pk__in=object_pks).values_list('object_pk', flat=True))
+    return {int(_pk) for _pk in allowed}
+
+
 def get_users_with_perms(obj):
     """
     Override of the Guardian get_users_with_perms
@@ -545,14 +604,12 @@ def set_geofence_all(instance):
             resource.set_dirty_state()
 
 
-@on_ogc_backend(geoserver.BACKEND_PACKAGE)
-def sync_geofence_with_guardian(layer, perms, user=None, group=None):
+def _get_geofence_rules_for(layer, perms, user=None, group=None):
     """
-    Sync Guardian permissions to GeoFence.
+    Returns the GeoFence rules matching the Guardian permissions of a user, a
+    group or, if none of them is specified, anonymous, and whether the layer
+    cache must be disabled because of geographic limits.
     """
-    _layer_name = layer.name if layer and hasattr(layer, 'name') else layer.alternate.split(":")[0]
-    _layer_workspace = get_layer_workspace(layer)
-    # Create new rule-set
     gf_services = {}
     gf_services["*"] = 'download_resourcebase' in perms and \
         ('view_resourcebase' in perms or 'change_layer_style' in perms)
@@ -571,26 +628,53 @@ def sync_geofence_with_guardian(layer, perms, user=None, group=None):
     groups_geolimits = None
     anonymous_geolimits = None
 
+    # the geolimits are filtered here, rather than in the database, so that
+    # they can be prefetched when syncing many layers
     if user:
         _user = user if isinstance(user, string_types) else user.username
-        users_geolimits = layer.users_geolimits.filter(user=get_user_model().objects.get(username=_user))
-        gf_services["*"] = users_geolimits.count() > 0 if not gf_services["*"] else gf_services["*"]
-        _disable_layer_cache = users_geolimits.count() > 0
+        users_geolimits = sorted([_gl for _gl in layer.users_geolimits.all() if _gl.user.username == _user],
+                                 key=lambda _gl: _gl.id)
+        gf_services["*"] = len(users_geolimits) > 0 if not gf_services["*"] else gf_services["*"]
+        _disable_layer_cache = len(users_geolimits) > 0
 
     if group:
         _group = group if isinstance(group, string_types) else group.name
-        if GroupProfile.objects.filter(group__name=_group).count() == 1:
-            groups_geolimits = layer.groups_geolimits.filter(group=GroupProfile.objects.get(group__name=_group))
-            gf_services["*"] = groups_geolimits.count() > 0 if not gf_services["*"] else gf_services["*"]
-            _disable_layer_cache = groups_geolimits.count() > 0
+        groups_geolimits = sorted([_gl for _gl in layer.groups_geolimits.all() if _gl.group.group.name == _group],
+                                  key=lambda _gl: _gl.id)
+        gf_services["*"] = len(groups_geolimits) > 0 if not gf_services["*"] else gf_services["*"]
+        _disable_layer_cache = len(groups_geolimits) > 0
 
     if not user and not group:
-        anonymous_geolimits = layer.users_geolimits.filter(user=get_anonymous_user())
-        gf_services["*"] = anonymous_geolimits.count() > 0 if not gf_services["*"] else gf_services["*"]
-        _disable_layer_cache = anonymous_geolimits.count() > 0
+        anonymous_geolimits = sorted([_gl for _gl in layer.users_geolimits.all()
+                                      if _gl.user.username == guardian_settings.ANONYMOUS_USER_NAME],
+                                     key=lambda _gl: _gl.id)
+        gf_services["*"] = len(anonymous_geolimits) > 0 if not gf_services["*"] else gf_services["*"]
+        _disable_layer_cache = len(anonymous_geolimits) > 0
 
-    if _disable_layer_cache:
-        # delete_layer_cache('{}:{}'.format(_layer_workspace, _layer_name))
+    rules = []
+    for service, allowed in gf_services.items():
+        if allowed:
+            if _user:
+                _wkt = None
+                if users_geolimits:
+                    _wkt = users_geolimits[-1].wkt
+                rules.append({'service': service, 'user': _user, 'group': None, 'geo_limit': _wkt})
+            elif not _group:
+                _wkt = None
+                if anonymous_geolimits:
+                    _wkt = anonymous_geolimits[-1].wkt
+                rules.append({'service': service, 'user': None, 'group': None, 'geo_limit': _wkt})
+            if _group:
+                _wkt = None
+                if groups_geolimits:
+                    _wkt = groups_geolimits[-1].wkt
+                rules.append({'service': service, 'user': None, 'group': _group, 'geo_limit': _wkt})
+    return rules, _disable_layer_cache
+
+
+def _toggle_layer_cache_for(layer_name, disable_layer_cache):
+    if disable_layer_cache:
+        # delete_layer_cache(layer_name)
         filters = None
         formats = None
     else:
@@ -607,28 +691,29 @@ def sync_geofence_with_guardian(layer, perms, user=None, group=None):
             'image/gif',
             'image/png8'
         ]
-    toggle_layer_cache('{}:{}'.format(_layer_workspace, _layer_name), enable=True, filters=filters, formats=formats)
+    toggle_layer_cache(layer_name, enable=True, filters=filters, formats=formats)
 
-    for service, allowed in gf_services.items():
-        if allowed:
-            if _user:
-                logger.debug("Adding 'user' to geofence the rule: %s %s %s" % (layer, service, _user))
-                _wkt = None
-                if users_geolimits and users_geolimits.count():
-                    _wkt = users_geolimits.last().wkt
-                _update_geofence_rule(layer, _layer_name, _layer_workspace, service, user=_user, geo_limit=_wkt)
-            elif not _group:
-                logger.debug("Adding to geofence the rule: %s %s *" % (layer, service))
-                _wkt = None
-                if anonymous_geolimits and anonymous_geolimits.count():
-                    _wkt = anonymous_geolimits.last().wkt
-                _update_geofence_rule(layer, _layer_name, _layer_workspace, service, geo_limit=_wkt)
-            if _group:
-                logger.debug("Adding 'group' to geofence the rule: %s %s %s" % (layer, service, _group))
-                _wkt = None
-                if groups_geolimits and groups_geolimits.count():
-                    _wkt = groups_geolimits.last().wkt
-                _update_geofence_rule(layer, _layer_name, _layer_workspace, service, group=_group, geo_limit=_wkt)
+
+@on_ogc_backend(geoserver.BACKEND_PACKAGE)
+def sync_geofence_with_guardian(layer, perms, user=None, group=None):
+    """
+    Sync Guardian permissions to GeoFence.
+    """
+    _layer_name = layer.name if layer and hasattr(layer, 'name') else layer.alternate.split(":")[0]
+    _layer_workspace = get_layer_workspace(layer)
+    # Create new rule-set
+    rules, _disable_layer_cache = _get_geofence_rules_for(layer, perms, user=user, group=group)
+    _toggle_layer_cache_for('{}:{}'.format(_layer_workspace, _layer_name), _disable_layer_cache)
+
+    # the new rules are all inserted at the same priority, so that it is
+    # enough to look it up once
+    priority = get_highest_priority() if rules else None
+    for rule in rules:
+        logger.debug("Adding to geofence the rule: %s %s %s" % (
+            layer, rule['service'], rule['user'] or rule['group'] or '*'))
+        _update_geofence_rule(layer, _layer_name, _layer_workspace, rule['service'],
+                              user=rule['user'], group=rule['group'], geo_limit=rule['geo_limit'],
+                              priority=priority)
     if not getattr(settings, 'DELAYED_SECURITY_SIGNALS', False):
         set_geofence_invalidate_cache()
     else:
@@ -684,8 +769,8 @@ def remove_object_permissions(instance):
 
 
 def _get_geofence_payload(layer, layer_name, workspace, access, user=None, group=None,
-                          service=None, geo_limit=None):
-    highest_priority = get_highest_priority()
+                          service=None, geo_limit=None, priority=None):
+    highest_priority = get_highest_priority() if priority is None else priority
     root_el = etree.Element("Rule")
     username_el = etree.SubElement(root_el, "userName")
     if user is not None:
@@ -730,7 +815,8 @@ def _get_geofence_payload(layer, layer_name, workspace, access, user=None, group
     return etree.tostring(root_el)
 
 
-def _update_geofence_rule(layer, layer_name, workspace, service, user=None, group=None, geo_limit=None):
+def _update_geofence_rule(layer, layer_name, workspace, service, user=None, group=None, geo_limit=None,
+                          priority=None):
     payload = _get_geofence_payload(
         layer=layer,
         layer_name=layer_name,
@@ -739,7 +825,8 @@ def _update_geofence_rule(layer, layer_name, workspace, service, user=None, grou
         user=user,
         group=group,
         service=service,
-        geo_limit=geo_limit
+        geo_limit=geo_limit,
+        priority=priority
     )
     logger.debug("request data: {}".format(payload))
     response = requests.post(
@@ -764,44 +851,157 @@ def _update_geofence_rule(layer, layer_name, workspace, service, user=None, grou
             raise RuntimeError(msg)
 
 
-def sync_resources_with_guardian(resource=None):
+def get_perm_specs(layers, missing_managers=None):
+    """
+    Bulk version of get_all_level_info: returns the perm specs of the layers,
+    by layer id, loading the permissions, the users, the groups and the group
+    managers with a fixed number of queries.
+    Nothing is written: the group managers still lacking their permissions
+    are included in the specs and, if a missing_managers list is given,
+    appended to it as (manager, layer) tuples, see assign_managers_perms.
+    """
+    from guardian.models import UserObjectPermission, GroupObjectPermission
+    from geonode.base.models import ResourceBase
+    from geonode.groups.models import GroupMember
+    from geonode.layers.models import Layer
+
+    specs = {}
+    if not layers:
+        return specs
+    object_pks = [str(layer.id) for layer in layers]
+    resource_ctype = ContentType.objects.get_for_model(ResourceBase)
+    layer_ctype = ContentType.objects.get_for_model(Layer)
+    ctypes = (resource_ctype.id, layer_ctype.id)
+    PERMISSIONS_TO_FETCH = models.VIEW_PERMISSIONS + models.ADMIN_PERMISSIONS + models.LAYER_ADMIN_PERMISSIONS
+
+    user_perms = list(UserObjectPermission.objects.filter(
+        content_type_id__in=ctypes,
+        object_pk__in=object_pks,
+        permission__codename__in=PERMISSIONS_TO_FETCH).order_by('id').values_list(
+            'object_pk', 'content_type_id', 'user_id', 'permission__codename'))
+    group_perms = list(GroupObjectPermission.objects.filter(
+        content_type_id__in=ctypes,
+        object_pk__in=object_pks).order_by('id').values_list(
+            'object_pk', 'content_type_id', 'group_id', 'permission__codename'))
+    users = get_user_model().objects.in_bulk(list(set([_p[2] for _p in user_perms])))
+    groups = Group.objects.in_bulk(list(set([_p[2] for _p in group_perms])))
+
+    group_names = set([group.name for group in groups.values()])
+    group_names.update([layer.group.name for layer in layers if layer.group_id])
+    managers = {}
+    for member in GroupMember.objects.filter(group__slug__in=group_names, role='manager').select_related(
+            'group', 'user'):
+        managers.setdefault(member.group.slug, []).append(member.user)
+
+    def _collect(perms, principals, ctype):
+        collected = {}
+        for object_pk, ctype_id, principal_id, codename in perms:
+            if ctype_id == ctype.id and principal_id in principals:
+                collected.setdefault(object_pk, {}).setdefault(principals[principal_id], []).append(codename)
+        return collected
+
+    resource_users = _collect(user_perms, users, resource_ctype)
+    resource_groups = _collect(group_perms, groups, resource_ctype)
+    layer_users = _collect(user_perms, users, layer_ctype)
+    layer_groups = _collect(group_perms, groups, layer_ctype)
+
+    manager_perms = models.ADMIN_PERMISSIONS + models.VIEW_PERMISSIONS
+    for layer in layers:
+        object_pk = str(layer.id)
+        _users = resource_users.get(object_pk, {})
+        _groups = resource_groups.get(object_pk, {})
+        _managers = [(manager, False) for group in _groups for manager in managers.get(group.name, [])]
+        if layer.group_id:
+            _managers.extend([(manager, True) for manager in managers.get(layer.group.name, [])])
+        for manager, is_resource_group in _managers:
+            if manager not in _users and not manager.is_superuser and \
+                    not (is_resource_group and manager == layer.owner):
+                if missing_managers is not None:
+                    missing_managers.append((manager, layer))
+                _users[manager] = manager_perms
+        for user, perms in layer_users.get(object_pk, {}).items():
+            _users[user] = _users.get(user, []) + perms
+        for group, perms in layer_groups.get(object_pk, {}).items():
+            _groups[group] = list(dict.fromkeys(_groups.get(group, []) + perms))
+        specs[layer.id] = {'users': _users, 'groups': _groups}
+    return specs
+
+
+def assign_managers_perms(missing_managers):
+    """
+    Grants the group managers collected by get_perm_specs their permissions.
+    """
+    for manager, layer in missing_managers:
+        for perm in models.ADMIN_PERMISSIONS + models.VIEW_PERMISSIONS:
+            assign_perm(perm, manager, layer.get_self_resource())
+
+
+def sync_resources_with_guardian(resource=None, dry_run=False, workers=None):
     """
     Sync resources with Guardian and clear their dirty state
+
+    The dirty layers and their perm specs are loaded in bulk, then their
+    GeoFence rules are reconciled by a pool of ``workers`` threads: only the
+    missing rules are added and only the stale ones are deleted. The GeoFence
+    cache is invalidated once at the end.
+    With dry_run nothing is changed and the diffs are returned.
     """
 
     from geonode.base.models import ResourceBase
     from geonode.layers.models import Layer
+    from geonode.security.geofence import GeoFenceRulesReconciler
 
     if resource:
         dirty_resources = ResourceBase.objects.filter(id=resource.id)
     else:
         dirty_resources = ResourceBase.objects.filter(dirty_state=True)
-    if dirty_resources and dirty_resources.count() > 0:
-        logger.debug(" --------------------------- synching with guardian!")
-        for r in dirty_resources:
-            if r.polymorphic_ctype.name == 'layer':
-                layer = None
-                try:
-                    purge_geofence_layer_rules(r)
-                    layer = Layer.objects.get(id=r.id)
-                    perm_spec = layer.get_all_level_info()
-                    logger.debug(" %s --------------------------- %s " % (layer, perm_spec))
-                    # All the other users
-                    if 'users' in perm_spec:
-                        for user, perms in perm_spec['users'].items():
-                            user = get_user_model().objects.get(username=user)
-                            # Set the GeoFence User Rules
-                            geofence_user = str(user)
-                            if "AnonymousUser" in geofence_user:
-                                geofence_user = None
-                            sync_geofence_with_guardian(layer, perms, user=geofence_user)
-                    # All the other groups
-                    if 'groups' in perm_spec:
-                        for group, perms in perm_spec['groups'].items():
-                            group = Group.objects.get(name=group)
-                            # Set the GeoFence Group Rules
-                            sync_geofence_with_guardian(layer, perms, group=group)
-                    r.clear_dirty_state()
-                except Exception as e:
-                    logger.exception(e)
-                    logger.warn("!WARNING! - Failure Synching-up Security Rules for Resource [%s]" % (r))
+    layers = list(Layer.objects.filter(
+        id__in=dirty_resources.values('id')).select_related('owner', 'group').prefetch_related(
+            'users_geolimits__user', 'groups_geolimits__group__group'))
+    if not layers:
+        return []
+
+    logger.debug(" --------------------------- synching with guardian!")
+    workers = workers or getattr(settings, 'SECURITY_SYNC_WORKERS', 1)
+    missing_managers = []
+    perm_specs = get_perm_specs(layers, missing_managers=missing_managers)
+    if not dry_run:
+        assign_managers_perms(missing_managers)
+    reconciler = GeoFenceRulesReconciler(dry_run=dry_run)
+
+    def sync_layer(layer):
+        try:
+            diff = reconciler.reconcile(layer, perm_spec=perm_specs[layer.id], queue=False)
+            logger.debug(" %s --------------------------- %s " % (layer, reconciler.format_diff(diff)))
+            return reconciler.apply(diff)
+        except Exception as e:
+            logger.exception(e)
+            logger.warn("!WARNING! - Failure Synching-up Security Rules for Resource [%s]" % (layer))
+            return None
+        finally:
+            if workers > 1:
+                # every worker thread holds its own database connection
+                connection.close()
+
+    if workers > 1 and len(layers) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            diffs = list(executor.map(sync_layer, layers))
+    else:
+        workers = 1
+        diffs = [sync_layer(layer) for layer in layers]
+    diffs = [diff for diff in diffs if diff is not None]
+
+    if not dry_run:
+        synched = [diff['layer'] for diff in diffs if not diff['failed']]
+        ResourceBase.objects.filter(id__in=[layer.id for layer in synched]).update(dirty_state=False)
+        # the bulk update skips the post_save receivers keeping the public
+        # facet counts and the search index in sync with the dirty state
+        from geonode.base.facets import refresh_resource_facets
+        from geonode.base.search_index import enqueue
+        for layer in synched:
+            layer.dirty_state = False
+            refresh_resource_facets(layer.id)
+            enqueue(layer)
+        if reconciler.stats['added'] or reconciler.stats['deleted']:
+            set_geofence_invalidate_cache()
+    return diffs
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0030_auto_20200115_1121'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='probe_status',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='probe_latency',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='last_probed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -22,7 +22,6 @@ import logging
 from django.db import models
 from django.conf import settings
 from django.urls import reverse
-from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
 from geonode.base.models import ResourceBase
 from geonode.people.enumerations import ROLE_VALUES
@@ -135,6 +134,19 @@ class Service(ResourceBase):
         null=True,
         blank=True
     )
+    # health of the remote service, as stored by utils.probe_services
+    probe_status = models.PositiveIntegerField(
+        null=True,
+        blank=True
+    )
+    probe_latency = models.FloatField(
+        null=True,
+        blank=True
+    )
+    last_probed = models.DateTimeField(
+        null=True,
+        blank=True
+    )
     external_id = models.IntegerField(
         null=True,
         blank=True
@@ -171,16 +183,14 @@ class Service(ResourceBase):
     def get_absolute_url(self):
         return '/services/%i' % self.id
 
-    @cached_property
+    @property
     def probe(self):
-        # AF: this must be handled asynchronously
-        # from geonode.utils import http_client
-        # try:
-        #     resp, content = http_client.request(self.service_url)
-        #     return resp.status
-        # except Exception:
-        #     return 404
-        return 200
+        # The services are probed asynchronously by the probe_services task,
+        # the ones never probed yet are assumed to be online, the ones probed
+        # without an answer have no status
+        if self.probe_status is not None:
+            return self.probe_status
+        return None if self.last_probed is not None else 200
 
 
 class ServiceProfileRole(models.Model):
@@ -33,7 +33,9 @@ from geonode.base.models import Link
 from geonode.layers.models import Layer
 from geonode.layers.utils import create_thumbnail
 
-from arcrest import MapService as ArcMapService, ImageService as ArcImageService
+from arcrest import (MapService as ArcMapService,
+                     ImageService as ArcImageService,
+                     MapLayer as ArcMapLayer)
 
 from .. import enumerations
 from ..enumerations import INDEXED
@@ -59,6 +61,43 @@ MapLayer = namedtuple("MapLayer",
                       maxScale")
 
 
+class CachedRestURLMixin(object):
+    """Fetch the arcrest resources lazily, through the capabilities cache
+
+    arcrest downloads every map layer as soon as it is listed, the service
+    and layers JSON documents are shared instead by the handlers, web and
+    Celery workers alike.
+    """
+    __lazy_fetch__ = True
+
+    @property
+    def _contents(self):
+        if self.__urldata__ is Ellipsis:
+            ogc_server_settings = settings.OGC_SERVER['default']
+            self.__urldata__ = base.get_cached_capabilities(
+                self.url,
+                timeout=ogc_server_settings.get('TIMEOUT', 60))
+        return self.__urldata__
+
+    def _get_subfolder(self, foldername, returntype, params=None, file_data=None):
+        if returntype is ArcMapLayer:
+            returntype = CachedMapLayer
+        return super(CachedRestURLMixin, self)._get_subfolder(
+            foldername, returntype, params=params, file_data=file_data)
+
+
+class CachedMapLayer(CachedRestURLMixin, ArcMapLayer):
+    pass
+
+
+class CachedMapService(CachedRestURLMixin, ArcMapService):
+    pass
+
+
+class CachedImageService(CachedRestURLMixin, ArcImageService):
+    pass
+
+
 class ArcMapServiceHandler(base.ServiceHandlerBase):
     """Remote service handler for ESRI:ArcGIS:MapServer services"""
 
@@ -67,7 +106,7 @@ class ArcMapServiceHandler(base.ServiceHandlerBase):
     def __init__(self, url):
         self.proxy_base = None
         self.url = url
-        self.parsed_service = ArcMapService(self.url)
+        self.parsed_service = CachedMapService(self.url)
         extent, srs = utils.get_esri_extent(self.parsed_service)
         try:
             _sname = utils.get_esri_service_name(self.url)
@@ -175,32 +214,37 @@ class ArcMapServiceHandler(base.ServiceHandlerBase):
         :type geonode_service: geonode.services.models.Service
 
         """
+        geonode_layer = self._harvest_layer(resource_id, geonode_service)
+        # self._enrich_layer_metadata(geonode_layer)
+        self._create_layer_service_link(geonode_layer)
+        # self._create_layer_legend_link(geonode_layer)
+
+    def _harvest_layer(self, resource_id, geonode_service):
         layer_meta = self.get_resource(resource_id)
-        if layer_meta:
-            resource_fields = self._get_indexed_layer_fields(layer_meta)
-            keywords = resource_fields.pop("keywords")
-            existance_test_qs = Layer.objects.filter(
-                name=resource_fields["name"],
-                store=resource_fields["store"],
-                workspace=resource_fields["workspace"]
-            )
-            if existance_test_qs.exists():
-                raise RuntimeError(
-                    "Resource {!r} has already been harvested".format(resource_id))
-            resource_fields["keywords"] = keywords
-            resource_fields["is_approved"] = True
-            resource_fields["is_published"] = True
-            if settings.RESOURCE_PUBLISHING or settings.ADMIN_MODERATE_UPLOADS:
-                resource_fields["is_approved"] = False
-                resource_fields["is_published"] = False
-            geonode_layer = self._create_layer(
-                geonode_service, **resource_fields)
-            # self._enrich_layer_metadata(geonode_layer)
-            self._create_layer_service_link(geonode_layer)
-            # self._create_layer_legend_link(geonode_layer)
-        else:
+        if not layer_meta:
             raise RuntimeError(
                 "Resource {!r} cannot be harvested".format(resource_id))
+        resource_fields = self._get_indexed_layer_fields(layer_meta)
+        keywords = resource_fields.pop("keywords")
+        existance_test_qs = Layer.objects.filter(
+            name=resource_fields["name"],
+            store=resource_fields["store"],
+            workspace=resource_fields["workspace"]
+        )
+        if existance_test_qs.exists():
+            raise RuntimeError(
+                "Resource {!r} has already been harvested".format(resource_id))
+        resource_fields["keywords"] = keywords
+        resource_fields["is_approved"] = True
+        resource_fields["is_published"] = True
+        if settings.RESOURCE_PUBLISHING or settings.ADMIN_MODERATE_UPLOADS:
+            resource_fields["is_approved"] = False
+            resource_fields["is_published"] = False
+        return self._create_layer(
+            geonode_service, **resource_fields)
+
+    def _get_layer_links(self, geonode_layer):
+        return [self._get_layer_service_link(geonode_layer)]
 
     def has_resources(self):
         try:
@@ -289,23 +333,31 @@ class ArcMapServiceHandler(base.ServiceHandlerBase):
         )
 
     def _create_layer_service_link(self, geonode_layer):
+        service_link = self._get_layer_service_link(geonode_layer)
         Link.objects.get_or_create(
+            resource=service_link.resource,
+            url=service_link.url,
+            name=service_link.name,
+            defaults={
+                "extension": service_link.extension,
+                "name": service_link.name,
+                "url": service_link.url,
+                "mime": service_link.mime,
+                "link_type": service_link.link_type,
+            }
+        )
+
+    def _get_layer_service_link(self, geonode_layer):
+        return Link(
             resource=geonode_layer.resourcebase_ptr,
             url=geonode_layer.ows_url,
             name="ESRI {}: {} Service".format(
                 geonode_layer.remote_service.type,
                 geonode_layer.store
             ),
-            defaults={
-                "extension": "html",
-                "name": "ESRI {}: {} Service".format(
-                    geonode_layer.remote_service.type,
-                    geonode_layer.store
-                ),
-                "url": geonode_layer.ows_url,
-                "mime": "text/html",
-                "link_type": "ESRI:{}".format(geonode_layer.remote_service.type),
-            }
+            extension="html",
+            mime="text/html",
+            link_type="ESRI:{}".format(geonode_layer.remote_service.type)
         )
 
 
@@ -317,7 +369,7 @@ class ArcImageServiceHandler(ArcMapServiceHandler):
     def __init__(self, url):
         self.proxy_base = None
         self.url = url
-        self.parsed_service = ArcImageService(self.url)
+        self.parsed_service = CachedImageService(self.url)
         extent, srs = utils.get_esri_extent(self.parsed_service)
         try:
             _sname = utils.get_esri_service_name(self.url)
@@ -19,15 +19,21 @@
 
 """Remote service handling base classes and helpers."""
 
+import time
+import hashlib
 import logging
+import requests
 
 from urllib.parse import quote
 
 from django.conf import settings
 from django.urls import reverse
-from six.moves.urllib.parse import urlencode, urlparse, urljoin, parse_qs, urlunparse
+from django.db import transaction
+from django.core.cache import caches
+from six.moves.urllib.parse import urlencode, urlparse, urljoin, parse_qs, parse_qsl, urlunparse
 
 from geonode import geoserver
+from geonode.base.models import Link
 from geonode.utils import check_ogc_backend
 
 from .. import enumerations
@@ -40,6 +46,10 @@ else:
 
 logger = logging.getLogger(__name__)
 
+CAPABILITIES_CACHE_KEY = 'geonode.services.capabilities.{}'
+# OGC KVP parameter names are case insensitive
+OWS_PARAMETERS = ('service', 'version', 'request')
+
 
 def get_proxified_ows_url(url, version=None, proxy_base=None):
     """
@@ -86,6 +96,97 @@ def get_proxified_ows_url(url, version=None, proxy_base=None):
     return (version, proxified_url, base_ows_url)
 
 
+def _capabilities_cache_key(url, username=None):
+    """
+    Returns the cache key of a capabilities document, the same for the URLs
+    differing only in the host case, the parameters order or the case of the
+    OWS parameter names.
+    """
+    parsed = urlparse(url)
+    query = sorted(
+        (key.lower() if key.lower() in OWS_PARAMETERS else key, value)
+        for key, value in parse_qsl(parsed.query, keep_blank_values=True))
+    normalized = urlunparse([
+        parsed.scheme.lower(),
+        parsed.netloc.lower(),
+        parsed.path or '/',
+        parsed.params,
+        urlencode(query),
+        ''
+    ])
+    if username:
+        normalized = '{}#{}'.format(normalized, username)
+    return CAPABILITIES_CACHE_KEY.format(hashlib.md5(normalized.encode('utf-8')).hexdigest())
+
+
+def get_cached_capabilities(url, timeout=30, headers=None, username=None, password=None):
+    """Return the capabilities document of a remote service
+
+    The documents are kept in the SERVICES_CAPABILITIES_CACHE cache, shared by
+    the web workers and the Celery ones when the backend allows it. A document
+    is served from the cache for SERVICES_CAPABILITIES_CACHE_TTL seconds, then
+    it is revalidated with the ETag and Last-Modified headers of the response.
+    A stale document is served when the remote service is not reachable.
+    """
+    ttl = getattr(settings, 'SERVICES_CAPABILITIES_CACHE_TTL', 300)
+    cache = caches[getattr(settings, 'SERVICES_CAPABILITIES_CACHE', 'default')]
+    key = _capabilities_cache_key(url, username=username)
+    entry = cache.get(key) if ttl else None
+    if entry and entry['expires'] > time.time():
+        return entry['content']
+
+    _headers = dict(headers or {})
+    if entry and entry.get('etag'):
+        _headers['If-None-Match'] = entry['etag']
+    if entry and entry.get('last_modified'):
+        _headers['If-Modified-Since'] = entry['last_modified']
+    try:
+        response = requests.get(
+            url,
+            headers=_headers,
+            auth=(username, password) if username else None,
+            timeout=timeout)
+        if response.status_code != 304:
+            response.raise_for_status()
+    except requests.exceptions.RequestException:
+        if entry:
+            logger.warning("Could not revalidate the capabilities of {}, using the cached ones".format(url))
+            return entry['content']
+        raise
+
+    if response.status_code == 304 and entry:
+        content = entry['content']
+    else:
+        content = response.content
+        entry = {
+            'content': content,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+    if ttl:
+        entry['expires'] = time.time() + ttl
+        cache.set(key, entry, getattr(settings, 'SERVICES_CAPABILITIES_CACHE_TIMEOUT', 86400))
+    return content
+
+
+def invalidate_cached_capabilities(url, username=None):
+    cache = caches[getattr(settings, 'SERVICES_CAPABILITIES_CACHE', 'default')]
+    cache.delete(_capabilities_cache_key(url, username=username))
+
+
+def bulk_save_layer_links(links):
+    """Save the links of harvested layers with a bulk insert
+
+    The existing links of the layers with the same names are replaced.
+    """
+    if not links:
+        return
+    Link.objects.filter(
+        resource__in=set(link.resource for link in links),
+        name__in=set(link.name for link in links)).delete()
+    Link.objects.bulk_create(links)
+
+
 def get_geoserver_cascading_workspace(create=True):
     """Return the geoserver workspace used for cascaded services
     The workspace can be created it if needed.
@@ -111,6 +212,7 @@ class ServiceHandlerBase(object):
     service_type = None
     name = ""
     indexing_method = None
+    has_thumbnails = False
 
     def __init__(self, url):
         self.url = url
@@ -155,6 +257,47 @@ class ServiceHandlerBase(object):
 
         raise NotImplementedError
 
+    def harvest_resources(self, resource_ids, geonode_service):
+        """Harvest several resources from the service
+
+        The layers are created one at a time, each one in its own
+        transaction, and their links with a single bulk insert. Thumbnails
+        are not created, see ``create_harvested_thumbnail``.
+
+        :arg resource_ids: The resources' identifiers
+        :type resource_ids: list
+        :arg geonode_service: The already saved service instance
+        :type geonode_service: geonode.services.models.Service
+        :returns: The new layer, or the raised exception, by resource id
+        """
+
+        results = {}
+        links = []
+        for resource_id in resource_ids:
+            try:
+                with transaction.atomic():
+                    geonode_layer = self._harvest_layer(resource_id, geonode_service)
+                results[resource_id] = geonode_layer
+                links.extend(self._get_layer_links(geonode_layer))
+            except Exception as e:
+                logger.exception(msg="An error has occurred while harvesting "
+                                     "resource {!r}".format(resource_id))
+                results[resource_id] = e
+        bulk_save_layer_links(links)
+        return results
+
+    def create_harvested_thumbnail(self, geonode_layer):
+        """Create the thumbnail of a layer saved by ``harvest_resources``."""
+        raise NotImplementedError
+
+    def _harvest_layer(self, resource_id, geonode_service):
+        """Create the layer of a resource, without links and thumbnail."""
+        raise NotImplementedError
+
+    def _get_layer_links(self, geonode_layer):
+        """Return the unsaved links of a harvested layer."""
+        return []
+
     def has_resources(self):
         raise NotImplementedError
 
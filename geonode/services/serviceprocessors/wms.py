@@ -48,6 +48,7 @@ from geonode.geoserver.helpers import set_attributes_from_geoserver
 from geonode.utils import http_client
 
 from owslib.map import wms111, wms130
+from owslib.map.common import WMSCapabilitiesReader
 from owslib.util import clean_ows_url
 
 from .. import enumerations
@@ -95,6 +96,11 @@ def WebMapService(url,
         version = clean_version
         clean_url = proxified_url
 
+    if xml is None and version in ['1.1.1', '1.3.0']:
+        xml = base.get_cached_capabilities(
+            WMSCapabilitiesReader(version).capabilities_url(clean_url),
+            timeout=timeout, headers=headers, username=username, password=password)
+
     if version in ['1.1.1']:
         return (base_ows_url, wms111.WebMapService_1_1_1(clean_url, version=version, xml=xml,
                                                          parse_remote_metadata=parse_remote_metadata,
@@ -115,6 +121,7 @@ class WmsServiceHandler(base.ServiceHandlerBase,
     """Remote service handler for OGC WMS services"""
 
     service_type = enumerations.WMS
+    has_thumbnails = True
 
     def __init__(self, url):
         self.proxy_base = urljoin(
@@ -151,14 +158,15 @@ class WmsServiceHandler(base.ServiceHandlerBase,
 
     @property
     def parsed_service(self):
-        cleaned_url, service, version, request = WmsServiceHandler.get_cleaned_url_params(self.url)
-        ogc_server_settings = settings.OGC_SERVER['default']
-        _url, _parsed_service = WebMapService(
-            cleaned_url,
-            version=version,
-            proxy_base=None,
-            timeout=ogc_server_settings.get('TIMEOUT', 60))
-        return _parsed_service
+        if self._parsed_service is None:
+            cleaned_url, service, version, request = WmsServiceHandler.get_cleaned_url_params(self.url)
+            ogc_server_settings = settings.OGC_SERVER['default']
+            _url, self._parsed_service = WebMapService(
+                cleaned_url,
+                version=version,
+                proxy_base=None,
+                timeout=ogc_server_settings.get('TIMEOUT', 60))
+        return self._parsed_service
 
     def create_cascaded_store(self):
         store = self._get_store(create=True)
@@ -218,6 +226,29 @@ class WmsServiceHandler(base.ServiceHandlerBase,
         :type geonode_service: geonode.services.models.Service
 
         """
+        resource_fields = self._get_harvestable_fields(resource_id)
+        try:
+            geonode_layer = self._create_layer(geonode_service, **resource_fields)
+            self._create_layer_service_link(geonode_layer)
+            self._create_layer_legend_link(geonode_layer)
+            self._create_layer_thumbnail(geonode_layer)
+        except Exception as e:
+            logger.error(e)
+
+    def _harvest_layer(self, resource_id, geonode_service):
+        resource_fields = self._get_harvestable_fields(resource_id)
+        return self._create_layer(geonode_service, **resource_fields)
+
+    def _get_layer_links(self, geonode_layer):
+        return [
+            self._get_layer_service_link(geonode_layer),
+            self._get_layer_legend_link(geonode_layer),
+        ]
+
+    def create_harvested_thumbnail(self, geonode_layer):
+        self._create_layer_thumbnail(geonode_layer)
+
+    def _get_harvestable_fields(self, resource_id):
         layer_meta = self.get_resource(resource_id)
         logger.debug("layer_meta: {}".format(layer_meta))
         if self.indexing_method == CASCADED:
@@ -243,13 +274,7 @@ class WmsServiceHandler(base.ServiceHandlerBase,
         if settings.RESOURCE_PUBLISHING or settings.ADMIN_MODERATE_UPLOADS:
             resource_fields["is_approved"] = False
             resource_fields["is_published"] = False
-        try:
-            geonode_layer = self._create_layer(geonode_service, **resource_fields)
-            self._create_layer_service_link(geonode_layer)
-            self._create_layer_legend_link(geonode_layer)
-            self._create_layer_thumbnail(geonode_layer)
-        except Exception as e:
-            logger.error(e)
+        return resource_fields
 
     def has_resources(self):
         return True if len(self.parsed_service.contents) > 0 else False
@@ -313,6 +338,21 @@ class WmsServiceHandler(base.ServiceHandlerBase,
         creating the legend by making a request directly to the original
         service.
         """
+        legend_link = self._get_layer_legend_link(geonode_layer)
+        Link.objects.get_or_create(
+            resource=legend_link.resource,
+            url=legend_link.url,
+            name=legend_link.name,
+            defaults={
+                "extension": legend_link.extension,
+                "name": legend_link.name,
+                "url": legend_link.url,
+                "mime": legend_link.mime,
+                "link_type": legend_link.link_type,
+            }
+        )
+
+    def _get_layer_legend_link(self, geonode_layer):
         _p_url = urlparse(self.url)
         _q_separator = "&" if _p_url.query else "?"
         params = {
@@ -330,35 +370,39 @@ class WmsServiceHandler(base.ServiceHandlerBase,
         legend_url = "{}{}{}".format(
             geonode_layer.remote_service.service_url, _q_separator, kvp)
         logger.debug("legend_url: {}".format(legend_url))
-        Link.objects.get_or_create(
+        return Link(
             resource=geonode_layer.resourcebase_ptr,
             url=legend_url,
             name='Legend',
-            defaults={
-                "extension": 'png',
-                "name": 'Legend',
-                "url": legend_url,
-                "mime": 'image/png',
-                "link_type": 'image',
-            }
+            extension='png',
+            mime='image/png',
+            link_type='image'
         )
 
     def _create_layer_service_link(self, geonode_layer):
-        ogc_wms_url = geonode_layer.ows_url
-        ogc_wms_name = 'OGC WMS: %s Service' % geonode_layer.store
-        ogc_wms_link_type = 'OGC:WMS'
+        service_link = self._get_layer_service_link(geonode_layer)
         Link.objects.update_or_create(
-            resource=geonode_layer.resourcebase_ptr,
-            name=ogc_wms_name,
-            link_type=ogc_wms_link_type,
+            resource=service_link.resource,
+            name=service_link.name,
+            link_type=service_link.link_type,
             defaults=dict(
-                extension='html',
-                url=ogc_wms_url,
-                mime='text/html',
-                link_type=ogc_wms_link_type
+                extension=service_link.extension,
+                url=service_link.url,
+                mime=service_link.mime,
+                link_type=service_link.link_type
             )
         )
 
+    def _get_layer_service_link(self, geonode_layer):
+        return Link(
+            resource=geonode_layer.resourcebase_ptr,
+            name='OGC WMS: %s Service' % geonode_layer.store,
+            extension='html',
+            url=geonode_layer.ows_url,
+            mime='text/html',
+            link_type='OGC:WMS'
+        )
+
     def _get_cascaded_layer_fields(self, geoserver_resource):
         name = geoserver_resource.name
         workspace = geoserver_resource.workspace.name if hasattr(geoserver_resource, 'workspace') else None
@@ -496,6 +540,7 @@ class GeoNodeServiceHandler(WmsServiceHandler):
             settings.SITEURL, reverse('proxy'))
         ogc_server_settings = settings.OGC_SERVER['default']
         url = self._probe_geonode_wms(url)
+        self._parsed_service = None
         self.url, _ = WebMapService(
             url,
             proxy_base=self.proxy_base,
@@ -516,30 +561,7 @@ class GeoNodeServiceHandler(WmsServiceHandler):
         :type geonode_service: geonode.services.models.Service
 
         """
-        layer_meta = self.get_resource(resource_id)
-        if self.indexing_method == CASCADED:
-            logger.debug("About to import cascaded layer...")
-            geoserver_resource = self._import_cascaded_resource(layer_meta)
-            resource_fields = self._get_cascaded_layer_fields(
-                geoserver_resource)
-            keywords = []
-        else:
-            resource_fields = self._get_indexed_layer_fields(layer_meta)
-            keywords = resource_fields.pop("keywords")
-        existance_test_qs = Layer.objects.filter(
-            name=resource_fields["name"],
-            store=resource_fields["store"],
-            workspace=resource_fields["workspace"]
-        )
-        if existance_test_qs.exists():
-            raise RuntimeError(
-                "Resource {!r} has already been harvested".format(resource_id))
-        resource_fields["keywords"] = keywords
-        resource_fields["is_approved"] = True
-        resource_fields["is_published"] = True
-        if settings.RESOURCE_PUBLISHING or settings.ADMIN_MODERATE_UPLOADS:
-            resource_fields["is_approved"] = False
-            resource_fields["is_published"] = False
+        resource_fields = self._get_harvestable_fields(resource_id)
         try:
             geonode_layer = self._create_layer(geonode_service, **resource_fields)
             self._enrich_layer_metadata(geonode_layer)
@@ -548,6 +570,14 @@ class GeoNodeServiceHandler(WmsServiceHandler):
         except Exception as e:
             logger.error(e)
 
+    def _harvest_layer(self, resource_id, geonode_service):
+        geonode_layer = super(GeoNodeServiceHandler, self)._harvest_layer(resource_id, geonode_service)
+        try:
+            self._enrich_layer_metadata(geonode_layer, thumbnail=False)
+        except Exception as e:
+            logger.error(e)
+        return geonode_layer
+
     def _probe_geonode_wms(self, raw_url):
         url = urlsplit(raw_url)
         base_url = '%s://%s/' % (url.scheme, url.netloc)
@@ -575,7 +605,8 @@ class GeoNodeServiceHandler(WmsServiceHandler):
         _url = "%s://%s/geoserver/ows" % (url.scheme, url.netloc)
         return _url
 
-    def _enrich_layer_metadata(self, geonode_layer):
+    def _get_remote_layer(self, geonode_layer):
+        """Return the record of the layer in the remote GeoNode API, if any"""
         workspace, layername = geonode_layer.name.split(
             ":") if ":" in geonode_layer.name else (None, geonode_layer.name)
         url = urlsplit(self.url)
@@ -594,70 +625,56 @@ class GeoNodeServiceHandler(WmsServiceHandler):
                     content = content.decode('UTF-8')
                 _json_obj = json.loads(content)
                 if _json_obj['meta']['total_count'] == 1:
-                    _layer = _json_obj['objects'][0]
-                    if _layer:
-                        r_fields = {}
-
-                        # Update plain fields
-                        for field in GeoNodeServiceHandler.LAYER_FIELDS:
-                            if field in _layer and _layer[field]:
-                                r_fields[field] = _layer[field]
-                        if r_fields:
-                            Layer.objects.filter(
-                                id=geonode_layer.id).update(
-                                **r_fields)
-                            geonode_layer.refresh_from_db()
-
-                        # Update Thumbnail
-                        if "thumbnail_url" in _layer and _layer["thumbnail_url"]:
-                            thumbnail_remote_url = _layer["thumbnail_url"]
-                            _url = urlsplit(thumbnail_remote_url)
-                            if not _url.scheme:
-                                thumbnail_remote_url = "{}{}".format(
-                                    geonode_layer.remote_service.service_url, _url.path)
-                            resp, image = http_client.request(
-                                thumbnail_remote_url)
-                            if 'ServiceException' in str(image) or \
-                               resp.status_code < 200 or resp.status_code > 299:
-                                msg = 'Unable to obtain thumbnail: %s' % image
-                                logger.debug(msg)
-
-                                # Replace error message with None.
-                                image = None
-
-                            if image is not None:
-                                thumbnail_name = 'layer-%s-thumb.png' % geonode_layer.uuid
-                                geonode_layer.save_thumbnail(
-                                    thumbnail_name, image=image)
-                            else:
-                                self._create_layer_thumbnail(geonode_layer)
-                        else:
-                            self._create_layer_thumbnail(geonode_layer)
-
-                        # Add Keywords
-                        if "keywords" in _layer and _layer["keywords"]:
-                            keywords = _layer["keywords"]
-                            if keywords:
-                                geonode_layer.keywords.clear()
-                                geonode_layer.keywords.add(*keywords)
-
-                        # Add Regions
-                        if "regions" in _layer and _layer["regions"]:
-                            (regions_resolved, regions_unresolved) = resolve_regions(
-                                _layer["regions"])
-                            if regions_resolved:
-                                geonode_layer.regions.clear()
-                                geonode_layer.regions.add(*regions_resolved)
-
-                        # Add Topic Category
-                        if "category__gn_description" in _layer and _layer["category__gn_description"]:
-                            try:
-                                categories = TopicCategory.objects.filter(
-                                    Q(gn_description__iexact=_layer["category__gn_description"]))
-                                if categories:
-                                    geonode_layer.category = categories[0]
-                            except Exception:
-                                traceback.print_exc()
+                    return _json_obj['objects'][0]
+            except Exception:
+                traceback.print_exc()
+        return None
+
+    def _enrich_layer_metadata(self, geonode_layer, thumbnail=True):
+        _layer = self._get_remote_layer(geonode_layer)
+        if _layer:
+            try:
+                r_fields = {}
+
+                # Update plain fields
+                for field in GeoNodeServiceHandler.LAYER_FIELDS:
+                    if field in _layer and _layer[field]:
+                        r_fields[field] = _layer[field]
+                if r_fields:
+                    Layer.objects.filter(
+                        id=geonode_layer.id).update(
+                        **r_fields)
+                    geonode_layer.refresh_from_db()
+
+                # Update Thumbnail
+                if thumbnail:
+                    self._create_remote_layer_thumbnail(
+                        geonode_layer, _layer.get("thumbnail_url"))
+
+                # Add Keywords
+                if "keywords" in _layer and _layer["keywords"]:
+                    keywords = _layer["keywords"]
+                    if keywords:
+                        geonode_layer.keywords.clear()
+                        geonode_layer.keywords.add(*keywords)
+
+                # Add Regions
+                if "regions" in _layer and _layer["regions"]:
+                    (regions_resolved, regions_unresolved) = resolve_regions(
+                        _layer["regions"])
+                    if regions_resolved:
+                        geonode_layer.regions.clear()
+                        geonode_layer.regions.add(*regions_resolved)
+
+                # Add Topic Category
+                if "category__gn_description" in _layer and _layer["category__gn_description"]:
+                    try:
+                        categories = TopicCategory.objects.filter(
+                            Q(gn_description__iexact=_layer["category__gn_description"]))
+                        if categories:
+                            geonode_layer.category = categories[0]
+                    except Exception:
+                        traceback.print_exc()
             except Exception:
                 traceback.print_exc()
             finally:
@@ -666,6 +683,36 @@ class GeoNodeServiceHandler(WmsServiceHandler):
                 except Exception as e:
                     logger.error(e)
 
+    def _create_remote_layer_thumbnail(self, geonode_layer, thumbnail_remote_url=None):
+        """Save the thumbnail of the remote layer, or create one with a WMS request."""
+        image = None
+        if thumbnail_remote_url:
+            _url = urlsplit(thumbnail_remote_url)
+            if not _url.scheme:
+                thumbnail_remote_url = "{}{}".format(
+                    geonode_layer.remote_service.service_url, _url.path)
+            resp, image = http_client.request(
+                thumbnail_remote_url)
+            if 'ServiceException' in str(image) or \
+               resp.status_code < 200 or resp.status_code > 299:
+                msg = 'Unable to obtain thumbnail: %s' % image
+                logger.debug(msg)
+
+                # Replace error message with None.
+                image = None
+
+        if image is not None:
+            thumbnail_name = 'layer-%s-thumb.png' % geonode_layer.uuid
+            geonode_layer.save_thumbnail(
+                thumbnail_name, image=image)
+        else:
+            self._create_layer_thumbnail(geonode_layer)
+
+    def create_harvested_thumbnail(self, geonode_layer):
+        _layer = self._get_remote_layer(geonode_layer)
+        self._create_remote_layer_thumbnail(
+            geonode_layer, _layer.get("thumbnail_url") if _layer else None)
+
 
 def _get_valid_name(proposed_name):
     """Return a unique slug name for a service"""
@@ -30,6 +30,7 @@ from ..layers.models import Layer
 
 from .models import Service
 from .models import HarvestJob
+from .utils import invalidate_services_hosts
 
 logger = logging.getLogger(__name__)
 
@@ -53,3 +54,10 @@ def remove_harvest_job(sender, **kwargs):
 def post_save_service(instance, sender, created, **kwargs):
     if created:
         instance.set_default_permissions()
+
+
+@receiver(signals.post_save, sender=Service)
+@receiver(signals.post_delete, sender=Service)
+def invalidate_services_hosts_cache(sender, **kwargs):
+    """Invalidate the cached set of remote services hosts used by the proxy."""
+    invalidate_services_hosts()
@@ -19,6 +19,7 @@
 #########################################################################
 """Celery tasks for geonode.services"""
 
+import time
 import logging
 
 from django.db import transaction
@@ -29,7 +30,7 @@ from .serviceprocessors import get_service_handler
 
 from geonode.celery_app import app
 from geonode.layers.models import Layer
-from geonode.catalogue.models import catalogue_post_save
+from geonode.catalogue.models import catalogue_post_save, refresh_catalogue_records
 
 logger = logging.getLogger(__name__)
 
@@ -71,3 +72,88 @@ def harvest_resource(self, harvest_job_id):
             status=enumerations.PROCESSED if result else enumerations.FAILED,
             details=details
         )
+
+
+@app.task(bind=True,
+          name='geonode.services.tasks.update.harvest_resources',
+          queue='update',)
+def harvest_resources(self, harvest_job_ids):
+    """Harvest a chunk of resources of the same service
+
+    The layers links are saved in bulk, the thumbnails are created later on
+    the ``cleanup`` queue and the throughput of the chunk is reported in the
+    details of its harvest jobs.
+    """
+    harvest_jobs = list(models.HarvestJob.objects.filter(
+        pk__in=harvest_job_ids).select_related('service'))
+    if not harvest_jobs:
+        return
+    service = harvest_jobs[0].service
+    models.HarvestJob.objects.filter(pk__in=harvest_job_ids).update(
+        status=enumerations.IN_PROCESS, details="Harvesting resource...")
+    started = time.time()
+    handler = None
+    try:
+        handler = get_service_handler(
+            base_url=service.base_url,
+            proxy_base=service.proxy_base,
+            service_type=service.type
+        )
+        results = handler.harvest_resources(
+            [harvest_job.resource_id for harvest_job in harvest_jobs], service)
+    except Exception as err:
+        logger.exception(msg="An error has occurred while harvesting "
+                             "the resources of service {!r}".format(service.base_url))
+        results = {harvest_job.resource_id: err for harvest_job in harvest_jobs}
+    elapsed = time.time() - started
+
+    layer_ids = [layer.id for layer in results.values() if isinstance(layer, Layer)]
+    details = "Harvested {} of {} resources in {:.2f} seconds ({:.2f} resources/s)".format(
+        len(layer_ids), len(harvest_jobs), elapsed, len(layer_ids) / elapsed if elapsed else 0)
+    logger.debug(details)
+    for harvest_job in harvest_jobs:
+        result = results.get(harvest_job.resource_id)
+        if isinstance(result, Layer):
+            harvest_job.status = enumerations.PROCESSED
+            harvest_job.details = details
+        else:
+            harvest_job.status = enumerations.FAILED
+            harvest_job.details = str(result)  # TODO: pass more context about the error
+    models.HarvestJob.objects.bulk_update(harvest_jobs, ['status', 'details'])
+
+    if layer_ids:
+        logger.debug("Updating Layers Metadata ...")
+        try:
+            refresh_catalogue_records(Layer.objects.filter(id__in=layer_ids))
+        except Exception:
+            logger.exception(msg="Remote Layers {} couldn't be updated".format(layer_ids))
+        if handler.has_thumbnails:
+            create_harvested_thumbnails.apply_async((service.id, layer_ids))
+
+
+@app.task(bind=True,
+          name='geonode.services.tasks.cleanup.create_harvested_thumbnails',
+          queue='cleanup',)
+def create_harvested_thumbnails(self, service_id, layer_ids):
+    """Create the thumbnails of the layers harvested by harvest_resources"""
+    service = models.Service.objects.get(pk=service_id)
+    handler = get_service_handler(
+        base_url=service.base_url,
+        proxy_base=service.proxy_base,
+        service_type=service.type
+    )
+    for layer in Layer.objects.filter(id__in=layer_ids).select_related('remote_service'):
+        try:
+            handler.create_harvested_thumbnail(layer)
+        except Exception:
+            logger.exception(msg="Could not create the thumbnail of layer {!r}".format(layer.alternate))
+
+
+@app.task(bind=True,
+          name='geonode.services.tasks.cleanup.probe_services',
+          queue='cleanup',
+          expires=600)
+def probe_services(self):
+    """Store the health of the remote services, see utils.probe_services"""
+    from .utils import probe_services
+    probe_services()
@@ -99,6 +99,35 @@ class ModuleFunctionsTestCase(StandardTestCase):
             "http://www.geonode.org/{}".format(mock_settings.CASCADE_WORKSPACE)
         )
 
+    @mock.patch("geonode.services.serviceprocessors.base.time")
+    @mock.patch("geonode.services.serviceprocessors.base.requests.get")
+    @mock.patch("geonode.services.serviceprocessors.base.settings",
+                autospec=True)
+    def test_get_cached_capabilities(self, mock_settings, mock_get, mock_time):
+        mock_settings.SERVICES_CAPABILITIES_CACHE = "resources"
+        mock_settings.SERVICES_CAPABILITIES_CACHE_TTL = 300
+        mock_settings.SERVICES_CAPABILITIES_CACHE_TIMEOUT = 3600
+        phony_url = "http://fake/wms?SERVICE=WMS&request=GetCapabilities"
+        base.invalidate_cached_capabilities(phony_url)
+        mock_time.time.return_value = 1000
+        mock_get.return_value = mock.MagicMock(
+            status_code=200, content=b"<WMS_Capabilities/>", headers={"ETag": "phony"})
+
+        # fetched once, for the same URL modulo the host and parameters case
+        for url in (phony_url, "http://FAKE/wms?request=GetCapabilities&service=WMS"):
+            self.assertEqual(base.get_cached_capabilities(url), b"<WMS_Capabilities/>")
+        self.assertEqual(mock_get.call_count, 1)
+
+        # revalidated once expired
+        mock_time.time.return_value = 1000 + 301
+        mock_get.return_value = mock.MagicMock(status_code=304, content=b"", headers={})
+        self.assertEqual(base.get_cached_capabilities(phony_url), b"<WMS_Capabilities/>")
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(mock_get.call_args[1]["headers"]["If-None-Match"], "phony")
+        self.assertEqual(base.get_cached_capabilities(phony_url), b"<WMS_Capabilities/>")
+        self.assertEqual(mock_get.call_count, 2)
+        base.invalidate_cached_capabilities(phony_url)
+
     @mock.patch("geonode.services.serviceprocessors.handler.WmsServiceHandler",
                 autospec=True)
     def test_get_service_handler_wms(self, mock_wms_handler):
@@ -482,6 +511,15 @@ class WmsServiceHandlerTestCase(GeoNodeBaseTestSupport):
         self.assertEqual(result.name, handler.name)
         self.assertEqual(result.title, self.phony_title)
 
+    @mock.patch("geonode.services.serviceprocessors.wms.WebMapService",
+                autospec=True)
+    def test_parses_service_once(self, mock_wms):
+        mock_wms.return_value = (self.phony_url, self.parsed_wms)
+        handler = wms.WmsServiceHandler(self.phony_url)
+        handler.create_geonode_service(self.test_user)
+        handler.get_resource(self.phony_layer_name)
+        self.assertEqual(mock_wms.call_count, 1)
+
     @mock.patch("geonode.services.serviceprocessors.wms.WebMapService",
                 autospec=True)
     def test_get_keywords(self, mock_wms):
@@ -548,6 +586,56 @@ class WmsServiceHandlerTestCase(GeoNodeBaseTestSupport):
             password=mock_catalog.password
         )
 
+    @mock.patch("geonode.services.serviceprocessors.base.bulk_save_layer_links",
+                autospec=True)
+    @mock.patch("geonode.services.serviceprocessors.wms.WebMapService",
+                autospec=True)
+    def test_harvest_resources_in_bulk(self, mock_wms, mock_bulk_save_layer_links):
+        mock_wms.return_value = (self.phony_url, self.parsed_wms)
+        handler = wms.WmsServiceHandler(self.phony_url)
+        phony_layer = mock.MagicMock()
+        phony_error = RuntimeError("Resource 'second' has already been harvested")
+        with mock.patch.object(handler, "_harvest_layer", side_effect=[phony_layer, phony_error]), \
+                mock.patch.object(handler, "_get_layer_links", return_value=["link"]):
+            result = handler.harvest_resources(["first", "second"], None)
+        self.assertEqual(result, {"first": phony_layer, "second": phony_error})
+        mock_bulk_save_layer_links.assert_called_once_with(["link"])
+
+    @mock.patch("geonode.services.utils._probe_url", autospec=True)
+    def test_probe_services(self, mock_probe_url):
+        from geonode.services.utils import probe_services
+        online = Service.objects.create(
+            owner=self.test_user, title="online", base_url="http://online/wms", name="online",
+            type=enumerations.WMS)
+        offline = Service.objects.create(
+            owner=self.test_user, title="offline", base_url="http://offline/wms", name="offline",
+            type=enumerations.WMS)
+        secured = Service.objects.create(
+            owner=self.test_user, title="secured", base_url="http://secured/wms", name="secured",
+            type=enumerations.WMS, username="user", password="secret")
+        self.assertEqual(online.probe, 200)
+        answers = {"online": (200, 0.1), "offline": (None, None), "secured": (401, 0.2)}
+        mock_probe_url.side_effect = lambda base_url, *args, **kwargs: answers[base_url.split("/")[2]]
+
+        for retries in (1, 2):
+            self.assertEqual(probe_services(), {online.id: 200, offline.id: None, secured.id: 401})
+            online.refresh_from_db()
+            offline.refresh_from_db()
+            self.assertEqual(online.probe, 200)
+            self.assertEqual(online.probe_latency, 0.1)
+            self.assertIsNone(online.noanswer_retries)
+            self.assertIsNone(offline.probe_status)
+            self.assertIsNone(offline.probe)
+            self.assertIsNotNone(offline.first_noanswer)
+            self.assertEqual(offline.noanswer_retries, retries)
+            # an HTTP error is an answer
+            secured.refresh_from_db()
+            self.assertEqual(secured.probe, 401)
+            self.assertIsNone(secured.noanswer_retries)
+        self.assertIsNotNone(offline.last_probed)
+        mock_probe_url.assert_any_call("http://secured/wms", enumerations.WMS, None, mock.ANY,
+                                       username="user", password="secret")
+
     def test_local_user_cant_delete_service(self):
         self.client.logout()
         response = self.client.get(reverse('register_service'))
@@ -19,10 +19,108 @@
 
 import re
 import math
+import time
 import logging
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils.timezone import now
 
 logger = logging.getLogger(__name__)
 
+SERVICES_HOSTS_CACHE_KEY = 'services_allowed_hosts'
+
+
+def get_services_hosts():
+    """
+    Returns the set of hostnames of the registered remote services.
+
+    The set is kept in the Django cache, so that it can be shared across workers,
+    and invalidated by the Service post_save/post_delete signal handlers.
+    """
+    hosts = cache.get(SERVICES_HOSTS_CACHE_KEY)
+    if hosts is None:
+        from .models import Service
+        hosts = set()
+        for _base_url in Service.objects.values_list('base_url', flat=True).distinct():
+            _remote_host = urlsplit(_base_url).hostname if _base_url else None
+            if _remote_host:
+                hosts.add(_remote_host)
+        hosts = frozenset(hosts)
+        cache.set(SERVICES_HOSTS_CACHE_KEY, hosts, None)
+    return hosts
+
+
+def invalidate_services_hosts():
+    cache.delete(SERVICES_HOSTS_CACHE_KEY)
+
+
+def _probe_url(base_url, service_type, version=None, timeout=5, username=None, password=None):
+    """
+    Returns the status code and the latency, in seconds, of the remote
+    service, or None values if it could not be reached. Only the headers of
+    the response are read.
+    """
+    from . import enumerations
+    if service_type in (enumerations.WMS, enumerations.GN_WMS):
+        params = {'service': 'WMS', 'request': 'GetCapabilities', 'version': version or '1.3.0'}
+    elif service_type in (enumerations.REST_MAP, enumerations.REST_IMG):
+        params = {'f': 'json'}
+    else:
+        params = {}
+    started = time.time()
+    try:
+        with requests.get(base_url, params=params, timeout=timeout, stream=True,
+                          auth=(username, password) if username else None) as response:
+            return response.status_code, time.time() - started
+    except requests.exceptions.RequestException as e:
+        logger.debug("Remote service {} is not reachable: {}".format(base_url, e))
+        return None, None
+
+
+def probe_services(services=None, workers=None, timeout=None):
+    """
+    Probes the remote services concurrently, with a pool of workers threads,
+    and stores their status, latency and probe time.
+    Services which cannot be reached get a NULL status and are tracked by
+    first_noanswer and noanswer_retries, any HTTP answer, even an error,
+    resets them.
+    Returns the status code, or None if there was no answer, by service id.
+    """
+    from .models import Service
+    workers = workers or getattr(settings, 'SERVICES_PROBE_WORKERS', 8)
+    timeout = timeout or getattr(settings, 'SERVICES_PROBE_TIMEOUT', 5)
+    services = services if services is not None else Service.objects.all()
+    services = list(services.values_list('id', 'base_url', 'type', 'version', 'username', 'password'))
+    if not services:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(services))) as executor:
+        results = executor.map(
+            lambda service: (service[0], ) + _probe_url(
+                service[1], service[2], service[3], timeout, username=service[4], password=service[5]),
+            services)
+        results = list(results)
+
+    statuses = {}
+    probed = now()
+    for service_id, status, latency in results:
+        q = Service.objects.filter(id=service_id)
+        if status is not None:
+            q.update(probe_status=status, probe_latency=latency, last_probed=probed,
+                     first_noanswer=None, noanswer_retries=None)
+        else:
+            q.filter(first_noanswer__isnull=True).update(first_noanswer=probed, noanswer_retries=0)
+            q.update(probe_status=status, probe_latency=latency, last_probed=probed,
+                     noanswer_retries=F('noanswer_retries') + 1)
+        statuses[service_id] = status
+    return statuses
+
 
 def flip_coordinates(c1, c2):
     if c1 > c2:
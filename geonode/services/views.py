@@ -177,19 +177,25 @@ def harvest_resources(request, service_id):
         requested.extend(request.GET.getlist("resource_list"))
         # Let's remove duplicates
         requested = list(set(requested))
-        resources_to_harvest = []
-        for id in _gen_harvestable_ids(requested, available_resources):
-            logger.debug("id: {}".format(id))
-            harvest_job, created = HarvestJob.objects.get_or_create(
-                service=service,
-                resource_id=id
-            )
-            if created or harvest_job.status != enumerations.PROCESSED:
-                resources_to_harvest.append(id)
-                tasks.harvest_resource.apply_async((harvest_job.id,))
+        harvestable_ids = list(_gen_harvestable_ids(requested, available_resources))
+        logger.debug("ids: {}".format(harvestable_ids))
+        existing_ids = HarvestJob.objects.filter(
+            service=service, resource_id__in=harvestable_ids).values_list('resource_id', flat=True)
+        HarvestJob.objects.bulk_create([
+            HarvestJob(service=service, resource_id=id)
+            for id in set(harvestable_ids) - set(existing_ids)])
+        harvest_jobs = HarvestJob.objects.filter(
+            service=service, resource_id__in=harvestable_ids).order_by('id')
+        harvest_job_ids = []
+        for harvest_job in harvest_jobs:
+            if harvest_job.status != enumerations.PROCESSED:
+                harvest_job_ids.append(harvest_job.id)
             else:
                 logger.warning(
-                    "resource {} already has a harvest job".format(id))
+                    "resource {} already has a harvest job".format(harvest_job.resource_id))
+        chunk_size = getattr(settings, "SERVICES_HARVEST_CHUNK_SIZE", 50)
+        for i in range(0, len(harvest_job_ids), chunk_size):
+            tasks.harvest_resources.apply_async((harvest_job_ids[i:i + chunk_size],))
         msg_async = _("The selected resources are being imported")
         msg_sync = _("The selected resources have been imported")
         messages.add_message(
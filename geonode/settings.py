@@ -927,6 +927,8 @@ OGC_SERVER = {
         'BACKOFF_FACTOR': float(os.getenv('OGC_REQUEST_BACKOFF_FACTOR', '0.3')),
         'POOL_MAXSIZE': int(os.getenv('OGC_REQUEST_POOL_MAXSIZE', '10')),
         'POOL_CONNECTIONS': int(os.getenv('OGC_REQUEST_POOL_CONNECTIONS', '10')),
+        # Max concurrent requests per remote host, e.g. {'geoserver:8080': 20}
+        'POOL_HOST_LIMITS': ast.literal_eval(os.getenv('OGC_REQUEST_POOL_HOST_LIMITS', '{}')),
     }
 }
 
@@ -1159,6 +1161,9 @@ except ValueError:
 # The proxy to use when making cross origin requests.
 PROXY_URL = os.environ.get('PROXY_URL', '/proxy/?url=')
 
+# Stream proxied GET responses back to the client instead of buffering them in memory.
+PROXY_STREAMING_ENABLED = ast.literal_eval(os.getenv('PROXY_STREAMING_ENABLED', 'False'))
+
 # Haystack Search Backend Configuration. To enable,
 # first install the following:
 # - pip install django-haystack
@@ -1180,8 +1185,16 @@ if HAYSTACK_SEARCH:
             'INDEX_NAME': os.getenv('HAYSTACK_ENGINE_INDEX_NAME', 'haystack'),
         },
     }
-    HAYSTACK_SIGNAL_PROCESSOR = 'haystack.signals.RealtimeSignalProcessor'
+    # Index updates are queued per object and flushed in batches after commit
+    HAYSTACK_SIGNAL_PROCESSOR = os.getenv(
+        'HAYSTACK_SIGNAL_PROCESSOR', 'geonode.base.search_index.QueuedSignalProcessor')
     HAYSTACK_SEARCH_RESULTS_PER_PAGE = int(os.getenv('HAYSTACK_SEARCH_RESULTS_PER_PAGE', '200'))
+    HAYSTACK_QUEUE_BATCH_SIZE = int(os.getenv('HAYSTACK_QUEUE_BATCH_SIZE', '100'))
+    # Flush the queued updates on the Celery 'update' queue, at most once every HAYSTACK_QUEUE_DEBOUNCE seconds
+    HAYSTACK_QUEUE_CELERY = ast.literal_eval(os.getenv('HAYSTACK_QUEUE_CELERY', 'False'))
+    HAYSTACK_QUEUE_DEBOUNCE = int(os.getenv('HAYSTACK_QUEUE_DEBOUNCE', '5'))
+    # Updates failing HAYSTACK_QUEUE_MAX_RETRIES times are parked until the object is saved again
+    HAYSTACK_QUEUE_MAX_RETRIES = int(os.getenv('HAYSTACK_QUEUE_MAX_RETRIES', '3'))
 
 # Available download formats
 DOWNLOAD_FORMATS_METADATA = [
@@ -1253,6 +1266,14 @@ API_LIMIT_PER_PAGE = int(os.getenv('API_LIMIT_PER_PAGE', '200'))
 API_INCLUDE_REGIONS_COUNT = ast.literal_eval(
     os.getenv('API_INCLUDE_REGIONS_COUNT', 'False'))
 
+# Serve the facet counts of public resources from an incrementally maintained table.
+# Run "python manage.py rebuild_facet_counts" once after enabling it.
+MATERIALIZED_FACET_COUNTS = ast.literal_eval(
+    os.getenv('MATERIALIZED_FACET_COUNTS', 'False'))
+# Seconds between two full rebuilds of the facet counts, catching the writes
+# bypassing the signals (e.g. queryset updates); 0 disables them
+FACET_COUNTS_REBUILD_INTERVAL = int(os.getenv('FACET_COUNTS_REBUILD_INTERVAL', 86400))
+
 # Settings for EXIF plugin
 EXIF_ENABLED = ast.literal_eval(os.getenv('EXIF_ENABLED', 'True'))
 
@@ -1534,6 +1555,22 @@ if GEONODE_CLIENT_LAYER_PREVIEW_LIBRARY == 'mapstore':
 
 SERVICE_UPDATE_INTERVAL = 0
 
+# Cache of the remote services capabilities documents. Use a backend shared by
+# the web and Celery workers (memcached, file based, database...) to download
+# the capabilities of a service once per harvesting.
+SERVICES_CAPABILITIES_CACHE = os.getenv('SERVICES_CAPABILITIES_CACHE', 'default')
+# Seconds a cached capabilities document is used before being revalidated
+SERVICES_CAPABILITIES_CACHE_TTL = int(os.getenv('SERVICES_CAPABILITIES_CACHE_TTL', 300))
+# Seconds a cached capabilities document is kept for revalidation
+SERVICES_CAPABILITIES_CACHE_TIMEOUT = int(os.getenv('SERVICES_CAPABILITIES_CACHE_TIMEOUT', 86400))
+# Number of remote resources harvested by each Celery task
+SERVICES_HARVEST_CHUNK_SIZE = int(os.getenv('SERVICES_HARVEST_CHUNK_SIZE', 50))
+# Seconds between two health probes of the remote services, 0 disables them
+SERVICES_PROBE_INTERVAL = int(os.getenv('SERVICES_PROBE_INTERVAL', 300))
+# Number of remote services probed concurrently and seconds to wait for each
+SERVICES_PROBE_WORKERS = int(os.getenv('SERVICES_PROBE_WORKERS', 8))
+SERVICES_PROBE_TIMEOUT = int(os.getenv('SERVICES_PROBE_TIMEOUT', 5))
+
 SEARCH_FILTERS = {
     'TEXT_ENABLED': True,
     'TYPE_ENABLED': True,
@@ -1737,7 +1774,21 @@ if USE_GEOSERVER:
 #     },
 CELERY_BEAT_SCHEDULE = {}
 
+if MATERIALIZED_FACET_COUNTS and FACET_COUNTS_REBUILD_INTERVAL:
+    CELERY_BEAT_SCHEDULE['rebuild_facet_counts'] = {
+        'task': 'geonode.base.tasks.rebuild_facet_counts',
+        'schedule': float(FACET_COUNTS_REBUILD_INTERVAL),
+    }
+
+if SERVICES_PROBE_INTERVAL:
+    CELERY_BEAT_SCHEDULE['probe_services'] = {
+        'task': 'geonode.services.tasks.cleanup.probe_services',
+        'schedule': float(SERVICES_PROBE_INTERVAL),
+    }
+
 DELAYED_SECURITY_SIGNALS = ast.literal_eval(os.environ.get('DELAYED_SECURITY_SIGNALS', 'False'))
+# number of threads reconciling the GeoFence rules of the dirty layers
+SECURITY_SYNC_WORKERS = int(os.environ.get('SECURITY_SYNC_WORKERS', 1))
 CELERY_ENABLE_UTC = ast.literal_eval(os.environ.get('CELERY_ENABLE_UTC', 'True'))
 CELERY_TIMEZONE = TIME_ZONE
 
@@ -1949,6 +2000,14 @@ MONITORING_SERVICE_NAME = os.getenv("MONITORING_SERVICE_NAME", 'geonode')
 # how long monitoring data should be stored
 MONITORING_DATA_TTL = timedelta(days=int(os.getenv("MONITORING_DATA_TTL", 365)))
 
+# store monitored requests from a background writer with batched inserts
+MONITORING_ASYNC_INGEST = ast.literal_eval(os.environ.get('MONITORING_ASYNC_INGEST', 'False'))
+MONITORING_INGEST_QUEUE_SIZE = int(os.environ.get('MONITORING_INGEST_QUEUE_SIZE', 10000))
+MONITORING_INGEST_BATCH_SIZE = int(os.environ.get('MONITORING_INGEST_BATCH_SIZE', 500))
+MONITORING_INGEST_FLUSH_INTERVAL = float(os.environ.get('MONITORING_INGEST_FLUSH_INTERVAL', 5.0))
+# seconds a request waits for room in a full queue before being dropped
+MONITORING_INGEST_PUT_TIMEOUT = float(os.environ.get('MONITORING_INGEST_PUT_TIMEOUT', 0.05))
+
 # this will disable csrf check for notification config views,
 # use with caution - for dev purpose only
 MONITORING_DISABLE_CSRF = ast.literal_eval(os.environ.get('MONITORING_DISABLE_CSRF', 'False'))
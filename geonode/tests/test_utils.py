@@ -9,7 +9,7 @@ from unittest.mock import patch
 
 from geonode.br.management.commands.utils.utils import ignore_time
 from geonode.tests.base import GeoNodeBaseTestSupport
-from geonode.utils import copy_tree, fixup_shp_columnnames, unzip_file
+from geonode.utils import copy_tree, fixup_shp_columnnames, unzip_file, HttpSessionPool
 
 
 class TestCopyTree(GeoNodeBaseTestSupport):
@@ -109,3 +109,70 @@ class TestFixupShp(GeoNodeBaseTestSupport):
         shp_parent = os.path.dirname(layer_shp)
         if shp_parent.startswith(tempfile.gettempdir()):
             shutil.rmtree(shp_parent)
+
+
+class TestHttpSessionPool(GeoNodeBaseTestSupport):
+    def test_sessions_are_reused_per_host(self):
+        pool = HttpSessionPool()
+        session_a, _ = pool.get_session('http://localhost:8080/geoserver/ows', 3)
+        session_b, _ = pool.get_session('http://LOCALHOST:8080/geoserver/rest', 3)
+        session_c, _ = pool.get_session('https://localhost:8080/geoserver/ows', 3)
+        self.assertIs(session_a, session_b)
+        self.assertIsNot(session_a, session_c)
+        stats = pool.stats()
+        self.assertEqual(stats['sessions'], 2)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['waits'], 0)
+
+    def test_per_host_limits(self):
+        pool = HttpSessionPool(pool_maxsize=4, host_limits={'localhost': 1})
+        _, semaphore = pool.get_session('http://localhost:8080/geoserver/ows', 3)
+        pool.acquire(semaphore)
+        self.assertFalse(semaphore.acquire(blocking=False))
+        semaphore.release()
+        _, semaphore = pool.get_session('http://example.org/ows', 3)
+        for _ in range(4):
+            pool.acquire(semaphore)
+        self.assertFalse(semaphore.acquire(blocking=False))
+
+    def test_streamed_responses_hold_the_host_slot(self):
+        import io
+        import requests
+        pool = HttpSessionPool(host_limits={'localhost': 1})
+        _, semaphore = pool.get_session('http://localhost:8080/geoserver/ows', 3)
+        pool.acquire(semaphore)
+        response = requests.Response()
+        response.raw = io.BytesIO(b'')
+        pool.release_on_close(response, semaphore)
+        self.assertFalse(semaphore.acquire(blocking=False))
+        with response:
+            pass
+        self.assertTrue(semaphore.acquire(blocking=False))
+        semaphore.release()
+        # closing twice, or collecting a closed response, releases once
+        response.close()
+        del response
+        self.assertTrue(semaphore.acquire(blocking=False))
+        self.assertFalse(semaphore.acquire(blocking=False))
+
+        # responses never closed release the slot once collected
+        response = requests.Response()
+        semaphore.release()
+        pool.acquire(semaphore)
+        pool.release_on_close(response, semaphore)
+        del response
+        self.assertTrue(semaphore.acquire(blocking=False))
+
+    def test_host_slot_wait_times_out(self):
+        import requests
+        pool = HttpSessionPool(host_limits={'localhost': 1})
+        _, semaphore = pool.get_session('http://localhost:8080/geoserver/ows', 3)
+        pool.acquire(semaphore)
+        with self.assertRaises(requests.exceptions.Timeout):
+            pool.acquire(semaphore, timeout=0.1)
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_cookies_are_not_shared(self):
+        pool = HttpSessionPool()
+        session, _ = pool.get_session('http://localhost:8080/geoserver/ows', 3)
+        self.assertEqual(session.cookies.get_policy().allowed_domains(), [])
@@ -0,0 +1,20 @@
+# Generated by Django 2.2.15 on 2020-09-30 08:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload', '0026_auto_20200321_1349'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSequence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
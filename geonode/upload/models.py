@@ -26,7 +26,7 @@ import logging
 from os import path
 
 from django.urls import reverse
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils.timezone import now
 
@@ -56,6 +56,34 @@ class UploadManager(models.Manager):
             state=Upload.STATE_INVALID)
 
 
+class UploadSequence(models.Model):
+    """
+    Single row counter allocating the ids of the Importer sessions, so that
+    a new upload does not need to list all the sessions kept by GeoServer.
+    """
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def next_import_id(cls):
+        with transaction.atomic():
+            sequence, _ = cls.objects.select_for_update().get_or_create(
+                id=1,
+                defaults={'value': Upload.objects.aggregate(
+                    models.Max('import_id'))['import_id__max'] or 0})
+            sequence.value += 1
+            sequence.save(update_fields=['value'])
+        return sequence.value
+
+    @classmethod
+    def reconcile(cls, import_id):
+        """Moves the counter past an id already taken on the Importer"""
+        with transaction.atomic():
+            sequence, _ = cls.objects.select_for_update().get_or_create(id=1)
+            if sequence.value < import_id:
+                sequence.value = import_id
+                sequence.save(update_fields=['value'])
+
+
 class Upload(models.Model):
     objects = UploadManager()
 
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright (C) 2020 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+"""unit tests for geonode.upload.upload module"""
+
+import time
+
+from unittest.mock import patch, MagicMock
+
+from geonode.tests.base import GeoNodeBaseTestSupport
+
+from geonode.upload import upload
+from geonode.upload.models import Upload, UploadSequence
+
+
+class UploadIdsTestCase(GeoNodeBaseTestSupport):
+
+    def _importer(self, sessions):
+        importer = MagicMock()
+        importer.get_sessions.return_value = [MagicMock(id=_id) for _id in range(1, sessions + 1)]
+        return importer
+
+    def test_next_id(self):
+        Upload.objects.create(import_id=42, state=Upload.STATE_INVALID)
+        importer = self._importer(10)
+        with patch.object(upload, 'gs_uploader', importer):
+            self.assertEqual(upload._get_next_id(), 43)
+            self.assertEqual(upload._get_next_id(), 44)
+        # the Importer sessions are listed only to seed the sequence
+        self.assertEqual(importer.get_sessions.call_count, 1)
+
+    def test_next_id_reconcile(self):
+        importer = self._importer(100)
+        with patch.object(upload, 'gs_uploader', importer):
+            self.assertEqual(upload._get_next_id(), 101)
+            # the Importer assigned another id to the session
+            upload._reconcile_next_id(150)
+            self.assertEqual(upload._get_next_id(), 151)
+            # ids are never moved backwards
+            upload._reconcile_next_id(120)
+            self.assertEqual(upload._get_next_id(), 152)
+        self.assertEqual(UploadSequence.objects.count(), 1)
+
+    def test_next_id_benchmark(self):
+        importer = self._importer(50000)
+        allocations = 500
+        with patch.object(upload, 'gs_uploader', importer):
+            start = time.time()
+            ids = [upload._get_next_id() for _ in range(allocations)]
+            elapsed = time.time() - start
+        self.assertEqual(ids, list(range(50001, 50001 + allocations)))
+        self.assertEqual(importer.get_sessions.call_count, 1)
+        # one sequence update per id, not a listing of the Importer sessions
+        self.assertLess(elapsed, 30)
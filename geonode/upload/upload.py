@@ -54,7 +54,7 @@ from gsimporter import BadRequest
 
 from geonode import GeoNodeException
 from geonode.upload import UploadException, LayerNotReady
-from geonode.base.models import SpatialRepresentationType, TopicCategory
+from geonode.base.models import SpatialRepresentationType, TopicCategory, get_ll_bbox_envelope
 from ..people.utils import get_default_user
 from ..layers.models import Layer, UploadSession
 from ..layers.metadata import set_metadata
@@ -65,7 +65,7 @@ from ..geoserver.helpers import (set_time_info,
                                  gs_uploader)
 from . import signals
 from . import utils
-from .models import Upload
+from .models import Upload, UploadSequence
 from .upload_preprocessing import preprocess_files
 
 logger = logging.getLogger(__name__)
@@ -222,15 +222,25 @@ def upload(
 def _get_next_id():
     # importer tracks ids by autoincrement but is prone to corruption
     # which potentially may reset the id - hopefully prevent this...
-    upload_next_id = list(Upload.objects.all().aggregate(
-        Max('import_id')).values())[0]
-    upload_next_id = upload_next_id if upload_next_id else 0
-    # next_id = next_id + 1 if next_id else 1
-    importer_sessions = gs_uploader.get_sessions()
-    last_importer_session = importer_sessions[len(
-        importer_sessions) - 1].id if importer_sessions else 0
-    next_id = max(int(last_importer_session), int(upload_next_id)) + 1
-    return next_id
+    if not UploadSequence.objects.exists():
+        _reconcile_next_id()
+    return UploadSequence.next_import_id()
+
+
+def _reconcile_next_id(import_id=None):
+    """
+    Moves the upload ids sequence past import_id or, if not provided, past
+    the last session kept by the Importer.
+    """
+    if import_id is None:
+        upload_next_id = list(Upload.objects.all().aggregate(
+            Max('import_id')).values())[0]
+        upload_next_id = upload_next_id if upload_next_id else 0
+        importer_sessions = gs_uploader.get_sessions()
+        last_importer_session = importer_sessions[len(
+            importer_sessions) - 1].id if importer_sessions else 0
+        import_id = max(int(last_importer_session), int(upload_next_id))
+    UploadSequence.reconcile(int(import_id))
 
 
 def _check_geoserver_store(store_name, layer_type, overwrite):
@@ -303,7 +313,7 @@ def save_step(user, layer, spatial_files, overwrite=True, mosaic=False,
     logger.debug('Uploading {}'.format(the_layer_type))
     error_msg = None
     try:
-        next_id = _get_next_id()
+        next_id = allocated_id = _get_next_id()
         # Truncate name to maximum length defined by the field.
         max_length = Upload._meta.get_field('name').max_length
         name = name[:max_length]
@@ -366,6 +376,9 @@ def save_step(user, layer, spatial_files, overwrite=True, mosaic=False,
                 target_store=None,
                 charset_encoding=charset_encoding
             )
+        if import_session and import_session.id != allocated_id:
+            # the id was already taken, or assigned, on the Importer side
+            _reconcile_next_id(import_session.id)
         upload.import_id = import_session.id
         upload.save()
 
@@ -883,6 +896,11 @@ def final_step(upload_session, user, charset="UTF-8"):
             else:
                 defaults[key] = value
 
+        # update() skips save(), keep the envelope used by the extent filters in sync
+        defaults.update(get_ll_bbox_envelope(
+            *[defaults.get(_k, getattr(saved_layer, _k)) for _k in ('bbox_x0', 'bbox_x1', 'bbox_y0', 'bbox_y1')],
+            srid=defaults.get('srid', saved_layer.srid)))
+
         # update with new information
         db_layer = Layer.objects.filter(id=saved_layer.id)
         db_layer.update(**defaults)
@@ -33,7 +33,9 @@ import logging
 import tarfile
 import datetime
 import requests
+import weakref
 import tempfile
+import threading
 import traceback
 import subprocess
 
@@ -42,6 +44,7 @@ from io import StringIO
 from decimal import Decimal
 from slugify import slugify
 from contextlib import closing
+from http.cookiejar import DefaultCookiePolicy
 from collections import defaultdict
 from math import atan, exp, log, pi, sin, tan, floor
 from zipfile import ZipFile, is_zipfile, ZIP_DEFLATED
@@ -1395,6 +1398,155 @@ def check_ogc_backend(backend_package):
     return False
 
 
+class HttpSessionPool(object):
+    """
+    Process-wide, thread-safe pool of keep-alive ``requests.Session`` objects.
+
+    Sessions are keyed by scheme, host and retries policy so that every call
+    towards the same remote endpoint reuses the underlying urllib3 connection
+    pool instead of paying a new TCP/TLS handshake each time.
+    The number of concurrent requests towards a single host is bounded by
+    ``host_limits`` (falling back to ``pool_maxsize``), streamed responses
+    hold their slot until they are closed.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, backoff_factor=0.3,
+                 status_forcelist=(500, 502, 503, 504), host_limits=None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = status_forcelist
+        self.host_limits = host_limits or {}
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._semaphores = {}
+        self._stats = defaultdict(int)
+
+    @staticmethod
+    def get_key(url):
+        _url = urlsplit(url)
+        return (_url.scheme or 'http', _url.netloc.lower())
+
+    def _get_limit(self, netloc):
+        _host = netloc.split('@')[-1]
+        for _key in (_host, _host.split(':')[0]):
+            if _key in self.host_limits:
+                return int(self.host_limits[_key])
+        return self.pool_maxsize
+
+    def _new_session(self, scheme, retries):
+        session = requests.Session()
+        retry = Retry(
+            total=retries,
+            read=retries,
+            connect=retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.status_forcelist,
+        )
+        adapter = requests.adapters.HTTPAdapter(
+            max_retries=retry,
+            pool_maxsize=self.pool_maxsize,
+            pool_connections=self.pool_connections
+        )
+        session.mount("{scheme}://".format(scheme=scheme), adapter)
+        session.verify = False
+        # Sessions are shared among users: never persist server cookies
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        return session
+
+    def get_session(self, url, retries):
+        scheme, netloc = self.get_key(url)
+        key = (scheme, netloc, retries)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                self._stats['hits'] += 1
+            else:
+                session = self._new_session(scheme, retries)
+                self._sessions[key] = session
+                self._stats['sessions'] += 1
+            if netloc not in self._semaphores:
+                self._semaphores[netloc] = threading.BoundedSemaphore(self._get_limit(netloc))
+            return session, self._semaphores[netloc]
+
+    def acquire(self, semaphore, timeout=None):
+        """
+        Waits for a free slot of the host, at most timeout seconds, so that
+        leaked streamed responses cannot hang the requests forever.
+        """
+        if not semaphore.acquire(blocking=False):
+            with self._lock:
+                self._stats['waits'] += 1
+            if not semaphore.acquire(timeout=timeout):
+                raise requests.exceptions.Timeout(
+                    "No free connection slot for the host after {} seconds".format(timeout))
+
+    @staticmethod
+    def release_on_close(response, semaphore):
+        """
+        Holds the host slot of a streamed response until the response is
+        closed, or garbage collected if it never is.
+        """
+        lock = threading.Lock()
+        released = []
+
+        def release():
+            with lock:
+                if released:
+                    return
+                released.append(True)
+            semaphore.release()
+
+        # a weak reference, so that the response can still be collected
+        _response = weakref.ref(response)
+
+        def close():
+            try:
+                if _response() is not None:
+                    type(_response()).close(_response())
+            finally:
+                release()
+
+        response.close = close
+        weakref.finalize(response, release)
+
+    def stats(self):
+        """
+        Returns a snapshot of the pool counters:
+         - hits: requests served by an already existing session
+         - sessions: sessions created so far
+         - waits: requests that had to wait for a free per-host slot
+         - connections: TCP connections opened by the underlying pools
+        """
+        with self._lock:
+            _stats = dict(self._stats)
+            _sessions = list(self._sessions.values())
+        _connections = 0
+        for session in _sessions:
+            for adapter in session.adapters.values():
+                _pools = getattr(adapter, 'poolmanager', None)
+                if _pools is None:
+                    continue
+                for _key in list(_pools.pools.keys()):
+                    _pool = _pools.pools.get(_key)
+                    _connections += getattr(_pool, 'num_connections', 0) if _pool else 0
+        _stats['connections'] = _connections
+        for _key in ('hits', 'sessions', 'waits'):
+            _stats.setdefault(_key, 0)
+        return _stats
+
+    def clear(self):
+        with self._lock:
+            for session in self._sessions.values():
+                try:
+                    session.close()
+                except Exception:
+                    pass
+            self._sessions.clear()
+            self._semaphores.clear()
+            self._stats.clear()
+
+
 class HttpClient(object):
 
     def __init__(self):
@@ -1403,6 +1555,7 @@ class HttpClient(object):
         self.pool_maxsize = 10
         self.backoff_factor = 0.3
         self.pool_connections = 10
+        self.pool_host_limits = {}
         self.status_forcelist = (500, 502, 503, 504)
         self.username = 'admin'
         self.password = 'admin'
@@ -1415,8 +1568,16 @@ class HttpClient(object):
             self.pool_maxsize = ogc_server_settings['POOL_MAXSIZE'] if 'POOL_MAXSIZE' in ogc_server_settings else 10
             self.pool_connections = ogc_server_settings['POOL_CONNECTIONS'] if \
             'POOL_CONNECTIONS' in ogc_server_settings else 10
+            self.pool_host_limits = ogc_server_settings['POOL_HOST_LIMITS'] if \
+            'POOL_HOST_LIMITS' in ogc_server_settings else {}
             self.username = ogc_server_settings['USER'] if 'USER' in ogc_server_settings else 'admin'
             self.password = ogc_server_settings['PASSWORD'] if 'PASSWORD' in ogc_server_settings else 'geoserver'
+        self.pool = HttpSessionPool(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.status_forcelist,
+            host_limits=self.pool_host_limits)
 
     def request(self, url, method='GET', data=None, headers={}, stream=False, timeout=None, retries=None, user=None):
         if (user or self.username != 'admin') and \
@@ -1440,31 +1601,27 @@ class HttpClient(object):
 
         response = None
         content = None
-        session = requests.Session()
-        retry = Retry(
-            total=retries or self.retries,
-            read=retries or self.retries,
-            connect=retries or self.retries,
-            backoff_factor=self.backoff_factor,
-            status_forcelist=self.status_forcelist,
-        )
-        adapter = requests.adapters.HTTPAdapter(
-            max_retries=retry,
-            pool_maxsize=self.pool_maxsize,
-            pool_connections=self.pool_connections
-        )
-        session.mount("{scheme}://".format(scheme=urlsplit(url).scheme), adapter)
-        session.verify = False
-        action = getattr(session, method.lower(), None)
-        if action:
-            response = action(
-                url=url,
-                data=data,
-                headers=headers,
-                timeout=timeout or self.timeout,
-                stream=stream)
+        session, semaphore = self.pool.get_session(url, retries or self.retries)
+        self.pool.acquire(semaphore, timeout=timeout or self.timeout)
+        try:
+            action = getattr(session, method.lower(), None)
+            if action:
+                response = action(
+                    url=url,
+                    data=data,
+                    headers=headers,
+                    timeout=timeout or self.timeout,
+                    stream=stream)
+            else:
+                response = session.get(url, headers=headers, timeout=self.timeout)
+        except Exception:
+            semaphore.release()
+            raise
+        if stream:
+            # the body is transferred after returning, callers must close the response
+            self.pool.release_on_close(response, semaphore)
         else:
-            response = session.get(url, headers=headers, timeout=self.timeout)
+            semaphore.release()
 
         try:
             content = ensure_string(response.content) if not stream else response.raw
@@ -1607,19 +1764,79 @@ def slugify_zh(text, separator='_'):
     return text
 
 
+def sync_resource_links(resource, links, prune_types=None, remove_names=None):
+    """
+    Reconciles the Links of a resource with the desired ones.
+
+    links is a list of (lookup, defaults, update) tuples: a Link matching
+    the lookup is created if missing, updated with the defaults if
+    update is True, and duplicates matching the same lookup are removed.
+    Existing links of the prune_types not matched by any lookup, and the
+    ones named as remove_names, are deleted.
+
+    The changes are applied with one bulk_create, one bulk_update and one
+    delete. Returns the number of created, updated and deleted links.
+    """
+    from geonode.base.models import Link
+
+    existing = list(Link.objects.filter(resource=resource).order_by('id'))
+    current = list(existing)
+    matched = set()
+    to_create = []
+    to_update = []
+    to_delete = {}
+
+    def _matches(link, lookup):
+        return all(getattr(link, k) == v for k, v in lookup.items())
+
+    for lookup, defaults, update in links:
+        found = [link for link in current if link.pk not in to_delete and _matches(link, lookup)]
+        if not found:
+            link = Link(resource=resource, **dict(defaults, **lookup))
+            current.append(link)
+            to_create.append(link)
+            continue
+        link = found[0]
+        matched.add(id(link))
+        for duplicate in found[1:]:
+            if duplicate.pk:
+                to_delete[duplicate.pk] = duplicate
+            else:
+                to_create.remove(duplicate)
+                current.remove(duplicate)
+        if update:
+            changed = False
+            for k, v in defaults.items():
+                if getattr(link, k) != v:
+                    setattr(link, k, v)
+                    changed = True
+            if changed and link.pk and link not in to_update:
+                to_update.append(link)
+
+    for link in existing:
+        if id(link) in matched:
+            continue
+        if (prune_types and link.link_type in prune_types) or (remove_names and link.name in remove_names):
+            to_delete[link.pk] = link
+    to_update = [link for link in to_update if link.pk not in to_delete]
+
+    if to_delete:
+        Link.objects.filter(id__in=list(to_delete)).delete()
+    if to_update:
+        Link.objects.bulk_update(to_update, ['extension', 'url', 'mime', 'link_type', 'name'])
+    if to_create:
+        Link.objects.bulk_create(to_create)
+    return len(to_create), len(to_update), len(to_delete)
+
+
 def set_resource_default_links(instance, layer, prune=False, **kwargs):
 
     from geonode.base.models import Link
     from django.urls import reverse
     from django.utils.translation import ugettext
 
-    # Prune old links
-    if prune:
-        logger.debug(" -- Resource Links[Prune old links]...")
-        _def_link_types = (
-            'data', 'image', 'original', 'html', 'OGC:WMS', 'OGC:WFS', 'OGC:WCS')
-        Link.objects.filter(resource=instance.resourcebase_ptr, link_type__in=_def_link_types).delete()
-        logger.debug(" -- Resource Links[Prune old links]...done!")
+    _def_link_types = (
+        'data', 'image', 'original', 'html', 'OGC:WMS', 'OGC:WFS', 'OGC:WCS')
 
     if check_ogc_backend(geoserver.BACKEND_PACKAGE):
         from geonode.geoserver.ows import wcs_links, wfs_links, wms_links
@@ -1660,31 +1877,27 @@ def set_resource_default_links(instance, layer, prune=False, **kwargs):
             except Exception as e:
                 logger.exception(e)
 
+        # The desired links are collected first and then reconciled
+        # with the existing ones all at once.
+        _links = []
+        _remove_names = None
+
         # Create Raw Data download link
         if settings.DISPLAY_ORIGINAL_DATASET_LINK:
             logger.debug(" -- Resource Links[Create Raw Data download link]...")
             download_url = urljoin(settings.SITEURL,
                                    reverse('download', args=[instance.id]))
-            while Link.objects.filter(
-                    resource=instance.resourcebase_ptr,
-                    url=download_url).count() > 1:
-                Link.objects.filter(
-                    resource=instance.resourcebase_ptr,
-                    url=download_url).first().delete()
-            Link.objects.update_or_create(
-                resource=instance.resourcebase_ptr,
-                url=download_url,
-                defaults=dict(
+            _links.append((
+                dict(url=download_url),
+                dict(
                     extension='zip',
                     name='Original Dataset',
                     mime='application/octet-stream',
                     link_type='original',
-                )
-            )
-            logger.debug(" -- Resource Links[Create Raw Data download link]...done!")
+                ),
+                True))
         else:
-            Link.objects.filter(resource=instance.resourcebase_ptr,
-                                name='Original Dataset').delete()
+            _remove_names = ('Original Dataset', )
 
         # Set download links for WMS, WCS or WFS and KML
         logger.debug(" -- Resource Links[Set download links for WMS, WCS or WFS and KML]...")
@@ -1696,25 +1909,14 @@ def set_resource_default_links(instance, layer, prune=False, **kwargs):
                           width)
 
         for ext, name, mime, wms_url in links:
-            try:
-                Link.objects.update_or_create(
-                    resource=instance.resourcebase_ptr,
-                    name=ugettext(name),
-                    defaults=dict(
-                        extension=ext,
-                        url=wms_url,
-                        mime=mime,
-                        link_type='image',
-                    )
-                )
-            except Link.MultipleObjectsReturned:
-                _d = dict(extension=ext,
-                          url=wms_url,
-                          mime=mime,
-                          link_type='image')
-                Link.objects.filter(resource=instance.resourcebase_ptr,
-                                    name=ugettext(name),
-                                    link_type='image').update(**_d)
+            _links.append((
+                dict(name=ugettext(name), link_type='image'),
+                dict(
+                    extension=ext,
+                    url=wms_url,
+                    mime=mime,
+                ),
+                True))
 
         if instance.storeType == "dataStore":
             links = wfs_links(ogc_server_settings.public_url + 'ows?',
@@ -1724,19 +1926,13 @@ def set_resource_default_links(instance, layer, prune=False, **kwargs):
             for ext, name, mime, wfs_url in links:
                 if mime == 'SHAPE-ZIP':
                     name = 'Zipped Shapefile'
-                if (Link.objects.filter(resource=instance.resourcebase_ptr,
-                                        url=wfs_url,
-                                        name=name).count() < 2):
-                    Link.objects.update_or_create(
-                        resource=instance.resourcebase_ptr,
-                        url=wfs_url,
-                        name=name,
-                        link_type='data',
-                        defaults=dict(
-                            extension=ext,
-                            mime=mime,
-                        )
-                    )
+                _links.append((
+                    dict(url=wfs_url, name=name, link_type='data'),
+                    dict(
+                        extension=ext,
+                        mime=mime,
+                    ),
+                    True))
 
         elif instance.storeType == 'coverageStore':
             links = wcs_links(ogc_server_settings.public_url + 'wcs?',
@@ -1745,38 +1941,25 @@ def set_resource_default_links(instance, layer, prune=False, **kwargs):
                               srid)
 
         for ext, name, mime, wcs_url in links:
-            if (Link.objects.filter(resource=instance.resourcebase_ptr,
-                                    url=wcs_url,
-                                    name=name).count() < 2):
-                Link.objects.update_or_create(
-                    resource=instance.resourcebase_ptr,
-                    url=wcs_url,
-                    name=name,
-                    link_type='data',
-                    defaults=dict(
-                        extension=ext,
-                        mime=mime,
-                    )
-                )
+            _links.append((
+                dict(url=wcs_url, name=name, link_type='data'),
+                dict(
+                    extension=ext,
+                    mime=mime,
+                ),
+                True))
 
         site_url = settings.SITEURL.rstrip('/') if settings.SITEURL.startswith('http') else settings.SITEURL
         html_link_url = '%s%s' % (
             site_url, instance.get_absolute_url())
 
-        if (Link.objects.filter(resource=instance.resourcebase_ptr,
-                                url=html_link_url,
-                                name=instance.alternate).count() < 2):
-            Link.objects.update_or_create(
-                resource=instance.resourcebase_ptr,
-                url=html_link_url,
-                name=instance.alternate,
-                link_type='html',
-                defaults=dict(
-                    extension='html',
-                    mime='text/html',
-                )
-            )
-        logger.debug(" -- Resource Links[Set download links for WMS, WCS or WFS and KML]...done!")
+        _links.append((
+            dict(url=html_link_url, name=instance.alternate, link_type='html'),
+            dict(
+                extension='html',
+                mime='text/html',
+            ),
+            True))
 
         # Legend link
         logger.debug(" -- Resource Links[Legend link]...")
@@ -1786,93 +1969,87 @@ def set_resource_default_links(instance, layer, prune=False, **kwargs):
                 instance.alternate + '&STYLE=' + style.name + \
                 '&legend_options=fontAntiAliasing:true;fontSize:12;forceLabels:on'
 
-            if Link.objects.filter(resource=instance.resourcebase_ptr, url=legend_url).count() < 2:
-                Link.objects.update_or_create(
-                    resource=instance.resourcebase_ptr,
-                    name='Legend',
-                    url=legend_url,
-                    defaults=dict(
-                        extension='png',
-                        url=legend_url,
-                        mime='image/png',
-                        link_type='image',
-                    )
-                )
-        logger.debug(" -- Resource Links[Legend link]...done!")
+            _links.append((
+                dict(name='Legend', url=legend_url),
+                dict(
+                    extension='png',
+                    mime='image/png',
+                    link_type='image',
+                ),
+                True))
 
         # Thumbnail link
         logger.debug(" -- Resource Links[Thumbnail link]...")
-        if os.path.splitext(settings.MISSING_THUMBNAIL)[0] in instance.get_thumbnail_url():
-            from geonode.geoserver.helpers import create_gs_thumbnail
-            create_gs_thumbnail(instance, overwrite=True, check_bbox=True)
-        else:
-            Link.objects.update_or_create(
-                resource=instance.resourcebase_ptr,
-                name='Thumbnail',
-                url=instance.get_thumbnail_url(),
-                defaults=dict(
+        _create_thumbnail = os.path.splitext(settings.MISSING_THUMBNAIL)[0] in instance.get_thumbnail_url()
+        if not _create_thumbnail:
+            _links.append((
+                dict(name='Thumbnail', url=instance.get_thumbnail_url()),
+                dict(
                     extension='png',
                     mime='image/png',
                     link_type='image',
-                )
-            )
-        logger.debug(" -- Resource Links[Thumbnail link]...done!")
+                ),
+                True))
 
         logger.debug(" -- Resource Links[OWS Links]...")
         # ogc_wms_path = '%s/ows' % instance.workspace
         ogc_wms_path = 'ows'
         ogc_wms_url = urljoin(ogc_server_settings.public_url, ogc_wms_path)
         ogc_wms_name = 'OGC WMS: %s Service' % instance.workspace
-        if Link.objects.filter(resource=instance.resourcebase_ptr, name=ogc_wms_name, url=ogc_wms_url).count() < 2:
-            Link.objects.get_or_create(
-                resource=instance.resourcebase_ptr,
-                url=ogc_wms_url,
-                name=ogc_wms_name,
-                defaults=dict(
-                    extension='html',
-                    url=ogc_wms_url,
-                    mime='text/html',
-                    link_type='OGC:WMS',
-                )
-            )
+        _links.append((
+            dict(url=ogc_wms_url, name=ogc_wms_name),
+            dict(
+                extension='html',
+                mime='text/html',
+                link_type='OGC:WMS',
+            ),
+            False))
 
         if instance.storeType == "dataStore":
             # ogc_wfs_path = '%s/wfs' % instance.workspace
             ogc_wfs_path = 'ows'
             ogc_wfs_url = urljoin(ogc_server_settings.public_url, ogc_wfs_path)
             ogc_wfs_name = 'OGC WFS: %s Service' % instance.workspace
-            if Link.objects.filter(resource=instance.resourcebase_ptr, name=ogc_wfs_name, url=ogc_wfs_url).count() < 2:
-                Link.objects.get_or_create(
-                    resource=instance.resourcebase_ptr,
-                    url=ogc_wfs_url,
-                    name=ogc_wfs_name,
-                    defaults=dict(
-                        extension='html',
-                        url=ogc_wfs_url,
-                        mime='text/html',
-                        link_type='OGC:WFS',
-                    )
-                )
+            _links.append((
+                dict(url=ogc_wfs_url, name=ogc_wfs_name),
+                dict(
+                    extension='html',
+                    mime='text/html',
+                    link_type='OGC:WFS',
+                ),
+                False))
 
         if instance.storeType == "coverageStore":
             # ogc_wcs_path = '%s/wcs' % instance.workspace
             ogc_wcs_path = 'ows'
             ogc_wcs_url = urljoin(ogc_server_settings.public_url, ogc_wcs_path)
             ogc_wcs_name = 'OGC WCS: %s Service' % instance.workspace
-            if Link.objects.filter(resource=instance.resourcebase_ptr, name=ogc_wcs_name, url=ogc_wcs_url).count() < 2:
-                Link.objects.get_or_create(
-                    resource=instance.resourcebase_ptr,
-                    url=ogc_wcs_url,
-                    name=ogc_wcs_name,
-                    defaults=dict(
-                        extension='html',
-                        url=ogc_wcs_url,
-                        mime='text/html',
-                        link_type='OGC:WCS',
-                    )
-                )
-        logger.debug(" -- Resource Links[OWS Links]...done!")
+            _links.append((
+                dict(url=ogc_wcs_url, name=ogc_wcs_name),
+                dict(
+                    extension='html',
+                    mime='text/html',
+                    link_type='OGC:WCS',
+                ),
+                False))
+
+        created, updated, deleted = sync_resource_links(
+            instance.resourcebase_ptr,
+            _links,
+            prune_types=_def_link_types if prune else None,
+            remove_names=_remove_names)
+        logger.debug(" -- Resource Links[%s created, %s updated, %s deleted]...done!" % (created, updated, deleted))
+
+        if _create_thumbnail:
+            from geonode.geoserver.helpers import create_gs_thumbnail
+            create_gs_thumbnail(instance, overwrite=True, check_bbox=True)
     elif check_ogc_backend(qgis_server.BACKEND_PACKAGE):
+        # Prune old links
+        if prune:
+            logger.debug(" -- Resource Links[Prune old links]...")
+            Link.objects.filter(resource=instance.resourcebase_ptr, link_type__in=_def_link_types).delete()
+            logger.debug(" -- Resource Links[Prune old links]...done!")
+
         from geonode.layers.models import LayerFile
         from geonode.qgis_server.helpers import (
             tile_url_format, style_list, create_qgis_project)